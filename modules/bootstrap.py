@@ -4,9 +4,10 @@ OOPUO Desktop Environment - Tmux Bootstrap Engine
 Creates the 3-zone layout on startup
 """
 import os
-import subprocess
 import time
+import shlex
 from config import config, LOG_FILE
+from executor import executor
 
 class TmuxBootstrap:
     """Manages tmux session creation and pane layout"""
@@ -22,27 +23,20 @@ class TmuxBootstrap:
             f.write(f"[BOOTSTRAP] {msg}\n")
     
     def run_tmux(self, cmd):
-        """Execute tmux command"""
+        """Execute tmux command (split into argv, no shell)"""
         try:
-            result = subprocess.run(
-                cmd,
-                shell=True,
-                capture_output=True,
-                text=True,
-                timeout=5
-            )
-            return result.returncode == 0
-        except Exception as e:
+            argv = shlex.split(cmd)
+        except ValueError as e:
             self.log(f"Error: {cmd} -> {e}")
             return False
+        result = executor().run(argv, timeout=5)
+        if result.error:
+            self.log(f"Error: {cmd} -> {result.error}")
+        return result.ok
     
     def session_exists(self):
         """Check if OOPUO session already exists"""
-        result = subprocess.run(
-            f"tmux has-session -t {self.SESSION_NAME} 2>/dev/null",
-            shell=True
-        )
-        return result.returncode == 0
+        return executor().run(['tmux', 'has-session', '-t', self.SESSION_NAME]).ok
     
     def create_layout(self):
         """
@@ -131,23 +125,36 @@ class TmuxBootstrap:
         """Start the Python processes in each pane"""
         data_dir = config.get('DATA_DIR', '/opt/oopuo')
         
-        # Header: metrics.py
+        # Collector daemon: hidden window, shares one snapshot with every pane
         self.run_tmux(
-            f"tmux send-keys -t {self.SESSION_NAME}:0.0 "
-            f"'python3 {data_dir}/metrics.py' Enter"
+            f"tmux new-window -d -t {self.SESSION_NAME}:9 -n collector "
+            f"'python3 {data_dir}/collectord.py'"
         )
         
-        # Sidebar: controller.py
-        self.run_tmux(
-            f"tmux send-keys -t {self.SESSION_NAME}:0.1 "
-            f"'python3 {data_dir}/controller.py' Enter"
-        )
-        
-        # Main: Initial welcome screen
-        self.run_tmux(
-            f"tmux send-keys -t {self.SESSION_NAME}:0.2 "
-            f"'clear && echo \"[ VIEWPORT READY ]\"' Enter"
-        )
+        if config.get('tui.mode', 'panes') == 'single':
+            # One interpreter owns header, sidebar and main (tuihost.py)
+            self.run_tmux(
+                f"tmux new-window -d -t {self.SESSION_NAME}:8 -n tui "
+                f"'python3 {data_dir}/tuihost.py'"
+            )
+        else:
+            # Header: metrics.py
+            self.run_tmux(
+                f"tmux send-keys -t {self.SESSION_NAME}:0.0 "
+                f"'python3 {data_dir}/metrics.py' Enter"
+            )
+            
+            # Sidebar: controller.py
+            self.run_tmux(
+                f"tmux send-keys -t {self.SESSION_NAME}:0.1 "
+                f"'python3 {data_dir}/controller.py' Enter"
+            )
+            
+            # Main: Initial welcome screen
+            self.run_tmux(
+                f"tmux send-keys -t {self.SESSION_NAME}:0.2 "
+                f"'clear && echo \"[ VIEWPORT READY ]\"' Enter"
+            )
         
         # MiniLog: System logs
         self.run_tmux(
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+OOPUO Desktop Environment - Metrics Collection Daemon
+Samples every source once and publishes a shared-memory snapshot for all panes
+"""
+import os
+import time
+import signal
+import threading
+from datetime import datetime
+from config import config, LOG_FILE
+from metrics import MetricsRenderer
+from shm import SnapshotWriter
+from exporter import MetricsExporter
+from cgroups import GuestAccounting
+from health import HealthProber
+from pve_status import pve_status
+from pveapi import proxmox
+
+class CollectorDaemon:
+    """Single collector process; panes read its snapshot via shm.SnapshotReader"""
+
+    def __init__(self):
+        self.writer = SnapshotWriter()
+        self.metrics = MetricsRenderer(collect_locally=True)
+        self.accounting = GuestAccounting()
+        self.health = HealthProber(on_result=self.publish_health)
+        self.lock = threading.Lock()
+        self.running = True
+
+        # (name, interval seconds, sampler) - each source runs on its own schedule
+        self.sources = [
+            ('metrics', config.get('collector.intervals.metrics', 1), self.sample_metrics),
+            ('guests', config.get('collector.intervals.guests', 2), self.sample_guests),
+            ('snapshots', config.get('collector.intervals.snapshots', 60), self.sample_snapshots),
+        ]
+
+    def log(self, msg):
+        """Write to log file"""
+        ts = datetime.now().strftime('%H:%M:%S')
+        with open(LOG_FILE, 'a') as f:
+            f.write(f"[COLLECTOR] [{ts}] {msg}\n")
+
+    def publish(self, values):
+        """Publish updates (the seqlock allows exactly one writer at a time)"""
+        with self.lock:
+            self.writer.publish(**values)
+
+    # ----- sources -----
+
+    def sample_metrics(self):
+        """CPU, RAM, GPU and uptime via the header's collectors"""
+        return self.metrics.collect()
+
+    def sample_guests(self):
+        """Brain VM and Guard CT run state and resource usage"""
+        if self.accounting.available:
+            # Running guests have a cgroup; no qm/pct forks needed
+            usage = self.accounting.sample()
+            states = {guest['name']: guest['state'] for guest in usage}
+            return {
+                'brain_state': states.get('brain', -1),
+                'guard_state': states.get('guard', -1),
+                'guests': usage,
+                'guests_ts': time.time()
+            }
+
+        # No cgroup v2: one pvesh call covers both guests
+        return {
+            'brain_state': pve_status.state(config.get('ids.brain_vm', 200)),
+            'guard_state': pve_status.state(config.get('ids.guard_ct', 100)),
+            'guests_ts': time.time()
+        }
+
+    def publish_health(self, name, result, changed):
+        """Health prober callback: publish every probe result"""
+        if changed:
+            self.log(f"{name} is now {result.detail}")
+        self.publish({f'{name}_state': result.state, 'health_ts': result.checked})
+
+    def sample_snapshots(self):
+        """Number of Brain VM snapshots (excluding the 'current' marker)"""
+        snapshots = proxmox().snapshots(config.get('ids.brain_vm', 200))
+        return {'snapshot_count': -1 if snapshots is None else len(snapshots)}
+
+    # ----- scheduling -----
+
+    def _source_loop(self, name, interval, sampler):
+        """Run one source forever at its own interval"""
+        while self.running:
+            started = time.monotonic()
+            try:
+                self.publish(sampler())
+            except Exception as e:
+                self.log(f"{name} sampler error: {e}")
+
+            elapsed = time.monotonic() - started
+            time.sleep(max(0.05, interval - elapsed))
+
+    def stop(self, *_):
+        self.running = False
+
+    def run(self):
+        """Start every source and wait for a stop signal"""
+        self.log(f"Collector started (pid {os.getpid()})")
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+
+        # Prometheus endpoint, rendered from the snapshot this process publishes
+        if config.get('exporter.enabled', True):
+            try:
+                MetricsExporter().start()
+            except OSError as e:
+                self.log(f"Exporter disabled: {e}")
+
+        # Tunnel/Nomad/Consul/Vault probes run on their own threads with backoff
+        self.health.start()
+
+        for name, interval, sampler in self.sources:
+            thread = threading.Thread(
+                target=self._source_loop,
+                args=(name, interval, sampler),
+                name=f"collector-{name}",
+                daemon=True
+            )
+            thread.start()
+
+        while self.running:
+            time.sleep(0.5)
+
+        self.log("Collector stopped")
+
+if __name__ == "__main__":
+    daemon = CollectorDaemon()
+    daemon.run()
@@ -108,6 +108,30 @@ def sparkline(values, height=8, width=20):
     
     return "\n".join(lines)
 
+def mini_sparkline(values, width=10, max_value=100, gradient=GRAPH_GRADIENT[6:]):
+    """
+    Create a single-row sparkline (one block character per sample)
+    
+    Args:
+        values: List of numeric values (oldest first)
+        width: Number of samples to show
+        max_value: Value mapped to a full block
+        gradient: List of color codes to use
+    
+    Returns:
+        Colored string, padded on the left to `width`
+    """
+    chars = ["▁", "▂", "▃", "▄", "▅", "▆", "▇", "█"]
+    recent = values[-width:]
+    line = " " * (width - len(recent))
+    
+    for v in recent:
+        level = min(7, max(0, int((v / max_value) * 7))) if max_value else 0
+        color = gradient[int((level / 7) * (len(gradient) - 1))]
+        line += col(chars[level], color)
+    
+    return line
+
 def glitch_text(text, probability=0.05):
     """
     Apply subtle glitch effect to text (OOPUO signature)
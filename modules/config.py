@@ -4,6 +4,7 @@ OOPUO Desktop Environment - Centralized Configuration
 """
 import os
 import json
+import threading
 from pathlib import Path
 
 # Directories
@@ -14,9 +15,12 @@ VAULT_DIR = "/root/oopuo_vault"
 
 # Files
 CONFIG_FILE = f"{CONF_DIR}/config.json"
+DEPLOY_STATE = f"{CONF_DIR}/deploy_state.json"
 LOG_FILE = f"{LOG_DIR}/system.log"
 CRASH_FILE = f"{LOG_DIR}/crash.log"
+METRICS_DB = f"{LOG_DIR}/metrics.tsdb"
 FIFO_PATH = "/tmp/oopuo_cmd"
+SHM_PATH = "/dev/shm/oopuo_metrics" if os.path.isdir("/dev/shm") else "/tmp/oopuo_metrics"
 
 # Default Configuration
 DEFAULT_CONFIG = {
@@ -29,7 +33,8 @@ DEFAULT_CONFIG = {
         "host_ip": None,
         "gateway": None,
         "brain_ip": None,
-        "guard_ip": None
+        "guard_ip": None,
+        "build_ip": None    # template builds boot here
     },
     "resources": {
         "brain": {
@@ -50,7 +55,9 @@ DEFAULT_CONFIG = {
     },
     "assets": {
         "cloud_img_url": "https://cloud-images.ubuntu.com/noble/current/noble-server-cloudimg-amd64.img",
-        "lxc_template": "ubuntu-24.04-standard_24.04-2_amd64.tar.zst"
+        "lxc_template": "ubuntu-24.04-standard_24.04-2_amd64.tar.zst",
+        "image_max_age_days": 30,   # cloud image checked upstream (and the template rebuilt) at most this often
+        "cloud_img_checked": None   # unix time of the last upstream check
     },
     "panes": {
         "header": "oopuo-desktop:0.0",
@@ -58,6 +65,9 @@ DEFAULT_CONFIG = {
         "main": "oopuo-desktop:0.2",
         "minilog": "oopuo-desktop:0.3"
     },
+    "tui": {
+        "mode": "panes"     # "panes": one interpreter per pane, "single": tuihost.py drives them all
+    },
     "theme": {
         "primary": 51,      # Cyan
         "success": 46,      # Green
@@ -75,6 +85,88 @@ DEFAULT_CONFIG = {
         "tunnel_name": None,
         "tunnel_id": None
     },
+    "collector": {
+        "intervals": {
+            "metrics": 1,
+            "guests": 2,
+            "snapshots": 60
+        }
+    },
+    "pve": {
+        "status_ttl": 5,    # seconds a /cluster/resources result is reused
+        "backend": "cli",   # "cli": qm/pct/pvesh, "api": REST API on loopback
+        "api": {
+            "host": "127.0.0.1",
+            "port": 8006,
+            "node": None,       # default: this host's name
+            "token": None,      # "root@pam!oopuo=<secret>", created on first use
+            "user": "root@pam",
+            "password": None,   # alternative to a token (ticket login)
+            "verify_tls": False
+        }
+    },
+    "deploy": {
+        "workers": 3        # deployment steps run at the same time
+    },
+    "downloads": {
+        "cache_dir": "/var/cache/oopuo",    # content-addressed: <algo>/<hex digest>
+        "workers": 4,       # parallel range requests per file
+        "chunk_mb": 16,
+        "retries": 3
+    },
+    "ssh": {
+        "control_dir": "/tmp/oopuo-ssh",    # ControlMaster sockets, one per guest
+        "idle": 300,        # seconds an unused master stays up
+        "connect_timeout": 10
+    },
+    "pkgcache": {
+        "enabled": True,    # apt/pip/download cache on the host for the guests, while deploying
+        "bind": None,       # default: the host's bridge address (network.host_ip)
+        "port": 3142,
+        "dir": "/var/cache/oopuo/pkgcache",
+        "max_age": 3600,    # seconds before indexes are checked upstream again
+        "max_gb": 20,       # least recently used objects are evicted beyond this
+        "clients": [],      # addresses served besides the guests and the host
+        "upstreams": None   # hosts fetched from (default: pkgcache.UPSTREAMS)
+    },
+    "executor": {
+        "backend": "local",     # "simulated": fake Proxmox node, "record"/"replay": tape
+        "tape": "/var/log/oopuo/commands.tape",
+        "speed": 1.0,       # factor on simulated/replayed durations
+        "limits": {},       # per-tool concurrency, e.g. {"qm": 2} (see executor.TOOL_LIMITS)
+        "timeouts": {}      # per-tool seconds (see executor.TOOL_TIMEOUTS)
+    },
+    "readiness": {
+        "deadline": 600,    # seconds a booted VM gets to become usable
+        "agent_grace": 15   # extra seconds for qemu-guest-agent after cloud-init
+    },
+    "templates": {
+        "enabled": True,    # clone the Brain from a provisioned template
+        "vmid_base": 9000,  # templates (and their builds) get VMIDs from here
+        "clone": "linked",  # "linked": copy-on-write, "full": independent disk
+        "keep": 2           # templates kept when an input change builds a new one
+    },
+    "health": {
+        "intervals": {
+            "tunnel": 15,
+            "nomad": 30,
+            "consul": 30,
+            "vault": 30
+        },
+        "timeout": 3,
+        "max_backoff": 300
+    },
+    "exporter": {
+        "enabled": True,
+        "bind": "127.0.0.1",
+        "port": 9847
+    },
+    "alerts": {
+        "window_sec": 60,
+        "cpu_avg": 90,
+        "ram_avg": 90,
+        "gpu_temp_p95": 85
+    },
     "snapshot": {
         "auto_enabled": True,
         "interval_hours": 24,
@@ -87,6 +179,8 @@ class Config:
     """Configuration manager with persistence"""
     
     def __init__(self):
+        # Deployment steps run on several threads and all save here
+        self.lock = threading.RLock()
         self.data = self._load()
     
     def _load(self):
@@ -112,9 +206,10 @@ class Config:
     
     def save(self):
         """Persist config to disk"""
-        os.makedirs(CONF_DIR, exist_ok=True)
-        with open(CONFIG_FILE, 'w') as f:
-            json.dump(self.data, f, indent=2)
+        with self.lock:
+            os.makedirs(CONF_DIR, exist_ok=True)
+            with open(CONFIG_FILE, 'w') as f:
+                json.dump(self.data, f, indent=2)
     
     def get(self, path, default=None):
         """Get nested config value using dot notation"""
@@ -130,13 +225,14 @@ class Config:
     def set(self, path, value):
         """Set nested config value using dot notation"""
         keys = path.split('.')
-        target = self.data
-        for key in keys[:-1]:
-            if key not in target:
-                target[key] = {}
-            target = target[key]
-        target[keys[-1]] = value
-        self.save()
+        with self.lock:
+            target = self.data
+            for key in keys[:-1]:
+                if key not in target:
+                    target[key] = {}
+                target = target[key]
+            target[keys[-1]] = value
+            self.save()
 
 # Global instance
 config = Config()
@@ -3,21 +3,21 @@
 OOPUO Desktop Environment - Controller (Sidebar Menu)
 Persistent navigation menu that never closes
 """
-import sys
 import os
 import tty
 import termios
-import select
-import shutil
-import subprocess
 from colors import col, glitch_text, box_chars, bold, C_PRIMARY, C_ACCENT, C_MUTED, C_TEXT, C_ERROR, C_SUCCESS
 from config import config
 from ipc import ipc
+from shm import SnapshotReader
+from health import HealthProber, SERVICES, UP, DOWN
+from screen import Screen
+from eventloop import EventLoop, KEY_UP, KEY_DOWN, KEY_ENTER, KEY_CTRL_C
 
 class Controller:
     """The persistent sidebar menu"""
     
-    def __init__(self):
+    def __init__(self, loop=None, screen=None, send=None):
         self.menu_items = [
             "DASHBOARD",
             "CONNECT BRAIN",
@@ -30,31 +30,45 @@ class Controller:
         ]
         self.menu_idx = 0
         self.running = True
-        self.width, self.height = shutil.get_terminal_size()
+        self.send = send or ipc.send     # the TUI host dispatches in-process
+        self.loop = loop or EventLoop()
+        self.screen = screen or Screen()
+        self.width, self.height = self.screen.resize(*self.loop.size)
         
-        # Check Cloudflare tunnel status
+        # Service health (tunnel, Nomad, Consul, Vault) - cached probe states
         self.tunnel_connected = config.get('cloudflare.tunnel_configured', False)
+        self.health = {name: -1 for name in SERVICES}
+        self.snapshot = SnapshotReader()
+        self.prober = None      # in-process prober, only while collectord is not running
     
-    def check_tunnel_status(self):
-        """Check if Cloudflare tunnel is running"""
-        try:
-            result = subprocess.run(
-                f"pct exec {config.get('ids.guard_ct')} -- systemctl is-active cloudflared",
-                shell=True,
-                capture_output=True,
-                text=True,
-                timeout=2
-            )
-            return result.stdout.strip() == "active"
-        except:
-            return False
+    def refresh_health(self):
+        """Timer: pick up cached probe states; redraw only if one changed"""
+        snap = self.snapshot.read(max_age=60)
+        if snap is not None and snap['health_ts']:
+            if self.prober is not None:
+                self.prober.stop()
+                self.prober = None
+            states = {name: snap[f'{name}_state'] for name in SERVICES}
+        else:
+            if self.prober is None:
+                # No collector: probe in the background and push changes to the loop
+                self.prober = HealthProber(on_result=self._on_probe).start()
+            states = {name: result.state for name, result in self.prober.status().items()}
+        
+        changed = states != self.health
+        self.health = states
+        return changed
+    
+    def _on_probe(self, name, result, changed):
+        """Prober thread callback: wake the loop only when a state flipped"""
+        if changed:
+            self.loop.post(self.refresh_health)
     
     def render(self):
         """Render the sidebar menu"""
-        self.width, self.height = shutil.get_terminal_size()
-        
-        # Clear screen
-        sys.stdout.write("\033[H\033[J")
+        self.width, self.height = self.screen.resize(*self.loop.size)
+        screen = self.screen
+        screen.clear()
         
         # Get box characters
         box = box_chars('double')
@@ -64,15 +78,12 @@ class Controller:
         menu_start_y = 2
         
         # Draw top border
-        sys.stdout.write(f"\033[{menu_start_y};2H")
-        sys.stdout.write(col(box['tl'] + box['h'] * (menu_width - 2) + box['tr'], C_PRIMARY))
+        screen.draw(menu_start_y, 2, col(box['tl'] + box['h'] * (menu_width - 2) + box['tr'], C_PRIMARY))
         
         # Draw menu items
         current_y = menu_start_y + 1
         
         for i, item in enumerate(self.menu_items):
-            sys.stdout.write(f"\033[{current_y};2H")
-            
             if i == self.menu_idx:
                 # Selected item
                 prefix = "➜ "
@@ -85,60 +96,59 @@ class Controller:
             
             # Pad to full width
             padding = " " * (menu_width - len(prefix) - len(item) - 4)
-            sys.stdout.write(col(box['v'], C_PRIMARY) + " " + line + padding + " " + col(box['v'], C_PRIMARY))
+            screen.draw(current_y, 2, col(box['v'], C_PRIMARY) + " " + line + padding + " " + col(box['v'], C_PRIMARY))
             
             current_y += 1
         
         # Draw separator
         current_y += 1
-        sys.stdout.write(f"\033[{current_y};2H")
-        sys.stdout.write(col(box['l'] + box['h'] * (menu_width - 2) + box['r'], C_PRIMARY))
+        screen.draw(current_y, 2, col(box['l'] + box['h'] * (menu_width - 2) + box['r'], C_PRIMARY))
         current_y += 1
         
         # Cloudflare Tunnel notification
-        if not self.tunnel_connected and not self.check_tunnel_status():
-            sys.stdout.write(f"\033[{current_y};2H")
-            sys.stdout.write(col(box['v'], C_PRIMARY))
-            sys.stdout.write(" " + col("⚠ ", C_ERROR) + col("LXC not connected!", C_TEXT))
+        if not self.tunnel_connected and self.health['tunnel'] != UP:
+            screen.draw(current_y, 2, col(box['v'], C_PRIMARY) + " " + col("⚠ ", C_ERROR) + col("LXC not connected!", C_TEXT))
             
             current_y += 1
-            sys.stdout.write(f"\033[{current_y};2H")
-            sys.stdout.write(col(box['v'], C_PRIMARY))
-            sys.stdout.write(" " + col("Connect now in SETTINGS", C_MUTED))
+            screen.draw(current_y, 2, col(box['v'], C_PRIMARY) + " " + col("Connect now in SETTINGS", C_MUTED))
             
             current_y += 1
         else:
-            sys.stdout.write(f"\033[{current_y};2H")
-            sys.stdout.write(col(box['v'], C_PRIMARY))
-            sys.stdout.write(" " + col("✓ Tunnel active", C_SUCCESS))
+            screen.draw(current_y, 2, col(box['v'], C_PRIMARY) + " " + col("✓ Tunnel active", C_SUCCESS))
             current_y += 1
         
+        # Brain orchestration stack
+        services = ""
+        for name in ('nomad', 'consul', 'vault'):
+            state = self.health[name]
+            color = C_SUCCESS if state == UP else C_ERROR if state == DOWN else C_MUTED
+            services += col("● ", color) + col(name.capitalize() + " ", C_TEXT)
+        screen.draw(current_y, 2, col(box['v'], C_PRIMARY) + " " + services)
+        current_y += 1
+        
         # Fill remaining space
         while current_y < self.height - 1:
-            sys.stdout.write(f"\033[{current_y};2H")
-            sys.stdout.write(col(box['v'] + " " * (menu_width - 2) + box['v'], C_PRIMARY))
+            screen.draw(current_y, 2, col(box['v'] + " " * (menu_width - 2) + box['v'], C_PRIMARY))
             current_y += 1
         
         # Bottom border
-        sys.stdout.write(f"\033[{current_y};2H")
-        sys.stdout.write(col(box['bl'] + box['h'] * (menu_width - 2) + box['br'], C_PRIMARY))
+        screen.draw(current_y, 2, col(box['bl'] + box['h'] * (menu_width - 2) + box['br'], C_PRIMARY))
         
-        sys.stdout.flush()
+        # Only the cells that changed since the last frame are sent
+        screen.flush()
     
     def handle_input(self, key):
         """Handle keyboard input"""
-        if key == '\x1b':  # Escape sequence
-            # Read next 2 characters for arrow keys
-            next_chars = sys.stdin.read(2)
-            if next_chars == '[A':  # Up arrow
-                self.menu_idx = max(0, self.menu_idx - 1)
-            elif next_chars == '[B':  # Down arrow
-                self.menu_idx = min(len(self.menu_items) - 1, self.menu_idx + 1)
-        
-        elif key == '\r' or key == '\n':  # Enter
+        if key == KEY_UP:
+            self.menu_idx = max(0, self.menu_idx - 1)
+        
+        elif key == KEY_DOWN:
+            self.menu_idx = min(len(self.menu_items) - 1, self.menu_idx + 1)
+        
+        elif key in KEY_ENTER:
             self.execute_menu_item()
         
-        elif key == '\x03':  # Ctrl+C
+        elif key == KEY_CTRL_C:
             self.running = False
     
     def execute_menu_item(self):
@@ -147,40 +157,42 @@ class Controller:
         
         # Send command via IPC to viewport manager
         if selected == "DASHBOARD":
-            ipc.send("SHOW_DASHBOARD")
+            self.send("SHOW_DASHBOARD")
         elif selected == "CONNECT BRAIN":
-            ipc.send("CONNECT_BRAIN")
+            self.send("CONNECT_BRAIN")
         elif selected == "CONNECT GUARD":
-            ipc.send("CONNECT_GUARD")
+            self.send("CONNECT_GUARD")
         elif selected == "LIVE LOGS":
-            ipc.send("SHOW_LOGS")
+            self.send("SHOW_LOGS")
         elif selected == "TIME MACHINE":
-            ipc.send("SHOW_TIMEMACHINE")
+            self.send("SHOW_TIMEMACHINE")
         elif selected == "SETTINGS":
-            ipc.send("SHOW_SETTINGS")
+            self.send("SHOW_SETTINGS")
         elif selected == "DISCONNECT":
-            ipc.send("DISCONNECT")
+            self.send("DISCONNECT")
         elif selected == "EXIT":
-            ipc.send("EXIT")
+            self.send("EXIT")
             self.running = False
     
+    def stop(self):
+        """Leave the main loop (safe to call from another thread)"""
+        self.running = False
+        self.loop.stop()
+    
     def run(self):
         """Main loop"""
         # Setup terminal
-        fd = sys.stdin.fileno()
+        fd = self.loop.fd
         old_settings = termios.tcgetattr(fd)
         
         try:
             tty.setraw(fd)
-            sys.stdout.write("\033[?25l")  # Hide cursor
+            self.screen.out.write("\033[?25l")  # Hide cursor
             
-            while self.running:
-                self.render()
-                
-                # Check for input (timeout 0.1s)
-                if select.select([sys.stdin], [], [], 0.1)[0]:
-                    key = sys.stdin.read(1)
-                    self.handle_input(key)
+            # Redraw only on keys, resize, or a service state change
+            self.refresh_health()
+            self.loop.every(2, self.refresh_health)
+            self.loop.run(self.render, self.handle_input, lambda: self.running)
         
         except Exception as e:
             with open(config.get('LOG_FILE', '/tmp/oopuo.log'), 'a') as f:
@@ -188,7 +200,8 @@ class Controller:
         
         finally:
             termios.tcsetattr(fd, termios.TCSADRAIN, old_settings)
-            sys.stdout.write("\033[?25h")  # Show cursor
+            self.screen.out.write("\033[?25h")  # Show cursor
+            self.screen.out.flush()
 
 if __name__ == "__main__":
     controller = Controller()
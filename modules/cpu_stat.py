@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+OOPUO Desktop Environment - CPU Utilization Collector
+Per-core and per-NUMA-node utilization from /proc/stat deltas
+"""
+import os
+import glob
+import operator
+from array import array
+
+PROC_STAT = "/proc/stat"
+
+def _delta(new, old):
+    """Counter increase, 0 if the counter went backwards"""
+    return new - old if new > old else 0
+
+def parse_cpulist(text):
+    """Parse a sysfs cpulist such as '0-15,32-47' into a list of ints"""
+    cpus = []
+    for part in text.strip().split(','):
+        if not part:
+            continue
+        if '-' in part:
+            lo, hi = part.split('-')
+            cpus.extend(range(int(lo), int(hi) + 1))
+        else:
+            cpus.append(int(part))
+    return cpus
+
+class CPUCollector:
+    """
+    Samples /proc/stat once per tick and turns counter deltas into utilization
+
+    Counters are kept in flat arrays (slot 0 = aggregate, slot i+1 = core i)
+    so every sample is one read plus one pass over all cores.
+    """
+
+    # Fields: user nice system idle iowait irq softirq steal (guest is already in user)
+    BUSY_FIELDS = 8
+
+    def __init__(self):
+        self.fd = os.open(PROC_STAT, os.O_RDONLY)
+        self.cores = []               # core ids in /proc/stat order
+        self.prev_total = array('Q')
+        self.prev_idle = array('Q')
+        self.aggregate = 0.0
+        self.per_core = array('f')
+        self.per_node = {}
+        self.numa_nodes = self._read_numa()
+        self.node_slots = {}
+
+        # Prime counters so the first real sample has a delta
+        self.sample()
+
+    def _read_numa(self):
+        """Map NUMA node -> list of core ids"""
+        nodes = {}
+        for path in glob.glob('/sys/devices/system/node/node[0-9]*/cpulist'):
+            node = int(path.split('/')[-2][4:])
+            try:
+                with open(path, 'r') as f:
+                    nodes[node] = parse_cpulist(f.read())
+            except (OSError, ValueError):
+                continue
+        return dict(sorted(nodes.items()))
+
+    def _map_nodes(self):
+        """Translate NUMA core lists into counter slots (only for multi-node hosts)"""
+        self.node_slots = {}
+        if len(self.numa_nodes) < 2:
+            return
+        slot = {core: i + 1 for i, core in enumerate(self.cores)}
+        for node, node_cores in self.numa_nodes.items():
+            self.node_slots[node] = [slot[c] for c in node_cores if c in slot]
+
+    def _read_stat(self):
+        """Read the cpu lines of /proc/stat through the persistent fd"""
+        os.lseek(self.fd, 0, os.SEEK_SET)
+        chunks = []
+        while True:
+            chunk = os.read(self.fd, 65536)
+            if not chunk:
+                break
+            chunks.append(chunk)
+            # Everything after the cpu block (intr, ctxt, ...) is irrelevant
+            if b'\nintr' in chunk:
+                break
+        return b''.join(chunks)
+
+    def sample(self):
+        """
+        Take one sample
+
+        Returns:
+            Aggregate utilization percentage (float)
+        """
+        try:
+            data = self._read_stat()
+        except OSError:
+            return self.aggregate
+
+        # The cpu block is a fixed-width table: one label plus N counters per row
+        end = data.find(b'\nintr')
+        tokens = data[:end if end >= 0 else len(data)].split()
+        stride = tokens.index(b'cpu0') if b'cpu0' in tokens else len(tokens)
+        labels = tokens[::stride]
+        del tokens[::stride]
+        ncols = stride - 1
+
+        # Parse only the columns we need (user, nice, system, idle, iowait, irq, softirq, steal)
+        cols = [array('Q', map(int, tokens[k::ncols])) for k in range(min(ncols, self.BUSY_FIELDS))]
+        totals = array('Q', map(sum, zip(*cols)))
+        idles = array('Q', map(operator.add, cols[3], cols[4]))
+        cores = [int(label[3:]) for label in labels[1:]]
+
+        # Hotplug changed the core set - restart the delta baseline
+        if cores != self.cores or len(totals) != len(self.prev_total):
+            self.cores = cores
+            self._map_nodes()
+            self.prev_total = totals
+            self.prev_idle = idles
+            self.per_core = array('f', bytes(4 * len(cores)))
+            return self.aggregate
+
+        # Busy share per slot, computed in one pass over the arrays. Per-CPU
+        # iowait can go backwards (proc(5)), so deltas are clamped at 0 and
+        # idle at the total: the baseline still advances below
+        d_total = array('Q', map(_delta, totals, self.prev_total))
+        d_idle = array('Q', map(min, map(_delta, idles, self.prev_idle), d_total))
+        util = array('f', [
+            ((dt - di) * 100.0 / dt) if dt else 0.0
+            for dt, di in zip(d_total, d_idle)
+        ])
+
+        self.aggregate = util[0]
+        self.per_core = util[1:]
+
+        # NUMA nodes: weight cores by their tick deltas
+        per_node = {}
+        for node, slots in self.node_slots.items():
+            total = sum(map(d_total.__getitem__, slots))
+            idle = sum(map(d_idle.__getitem__, slots))
+            per_node[node] = ((total - idle) * 100.0 / total) if total else 0.0
+        self.per_node = per_node
+
+        self.prev_total = totals
+        self.prev_idle = idles
+
+        return self.aggregate
+
+    def hottest_core(self):
+        """Return (core_id, percent) of the busiest core"""
+        if not self.per_core:
+            return None, 0.0
+        i = max(range(len(self.per_core)), key=self.per_core.__getitem__)
+        return self.cores[i], self.per_core[i]
+
+    def close(self):
+        try:
+            os.close(self.fd)
+        except OSError:
+            pass
@@ -3,120 +3,232 @@
 OOPUO Desktop Environment - Dashboard
 Main information display
 """
-import sys
-import shutil
-from colors import col, box_chars, bold, C_PRIMARY, C_SUCCESS, C_ERROR, C_MUTED, C_TEXT
+import tty
+import termios
+from colors import col, bold, temp_color, C_PRIMARY, C_SUCCESS, C_ERROR, C_MUTED, C_TEXT, C_ACCENT
 from config import config
-import subprocess
+from shm import SnapshotReader
+from gpu_sampler import GPUSampler, summarize, throttle_labels
+from cgroups import GuestAccounting
+from pve_status import pve_status
+from screen import Screen
+from eventloop import EventLoop
+import time
+
+snapshot = SnapshotReader()
+
+def _status_label(state):
+    """Map a collector state (-1/0/1) to a status label"""
+    if state == 1:
+        return col("● RUNNING", C_SUCCESS)
+    elif state == 0:
+        return col("● STOPPED", C_ERROR)
+    return col("● UNKNOWN", C_MUTED)
+
+def _shared_state(field, guest_id, id_key):
+    """Guest state from the collector daemon, or None if unavailable"""
+    snap = snapshot.read(max_age=30)
+    if snap is None or guest_id != config.get(id_key) or snap[field] < 0:
+        return None
+    return snap[field]
 
 def get_vm_status(vmid):
     """Get VM status"""
-    try:
-        result = subprocess.run(
-            f"qm status {vmid}",
-            shell=True,
-            capture_output=True,
-            text=True,
-            timeout=2
-        )
-        if "running" in result.stdout:
-            return col("● RUNNING", C_SUCCESS)
-        else:
-            return col("● STOPPED", C_ERROR)
-    except:
-        return col("● UNKNOWN", C_MUTED)
+    state = _shared_state('brain_state', vmid, 'ids.brain_vm')
+    if state is not None:
+        return _status_label(state)
+    
+    # One cached /cluster/resources call serves every guest
+    return _status_label(pve_status.state(vmid))
 
 def get_ct_status(ctid):
     """Get CT status"""
-    try:
-        result = subprocess.run(
-            f"pct status {ctid}",
-            shell=True,
-            capture_output=True,
-            text=True,
-            timeout=2
+    state = _shared_state('guard_state', ctid, 'ids.guard_ct')
+    if state is not None:
+        return _status_label(state)
+    
+    # One cached /cluster/resources call serves every guest
+    return _status_label(pve_status.state(ctid))
+
+def get_guest_usage():
+    """Per-guest cgroup usage keyed by name ('brain', 'guard')"""
+    snap = snapshot.read(max_age=30)
+    if snap is not None and snap['guests']:
+        return {guest['name']: guest for guest in snap['guests']}
+    
+    # No collector: take two samples so the rates have a delta
+    accounting = GuestAccounting()
+    if not accounting.available:
+        return {}
+    accounting.sample()
+    time.sleep(0.5)
+    usage = accounting.sample()
+    accounting.close()
+    return {guest['name']: guest for guest in usage}
+
+def format_guest_usage(guest):
+    """Compact one-line usage summary for a running guest"""
+    if not guest or guest['state'] != 1:
+        return ""
+    
+    gib = 1024 ** 3
+    mem = f"{guest['mem_current'] / gib:.1f}"
+    if guest['mem_max']:
+        mem += f"/{guest['mem_max'] / gib:.1f}"
+    io = f"{guest['io_read'] / 1048576:.1f}/{guest['io_write'] / 1048576:.1f}"
+    
+    def psi(label, value):
+        color = C_ERROR if value >= 25 else C_ACCENT if value >= 5 else C_MUTED
+        return col(f"{label} {value:.0f}%", color)
+    
+    text = col(f"   CPU {guest['cpu']:.2f}c  MEM {mem}G  IO r/w {io} MB/s  PSI ", C_MUTED)
+    text += psi("cpu", guest['cpu_some']) + " " + psi("mem", guest['mem_some']) + " " + psi("io", guest['io_some'])
+    if guest['throttled'] >= 1:
+        text += col(f"  THROTTLED {guest['throttled']:.0f}%", C_ERROR)
+    return text
+
+def get_gpu_devices():
+    """Per-GPU telemetry from the collector, or one local sampling pass"""
+    snap = snapshot.read(max_age=5)
+    if snap is not None:
+        return snap['gpus']
+    
+    sampler = GPUSampler().start()
+    devices = sampler.wait(timeout=2.0)
+    sampler.stop()
+    return devices
+
+def render_gpu_table(screen, devices, start_y, max_y):
+    """Draw the per-GPU table; returns the next free row"""
+    screen.draw(start_y, 2, bold(col(f"GPUS ({len(devices)})", C_TEXT)))
+    
+    if not devices:
+        screen.draw(start_y + 2, 2, col("No GPU detected", C_MUTED))
+        return start_y + 3
+    
+    _, _, worst = summarize(devices)
+    
+    screen.draw(start_y + 2, 2, col(
+        f"{'#':<3}{'NAME':<24}{'UTIL':>6}{'MEMORY':>16}{'TEMP':>7}{'POWER':>8}{'SM':>9}  THROTTLE",
+        C_MUTED
+    ))
+    
+    y = start_y + 3
+    for gpu in devices:
+        if y >= max_y:
+            break
+        
+        mem = f"{gpu['mem_used'] / 1024:.1f}/{gpu['mem_total'] / 1024:.1f}G"
+        reasons = ",".join(throttle_labels(gpu['throttle'])) or "-"
+        row = (
+            f"{gpu['index']:<3}{gpu['name'][:23]:<24}{int(gpu['util']):>5}%{mem:>16}"
         )
-        if "running" in result.stdout:
-            return col("● RUNNING", C_SUCCESS)
-        else:
-            return col("● STOPPED", C_ERROR)
-    except:
-        return col("● UNKNOWN", C_MUTED)
+        screen.draw(y, 2,
+            col(row, C_ACCENT if gpu is worst and len(devices) > 1 else C_TEXT)
+            + col(f"{int(gpu['temp']):>5}°C", temp_color(gpu['temp']))
+            + col(f"{gpu['power']:>7.0f}W{int(gpu['sm_clock']):>6}MHz  ", C_TEXT)
+            + col(reasons, C_ERROR if reasons != "-" else C_MUTED)
+        )
+        y += 1
+    
+    return y + 1
+
+class Dashboard:
+    """Main information display"""
+    
+    def __init__(self, loop=None, screen=None):
+        self.running = True
+        self.loop = loop or EventLoop()
+        self.screen = screen or Screen()
+        self.width, self.height = self.screen.resize(*self.loop.size)
+        self.state = {}
+    
+    def refresh(self):
+        """Gather the page contents once (may block briefly without collectord)"""
+        brain_vm = config.get('ids.brain_vm', 200)
+        guard_ct = config.get('ids.guard_ct', 100)
+        usage = get_guest_usage()
+        
+        self.state = {
+            'brain': col(f"Brain (VM {brain_vm}):   ", C_TEXT) + get_vm_status(brain_vm) + format_guest_usage(usage.get('brain')),
+            'guard': col(f"Guard (CT {guard_ct}):   ", C_TEXT) + get_ct_status(guard_ct) + format_guest_usage(usage.get('guard')),
+            'gpus': get_gpu_devices()
+        }
+    
+    def render(self):
+        """Render the dashboard"""
+        self.width, self.height = self.screen.resize(*self.loop.size)
+        screen = self.screen
+        screen.clear()
+        
+        # Title
+        screen.draw(2, 2, bold(col("═══ OOPUO DASHBOARD ═══", C_PRIMARY)))
+        
+        # System Status
+        screen.draw(4, 2, bold(col("SYSTEM STATUS", C_TEXT)))
+        
+        screen.draw(6, 2, self.state['brain'])
+        
+        screen.draw(7, 2, self.state['guard'])
+        
+        # Network Info
+        screen.draw(9, 2, bold(col("NETWORK", C_TEXT)))
+        
+        brain_ip = config.get('network.brain_ip', 'Not configured')
+        guard_ip = config.get('network.guard_ip', 'Not configured')
+        
+        screen.draw(11, 2, col(f"Brain IP:  {brain_ip}", C_MUTED))
+        
+        screen.draw(12, 2, col(f"Guard IP:  {guard_ip}", C_MUTED))
+        
+        # Services
+        screen.draw(14, 2, bold(col("SERVICES", C_TEXT)))
+        
+        screen.draw(16, 2, col(f"Coolify:  http://{brain_ip}:8000", C_PRIMARY))
+        
+        screen.draw(17, 2, col(f"Jupyter:  http://{brain_ip}:8888", C_PRIMARY))
+        
+        screen.draw(18, 2, col(f"SSH:      ssh adminuser@{brain_ip}", C_PRIMARY))
+        
+        # GPUs
+        render_gpu_table(screen, self.state['gpus'], 20, self.height - 4)
+        
+        # Instructions
+        screen.draw(self.height-3, 2, col("Use the sidebar menu to navigate  |  Press Q to close", C_MUTED))
+        
+        screen.flush()
+    
+    def handle_input(self, key):
+        """Q closes the dashboard"""
+        if key.lower() == 'q':
+            self.running = False
+    
+    def stop(self):
+        """Leave the main loop (safe to call from another thread)"""
+        self.running = False
+        self.loop.stop()
+    
+    def run(self):
+        """Main loop"""
+        self.refresh()
+        
+        fd = self.loop.fd
+        old_settings = termios.tcgetattr(fd)
+        
+        try:
+            tty.setraw(fd)
+            self.screen.out.write("\033[?25l")  # Hide cursor
+            
+            self.loop.run(self.render, self.handle_input, lambda: self.running)
+        
+        finally:
+            termios.tcsetattr(fd, termios.TCSADRAIN, old_settings)
+            self.screen.out.write("\033[?25h")  # Show cursor
+            self.screen.out.flush()
 
 def show_dashboard():
     """Display the main dashboard"""
-    width, height = shutil.get_terminal_size()
-    
-    # Clear screen
-    sys.stdout.write("\033[H\033[J")
-    
-    box = box_chars('double')
-    
-    # Title
-    sys.stdout.write("\033[2;2H")
-    sys.stdout.write(bold(col("═══ OOPUO DASHBOARD ═══", C_PRIMARY)))
-    
-    # System Status
-    sys.stdout.write("\033[4;2H")
-    sys.stdout.write(bold(col("SYSTEM STATUS", C_TEXT)))
-    
-    brain_vm = config.get('ids.brain_vm', 200)
-    guard_ct = config.get('ids.guard_ct', 100)
-    
-    sys.stdout.write("\033[6;2H")
-    vm_status = get_vm_status(brain_vm)
-    sys.stdout.write(col(f"Brain (VM {brain_vm}):   ", C_TEXT) + vm_status)
-    
-    sys.stdout.write("\033[7;2H")
-    ct_status = get_ct_status(guard_ct)
-    sys.stdout.write(col(f"Guard (CT {guard_ct}):   ", C_TEXT) + ct_status)
-    
-    # Network Info
-    sys.stdout.write("\033[9;2H")
-    sys.stdout.write(bold(col("NETWORK", C_TEXT)))
-    
-    brain_ip = config.get('network.brain_ip', 'Not configured')
-    guard_ip = config.get('network.guard_ip', 'Not configured')
-    
-    sys.stdout.write("\033[11;2H")
-    sys.stdout.write(col(f"Brain IP:  {brain_ip}", C_MUTED))
-    
-    sys.stdout.write("\033[12;2H")
-    sys.stdout.write(col(f"Guard IP:  {guard_ip}", C_MUTED))
-    
-    # Services
-    sys.stdout.write("\033[14;2H")
-    sys.stdout.write(bold(col("SERVICES", C_TEXT)))
-    
-    sys.stdout.write("\033[16;2H")
-    sys.stdout.write(col(f"Coolify:  http://{brain_ip}:8000", C_PRIMARY))
-    
-    sys.stdout.write("\033[17;2H")
-    sys.stdout.write(col(f"Jupyter:  http://{brain_ip}:8888", C_PRIMARY))
-    
-    sys.stdout.write("\033[18;2H")
-    sys.stdout.write(col(f"SSH:      ssh adminuser@{brain_ip}", C_PRIMARY))
-    
-    # Instructions
-    sys.stdout.write(f"\033[{height-3};2H")
-    sys.stdout.write(col("Use the sidebar menu to navigate  |  Press Q to close", C_MUTED))
-    
-    sys.stdout.flush()
-    
-    # Wait for Q key
-    import tty, termios, select
-    fd = sys.stdin.fileno()
-    old_settings = termios.tcgetattr(fd)
-    
-    try:
-        tty.setraw(fd)
-        while True:
-            if select.select([sys.stdin], [], [], 0.1)[0]:
-                key = sys.stdin.read(1)
-                if key.lower() == 'q':
-                    break
-    finally:
-        termios.tcsetattr(fd, termios.TCSADRAIN, old_settings)
+    Dashboard().run()
 
 if __name__ == "__main__":
     show_dashboard()
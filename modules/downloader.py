@@ -0,0 +1,352 @@
+#!/usr/bin/env python3
+"""
+OOPUO Desktop Environment - Asset Downloader
+Parallel, resumable, checksum-verified downloads through a content-addressed cache
+"""
+import os
+import json
+import time
+import shutil
+import hashlib
+import threading
+import http.client
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from config import config, LOG_FILE
+
+# Proxmox's appliance index, refreshed by `pveam update`
+APLINFO_INDEX = "/var/lib/pve-manager/apl-info/download.proxmox.com"
+APLINFO_BASE = "http://download.proxmox.com/images"
+
+BLOCK = 1 << 20     # read/hash granularity
+
+class DownloadError(Exception):
+    """A download that failed or did not match its checksum"""
+
+def log(msg):
+    """Write to log file"""
+    ts = datetime.now().strftime('%H:%M:%S')
+    with open(LOG_FILE, 'a') as f:
+        f.write(f"[DOWNLOAD] [{ts}] {msg}\n")
+
+def file_digest(path, algo='sha256'):
+    """
+    Hex digest of a (large) file
+
+    Cached in a sidecar file `<path>.<algo>` written next to the file
+    (e.g. `ubuntu-24.04-cloud.img.sha256` beside the cloud image in the
+    ISO storage) holding its size, mtime and digest, so the file is only
+    read again after it changed. Removing a sidecar is always safe; in
+    a read-only directory the file is simply hashed every time.
+    """
+    stat = os.stat(path)
+    stamp = f"{stat.st_size} {int(stat.st_mtime)}"
+    cache = f"{path}.{algo}"
+    try:
+        with open(cache) as f:
+            cached_stamp, digest = f.read().rsplit(' ', 1)
+        if cached_stamp == stamp:
+            return digest.strip()
+    except (OSError, ValueError):
+        pass
+
+    digest = hashlib.new(algo)
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(BLOCK), b''):
+            digest.update(block)
+    digest = digest.hexdigest()
+    try:
+        with open(cache, 'w') as f:
+            f.write(f"{stamp} {digest}\n")
+    except OSError:
+        pass
+    return digest
+
+def parse_sums(text):
+    """`<hex> [*]<filename>` lines (SHA256SUMS and friends) -> {filename: hex}"""
+    sums = {}
+    for line in text.splitlines():
+        fields = line.split()
+        if len(fields) == 2:
+            sums[fields[1].lstrip('*')] = fields[0].lower()
+    return sums
+
+def fetch_sums(url, timeout=15):
+    """Checksum list published next to a file: SHA256SUMS in the same directory"""
+    sums_url = url.rsplit('/', 1)[0] + '/SHA256SUMS'
+    try:
+        with urllib.request.urlopen(sums_url, timeout=timeout) as response:
+            return parse_sums(response.read().decode('utf-8', 'replace'))
+    except (OSError, http.client.HTTPException) as e:
+        log(f"No checksums from {sums_url}: {e}")
+        return {}
+
+def aplinfo_entry(template, index=APLINFO_INDEX):
+    """
+    (url, sha512) of a container template from the pveam index, or None
+
+    The index is a list of `key: value` stanzas separated by blank lines.
+    """
+    try:
+        with open(index) as f:
+            text = f.read()
+    except OSError:
+        return None
+    for stanza in text.split('\n\n'):
+        fields = {}
+        for line in stanza.splitlines():
+            key, sep, value = line.partition(': ')
+            if sep:
+                fields[key.strip()] = value.strip()
+        if fields.get('template') == template and 'location' in fields and 'sha512sum' in fields:
+            return f"{APLINFO_BASE}/{fields['location']}", fields['sha512sum'].lower()
+    return None
+
+class Downloader:
+    """
+    Fetches large files into a content-addressed cache
+
+    The file is split into `chunk_mb` ranges fetched by `workers`
+    threads with HTTP Range requests and written in place into a
+    preallocated `.part` file. Finished ranges are recorded beside it,
+    so an interrupted download resumes with the missing ranges only (if
+    the server still reports the same size and ETag, and the chunk size
+    is unchanged). Servers without
+    range support get a single stream. The result is hashed and, if it
+    matches, renamed into `<cache>/<algo>/<hex>`; destinations are
+    hard links (or copies) put in place with an atomic rename, so
+    nothing ever sees a truncated file under its final name, and a
+    second request for the same content is a cache hit. Objects and
+    destinations get file_digest() sidecars (`<name>.<algo>`) beside
+    them.
+
+    Args:
+        cache_dir: Cache root (default `downloads.cache_dir`)
+        workers: Parallel range requests
+        chunk_mb: Range size in MiB
+        retries: Attempts per range before the download fails
+        timeout: Socket timeout per request, in seconds
+    """
+
+    def __init__(self, cache_dir=None, workers=None, chunk_mb=None, retries=None, timeout=30):
+        self.cache_dir = cache_dir or config.get('downloads.cache_dir', '/var/cache/oopuo')
+        self.workers = workers or config.get('downloads.workers', 4)
+        self.chunk = (chunk_mb or config.get('downloads.chunk_mb', 16)) << 20
+        self.retries = retries or config.get('downloads.retries', 3)
+        self.timeout = timeout
+
+    # ----- cache -----
+
+    def cached(self, algo, digest):
+        """
+        Path of a cached object, or None
+
+        Destinations are hard links to the object, so a file damaged in
+        place damages the cache too: objects are re-hashed when their
+        size or mtime changed, and dropped if they no longer match.
+        """
+        path = os.path.join(self.cache_dir, algo, digest.lower())
+        if not os.path.exists(path):
+            return None
+        if file_digest(path, algo) != digest.lower():
+            log(f"Cached {algo} {digest[:16]} is damaged, dropping it")
+            for stale in (path, f"{path}.{algo}"):
+                if os.path.exists(stale):
+                    os.remove(stale)
+            return None
+        return path
+
+    def place(self, source, dest):
+        """Atomically put `source` (a cache object) at `dest`"""
+        os.makedirs(os.path.dirname(dest) or '.', exist_ok=True)
+        tmp = f"{dest}.tmp{os.getpid()}"
+        try:
+            os.link(source, tmp)
+        except OSError:
+            shutil.copyfile(source, tmp)    # other filesystem
+        os.replace(tmp, dest)
+
+    # ----- HTTP -----
+
+    def _open(self, url, start=None, end=None):
+        request = urllib.request.Request(url, headers={'User-Agent': 'oopuo-downloader'})
+        if start is not None:
+            request.add_header('Range', f"bytes={start}-{end}")
+        return urllib.request.urlopen(request, timeout=self.timeout)
+
+    def probe(self, url):
+        """(size, etag, supports ranges) of a remote file"""
+        with self._open(url, 0, 0) as response:
+            etag = response.headers.get('ETag', '')
+            if response.status == 206:
+                # Content-Range: bytes 0-0/123456
+                total = response.headers.get('Content-Range', '').rpartition('/')[2]
+                if total.isdigit():
+                    return int(total), etag, True
+            length = response.headers.get('Content-Length')
+            return (int(length) if length else None), etag, False
+
+    def _fetch_range(self, url, fd, start, end):
+        """Download bytes start..end (inclusive) into fd at the same offset"""
+        offset = start
+        for attempt in range(1, self.retries + 1):
+            try:
+                # A retry asks only for what the dropped attempt did not deliver
+                with self._open(url, offset, end) as response:
+                    if response.status != 206:
+                        raise DownloadError(f"range {start}-{end}: HTTP {response.status}")
+                    while offset <= end:
+                        block = response.read(min(BLOCK, end - offset + 1))
+                        if not block:
+                            break
+                        os.pwrite(fd, block, offset)
+                        offset += len(block)
+                if offset == end + 1:
+                    return
+                raise DownloadError(f"range {start}-{end}: connection closed at {offset}")
+            except (OSError, http.client.HTTPException, DownloadError) as e:
+                if attempt == self.retries:
+                    raise DownloadError(f"{url}: {e}") from e
+                time.sleep(attempt)
+
+    def _stream(self, url, part):
+        """Whole file in one request (no range support)"""
+        for attempt in range(1, self.retries + 1):
+            try:
+                with self._open(url) as response, open(part, 'wb') as f:
+                    shutil.copyfileobj(response, f, BLOCK)
+                return
+            except (OSError, http.client.HTTPException) as e:
+                if attempt == self.retries:
+                    raise DownloadError(f"{url}: {e}") from e
+                time.sleep(attempt)
+
+    # ----- download -----
+
+    def _download(self, url, part):
+        """Fill `part` with the file at `url`, resuming from its state file"""
+        state_path = f"{part}.json"
+        size, etag, ranges = self.probe(url)
+        if not ranges or not size:
+            self._stream(url, part)
+            return
+
+        state = {}
+        try:
+            with open(state_path) as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            pass
+        # Finished ranges are recorded by their start: with another chunk
+        # size (downloads.chunk_mb changed) they mean other byte ranges
+        if (state.get('url'), state.get('size'), state.get('etag'), state.get('chunk')) != (url, size, etag, self.chunk):
+            state = {'url': url, 'size': size, 'etag': etag, 'chunk': self.chunk, 'done': []}
+        done = set(state['done'])
+
+        chunks = [(start, min(start + self.chunk, size) - 1) for start in range(0, size, self.chunk)]
+        todo = [chunk for chunk in chunks if chunk[0] not in done]
+        if done:
+            log(f"Resuming {os.path.basename(url)}: {len(chunks) - len(todo)}/{len(chunks)} chunks present")
+
+        lock = threading.Lock()
+
+        def fetch(chunk):
+            self._fetch_range(url, fd, *chunk)
+            with lock:
+                done.add(chunk[0])
+                state['done'] = sorted(done)
+                tmp = f"{state_path}.tmp"
+                with open(tmp, 'w') as f:
+                    json.dump(state, f)
+                os.replace(tmp, state_path)
+
+        fd = os.open(part, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            os.ftruncate(fd, size)
+            with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="range") as pool:
+                # list() re-raises the first failed range
+                list(pool.map(fetch, todo))
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    def fetch(self, url, dest, digest=None, algo='sha256'):
+        """
+        Download `url` to `dest`, verified against `digest` if given
+
+        Returns:
+            The file's hex digest
+
+        Raises:
+            DownloadError: Network failure or checksum mismatch
+        """
+        hit = self.cached(algo, digest) if digest else None
+        if hit:
+            log(f"Cache hit for {os.path.basename(dest)}")
+            self.place(hit, dest)
+            return digest
+
+        partial_dir = os.path.join(self.cache_dir, 'partial')
+        os.makedirs(partial_dir, exist_ok=True)
+        part = os.path.join(partial_dir, hashlib.sha256(url.encode()).hexdigest()[:24] + '.part')
+
+        started = time.monotonic()
+        try:
+            self._download(url, part)
+        except (OSError, http.client.HTTPException) as e:
+            raise DownloadError(f"{url}: {e}") from e
+
+        actual = file_digest(part, algo)
+        if digest and actual != digest.lower():
+            # Corrupt: start from scratch next time
+            for path in (part, f"{part}.json", f"{part}.{algo}"):
+                if os.path.exists(path):
+                    os.remove(path)
+            raise DownloadError(f"{url}: {algo} mismatch (got {actual[:16]}, expected {digest[:16]})")
+
+        target = os.path.join(self.cache_dir, algo, actual)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        os.replace(part, target)
+        os.replace(f"{part}.{algo}", f"{target}.{algo}")   # still valid: same size and mtime
+        if os.path.exists(f"{part}.json"):
+            os.remove(f"{part}.json")
+        self.place(target, dest)
+
+        elapsed = time.monotonic() - started
+        size = os.path.getsize(target)
+        log(f"Downloaded {os.path.basename(dest)}: {size >> 20} MiB in {elapsed:.1f}s "
+            f"({size / max(elapsed, 0.001) / 1048576:.1f} MiB/s){'' if digest else ', unverified'}")
+        return actual
+
+    def ensure(self, url, dest, digest=None, algo='sha256'):
+        """
+        Make sure `dest` holds the file: keep it if its checksum matches,
+        otherwise (or if missing or truncated) download it again
+
+        Without a known checksum an existing file is trusted, as before.
+        """
+        if os.path.exists(dest):
+            if digest is None:
+                return None
+            if file_digest(dest, algo) == digest.lower():
+                return digest
+            log(f"{os.path.basename(dest)} does not match its {algo}, downloading again")
+        return self.fetch(url, dest, digest, algo)
+
+if __name__ == "__main__":
+    import sys
+
+    # Fetch one file through the cache: downloader.py <url> <dest> [sha256]
+    if len(sys.argv) < 3:
+        print("usage: downloader.py <url> <dest> [sha256]")
+        sys.exit(2)
+    url, dest = sys.argv[1], sys.argv[2]
+    expected = sys.argv[3] if len(sys.argv) > 3 else fetch_sums(url).get(os.path.basename(url))
+    started = time.monotonic()
+    try:
+        digest = Downloader().ensure(url, dest, expected)
+    except DownloadError as e:
+        print(f"✗ {e}")
+        sys.exit(1)
+    print(f"✓ {dest}: {digest or 'present, unverified'} ({time.monotonic() - started:.1f}s)")
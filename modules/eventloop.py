@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+"""
+OOPUO Desktop Environment - Event Loop
+Redraw only on keypress, SIGWINCH, view timers or posted state changes
+"""
+import os
+import sys
+import time
+import codecs
+import signal
+import shutil
+import selectors
+import threading
+from collections import deque
+
+# Keys as delivered to views
+KEY_UP = '\x1b[A'
+KEY_DOWN = '\x1b[B'
+KEY_RIGHT = '\x1b[C'
+KEY_LEFT = '\x1b[D'
+KEY_ENTER = ('\r', '\n')
+KEY_ESC = '\x1b'
+KEY_CTRL_C = '\x03'
+
+# How long to wait for the rest of an escape sequence
+ESC_TIMEOUT = 0.05
+
+def split_keys(text):
+    """
+    Split raw terminal input into keys
+
+    CSI sequences ("\\x1b[A", "\\x1b[15~") and SS3 sequences ("\\x1bOP")
+    are returned whole; everything else one character at a time.
+    """
+    keys = []
+    i = 0
+    while i < len(text):
+        ch = text[i]
+        if ch == '\x1b' and i + 1 < len(text) and text[i + 1] == '[':
+            j = i + 2
+            while j < len(text) and not ('@' <= text[j] <= '~'):
+                j += 1
+            keys.append(text[i:j + 1])
+            i = j + 1
+        elif ch == '\x1b' and i + 2 < len(text) and text[i + 1] == 'O':
+            keys.append(text[i:i + 3])
+            i += 3
+        else:
+            keys.append(ch)
+            i += 1
+    return keys
+
+class Timer:
+    """A repeating callback owned by an EventLoop"""
+
+    def __init__(self, interval, callback):
+        self.interval = interval
+        self.callback = callback
+        self.deadline = time.monotonic() + interval
+        self.active = True
+
+    def cancel(self):
+        self.active = False
+
+class EventLoop:
+    """
+    selectors-based loop for the interactive panes
+
+    The loop sleeps in select() until its tty has input, a signal or a
+    post() arrives on the self-pipe, or the nearest timer is due. The view
+    is re-rendered only after one of those marked the frame dirty, so an
+    idle pane costs no CPU. The terminal size is cached and refreshed
+    on SIGWINCH, or on notify_resize() when the loop runs off the main
+    thread (signals are only delivered there).
+
+    Args:
+        fd: tty to read keys from (default stdin)
+    """
+
+    def __init__(self, fd=None):
+        self.tty = fd
+        self.fd = sys.stdin.fileno() if fd is None else fd
+        self.size = self._terminal_size()
+        self.timers = []
+        self.posted = deque()
+        self.dirty = True
+        self.running = False
+        self.decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        self.wake_r, self.wake_w = os.pipe()
+        os.set_blocking(self.wake_r, False)
+        os.set_blocking(self.wake_w, False)
+        self.resized = False
+        self.lock = threading.Lock()
+
+    # ----- registration -----
+
+    def every(self, interval, callback):
+        """
+        Call `callback()` every `interval` seconds
+
+        The frame is redrawn after the call unless it returns False.
+        """
+        timer = Timer(interval, callback)
+        self.timers.append(timer)
+        return timer
+
+    def post(self, callback=None):
+        """
+        Push a state change from any thread (wakes the loop and redraws)
+
+        Args:
+            callback: Optional function to run on the loop thread first
+        """
+        with self.lock:
+            self.posted.append(callback)
+        self._wake(b'P')
+
+    def refresh_size(self):
+        """Re-read the terminal size (e.g. after a nested loop owned SIGWINCH)"""
+        self.size = self._terminal_size()
+        self.dirty = True
+
+    def notify_resize(self):
+        """Thread-safe: the tty was resized, re-read its size on the loop"""
+        self.resized = True
+        self._wake(b'W')
+
+    def invalidate(self):
+        """Redraw on the next iteration"""
+        self.dirty = True
+
+    def stop(self):
+        self.running = False
+        self._wake(b'S')
+
+    def _wake(self, byte):
+        try:
+            os.write(self.wake_w, byte)
+        except (BlockingIOError, OSError):
+            pass    # pipe already full: the loop is waking anyway
+
+    def _on_sigwinch(self, *_):
+        self.notify_resize()
+
+    def _terminal_size(self):
+        if self.tty is not None:
+            try:
+                return os.get_terminal_size(self.tty)
+            except OSError:
+                pass
+        return shutil.get_terminal_size()
+
+    # ----- input -----
+
+    def _read_keys(self):
+        """Read whatever is available on stdin and split it into keys"""
+        data = os.read(self.fd, 4096)
+        if not data:
+            self.running = False
+            return []
+        # A lone ESC may be the start of a sequence still in flight
+        if data.endswith(b'\x1b'):
+            sel = selectors.DefaultSelector()
+            sel.register(self.fd, selectors.EVENT_READ)
+            if sel.select(ESC_TIMEOUT):
+                data += os.read(self.fd, 4096)
+            sel.close()
+        return split_keys(self.decoder.decode(data))
+
+    def _drain_wake(self):
+        try:
+            while os.read(self.wake_r, 4096):
+                pass
+        except BlockingIOError:
+            pass
+
+    # ----- main loop -----
+
+    def run(self, render, on_key, keep_running=None):
+        """
+        Run until stop() is called or `keep_running()` returns False
+
+        Args:
+            render: Called with no arguments whenever the frame is dirty
+            on_key: Called with each decoded key
+            keep_running: Optional predicate checked after every event
+        """
+        sel = selectors.DefaultSelector()
+        sel.register(self.fd, selectors.EVENT_READ, 'input')
+        sel.register(self.wake_r, selectors.EVENT_READ, 'wake')
+        # Off the main thread the owner calls notify_resize() instead
+        handles_signal = threading.current_thread() is threading.main_thread()
+        if handles_signal:
+            previous = signal.signal(signal.SIGWINCH, self._on_sigwinch)
+
+        def alive():
+            return self.running and (keep_running is None or keep_running())
+
+        self.running = True
+        self.dirty = True
+        try:
+            while alive():
+                if self.dirty:
+                    self.dirty = False
+                    render()
+                    if not alive():
+                        break
+
+                timeout = None
+                if self.timers:
+                    nearest = min(t.deadline for t in self.timers)
+                    timeout = max(0.0, nearest - time.monotonic())
+
+                for key, _ in sel.select(timeout):
+                    if key.data == 'input':
+                        for k in self._read_keys():
+                            on_key(k)
+                            self.dirty = True
+                            if not alive():
+                                break
+                    else:
+                        self._drain_wake()
+
+                if self.resized:
+                    self.resized = False
+                    self.refresh_size()
+
+                while self.posted:
+                    with self.lock:
+                        callback = self.posted.popleft()
+                    if callback is not None:
+                        callback()
+                    self.dirty = True
+
+                now = time.monotonic()
+                for timer in list(self.timers):
+                    if not timer.active:
+                        self.timers.remove(timer)
+                    elif now >= timer.deadline:
+                        timer.deadline = now + timer.interval
+                        if timer.callback() is not False:
+                            self.dirty = True
+        finally:
+            if handles_signal:
+                signal.signal(signal.SIGWINCH, previous if previous is not None else signal.SIG_DFL)
+            sel.close()
+
+    def close(self):
+        """Release the self-pipe; safe to call again (a reused fd number is left alone)"""
+        for fd in (self.wake_r, self.wake_w):
+            if fd < 0:
+                continue
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+        # post() after this fails on -1 and is ignored
+        self.wake_r = self.wake_w = -1
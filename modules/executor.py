@@ -0,0 +1,350 @@
+#!/usr/bin/env python3
+"""
+OOPUO Desktop Environment - Command Executor
+Every host command runs here: argv only, per-tool limits and timeouts, latency spans
+"""
+import os
+import re
+import json
+import time
+import threading
+import subprocess
+from collections import deque, defaultdict
+from datetime import datetime
+from config import config, LOG_FILE
+
+# Commands of one tool running at the same time (tools not listed: no limit).
+# The PVE tools take cluster-wide locks and mostly queue behind each other
+# anyway; pveam and the boot-config tools must not overlap at all.
+TOOL_LIMITS = {
+    'qm': 4, 'pct': 4, 'pvesh': 4, 'pveam': 1, 'pveum': 1,
+    'lspci': 2, 'tmux': 8, 'update-grub': 1, 'update-initramfs': 1
+}
+
+# Seconds before a command is killed, unless the caller passes its own
+TOOL_TIMEOUTS = {
+    'qm': 300, 'pct': 300, 'pvesh': 30, 'pveam': 1800, 'pveum': 30,
+    'lspci': 10, 'tmux': 5, 'update-grub': 120, 'update-initramfs': 600
+}
+DEFAULT_TIMEOUT = 120
+
+# Options whose value is a secret (pct create --password, qm set --cipassword)
+SECRET_OPTIONS = ('--password', '--cipassword')
+# `pveum user token add` prints the new token's secret as "value"
+SECRET_OUTPUT = re.compile(r'("value"\s*:\s*")[^"]*(")')
+REDACTED = '<redacted>'
+
+# Spans kept for stats()
+SPAN_HISTORY = 2000
+
+def log(msg):
+    """Write to log file"""
+    ts = datetime.now().strftime('%H:%M:%S')
+    # The simulator runs on machines that were never deployed
+    os.makedirs(os.path.dirname(LOG_FILE), exist_ok=True)
+    with open(LOG_FILE, 'a') as f:
+        f.write(f"[EXEC] [{ts}] {msg}\n")
+
+def redact(argv):
+    """argv with the values of SECRET_OPTIONS replaced, for traces and tapes"""
+    redacted = []
+    secret = False
+    for arg in argv:
+        if secret:
+            redacted.append(REDACTED)
+        elif arg.startswith(tuple(option + '=' for option in SECRET_OPTIONS)):
+            redacted.append(arg.split('=', 1)[0] + '=' + REDACTED)
+        else:
+            redacted.append(arg)
+        secret = arg in SECRET_OPTIONS
+    return redacted
+
+def redact_output(argv, stdout):
+    """stdout of a command that prints a secret, with the secret replaced"""
+    if list(argv[:4]) == ['pveum', 'user', 'token', 'add']:
+        return SECRET_OUTPUT.sub(rf"\g<1>{REDACTED}\g<2>", stdout)
+    return stdout
+
+class CommandError(RuntimeError):
+    """A command run with check=True failed; `result` has its output"""
+
+    def __init__(self, result):
+        detail = result.error or result.stderr.strip()[-200:]
+        super().__init__(f"{' '.join(result.argv[:3])} failed ({result.returncode}): {detail}")
+        self.result = result
+
+class Result:
+    """Outcome of one command, and the span it took"""
+
+    def __init__(self, argv, returncode, stdout="", stderr="", duration=0.0, error=None):
+        self.argv = list(argv)
+        self.returncode = returncode
+        self.stdout = stdout
+        self.stderr = stderr
+        self.duration = duration    # seconds the command ran
+        self.waited = 0.0           # seconds queued behind the tool's limit
+        self.started = None         # wall-clock start
+        self.error = error          # "timed out after 5s", "not found", ...
+
+    @property
+    def ok(self):
+        return self.returncode == 0
+
+    @property
+    def timed_out(self):
+        return self.returncode == 124 and bool(self.error)
+
+    @property
+    def tool(self):
+        return os.path.basename(self.argv[0]) if self.argv else ""
+
+    def span(self):
+        return {
+            'tool': self.tool, 'argv': redact(self.argv), 'started': self.started,
+            'duration': round(self.duration, 4), 'waited': round(self.waited, 4),
+            'returncode': self.returncode, 'error': self.error
+        }
+
+# ----- backends: execute(argv, timeout, input) -> Result -----
+
+class LocalBackend:
+    """Runs commands on this host"""
+
+    name = 'local'
+
+    def execute(self, argv, timeout, input=None):
+        started = time.monotonic()
+        try:
+            proc = subprocess.run(
+                argv, input=input, capture_output=True, text=True, timeout=timeout,
+                stdin=None if input is not None else subprocess.DEVNULL
+            )
+        except subprocess.TimeoutExpired as e:
+            stdout = e.stdout.decode(errors='replace') if isinstance(e.stdout, bytes) else (e.stdout or "")
+            return Result(argv, 124, stdout, "", time.monotonic() - started, f"timed out after {timeout}s")
+        except OSError as e:
+            return Result(argv, 127, "", "", time.monotonic() - started, str(e))
+        return Result(argv, proc.returncode, proc.stdout, proc.stderr, time.monotonic() - started)
+
+class RecordingBackend:
+    """
+    Runs commands through another backend and appends each one to a
+    tape (JSON lines), for ReplayBackend to play back elsewhere
+
+    The tape is readable by root only, and secrets are left out of it:
+    passwords on the command line (SECRET_OPTIONS) and the API token
+    pveum prints when it creates one.
+    """
+
+    name = 'record'
+
+    def __init__(self, inner, path):
+        self.inner = inner
+        self.path = path
+        self.lock = threading.Lock()
+
+    def execute(self, argv, timeout, input=None):
+        result = self.inner.execute(argv, timeout, input)
+        entry = {
+            'argv': redact(result.argv), 'returncode': result.returncode,
+            'stdout': redact_output(result.argv, result.stdout),
+            'stderr': result.stderr, 'duration': round(result.duration, 4), 'error': result.error
+        }
+        with self.lock:
+            fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+            os.fchmod(fd, 0o600)    # tapes from before this were world-readable
+            with os.fdopen(fd, 'a') as f:
+                f.write(json.dumps(entry) + "\n")
+        return result
+
+class ReplayBackend:
+    """
+    Answers commands from a tape made by RecordingBackend, taking as
+    long as they took then (times `speed`; 0 answers at once)
+
+    The same argv gets its recorded answers in order, the last one
+    repeating; an argv the tape does not have fails with 127. Secrets
+    were redacted on the tape, so argv is matched redacted as well.
+    """
+
+    name = 'replay'
+
+    def __init__(self, path, speed=1.0):
+        self.speed = speed
+        self.answers = defaultdict(deque)
+        self.lock = threading.Lock()
+        with open(path) as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    self.answers[tuple(entry['argv'])].append(entry)
+
+    def execute(self, argv, timeout, input=None):
+        with self.lock:
+            queue = self.answers.get(tuple(redact(argv)))
+            entry = None
+            if queue:
+                entry = queue.popleft() if len(queue) > 1 else queue[0]
+        if entry is None:
+            return Result(argv, 127, "", "", 0.0, "not on the replay tape")
+        delay = entry['duration'] * self.speed
+        if timeout is not None and delay > timeout:
+            time.sleep(timeout)
+            return Result(argv, 124, "", "", timeout, f"timed out after {timeout}s")
+        time.sleep(delay)
+        return Result(argv, entry['returncode'], entry['stdout'], entry['stderr'], delay, entry.get('error'))
+
+class Executor:
+    """
+    Command runner shared by every module
+
+    Commands are argv lists (no shell). Each tool has a concurrency
+    limit (TOOL_LIMITS, overridable by `executor.limits`) and a default
+    timeout (TOOL_TIMEOUTS / `executor.timeouts`). Every command leaves
+    a span (tool, start, duration, time queued, exit status): stats()
+    aggregates them per tool, write_trace() saves them for profiling.
+
+    Args:
+        backend: LocalBackend (default), RecordingBackend, ReplayBackend
+                 or simulator.SimulatedBackend
+    """
+
+    def __init__(self, backend=None, limits=None, timeouts=None):
+        self.backend = backend or LocalBackend()
+        self.limits = dict(TOOL_LIMITS, **(limits or config.get('executor.limits', {}) or {}))
+        self.timeouts = dict(TOOL_TIMEOUTS, **(timeouts or config.get('executor.timeouts', {}) or {}))
+        self.semaphores = {}
+        self.spans = deque(maxlen=SPAN_HISTORY)
+        self.lock = threading.Lock()
+
+    def _semaphore(self, tool):
+        limit = self.limits.get(tool)
+        if not limit:
+            return None
+        with self.lock:
+            if tool not in self.semaphores:
+                self.semaphores[tool] = threading.BoundedSemaphore(limit)
+            return self.semaphores[tool]
+
+    def run(self, argv, timeout=None, input=None, check=False):
+        """
+        Run a command to completion
+
+        Returns:
+            Result (stdout/stderr as text)
+
+        Raises:
+            CommandError if `check` and the command failed
+        """
+        argv = [str(arg) for arg in argv]
+        tool = os.path.basename(argv[0])
+        if timeout is None:
+            timeout = self.timeouts.get(tool, DEFAULT_TIMEOUT)
+
+        queued = time.monotonic()
+        semaphore = self._semaphore(tool)
+        if semaphore:
+            semaphore.acquire()
+        try:
+            waited = time.monotonic() - queued
+            started = time.time()
+            result = self.backend.execute(argv, timeout, input)
+        finally:
+            if semaphore:
+                semaphore.release()
+
+        result.waited = waited
+        result.started = started
+        with self.lock:
+            self.spans.append(result.span())
+        if check and not result.ok:
+            raise CommandError(result)
+        return result
+
+    def output(self, argv, timeout=None, quiet=False):
+        """stdout of a command, or None if it failed (logged unless `quiet`)"""
+        result = self.run(argv, timeout)
+        if result.ok:
+            return result.stdout
+        if not quiet:
+            log(f"{' '.join(result.argv[:3])}: {result.error or result.stderr.strip()[-200:]}")
+        return None
+
+    def stats(self):
+        """Per tool: {'count', 'failed', 'total', 'p50', 'p95', 'max', 'waited'} (seconds)"""
+        with self.lock:
+            spans = list(self.spans)
+        by_tool = defaultdict(list)
+        for span in spans:
+            by_tool[span['tool']].append(span)
+
+        stats = {}
+        for tool, tool_spans in by_tool.items():
+            durations = sorted(span['duration'] for span in tool_spans)
+            stats[tool] = {
+                'count': len(durations),
+                'failed': sum(1 for span in tool_spans if span['returncode'] != 0),
+                'total': sum(durations),
+                'p50': durations[len(durations) // 2],
+                'p95': durations[min(len(durations) - 1, int(len(durations) * 0.95))],
+                'max': durations[-1],
+                'waited': sum(span['waited'] for span in tool_spans)
+            }
+        return stats
+
+    def summary(self):
+        """One line per tool, slowest total first"""
+        lines = []
+        for tool, s in sorted(self.stats().items(), key=lambda item: -item[1]['total']):
+            failed = f", {s['failed']} failed" if s['failed'] else ""
+            queued = f", queued {s['waited']:.1f}s" if s['waited'] >= 0.05 else ""
+            lines.append(
+                f"{tool:<16} {s['count']:>4}x  total {s['total']:7.2f}s  "
+                f"p50 {s['p50'] * 1000:6.0f}ms  p95 {s['p95'] * 1000:6.0f}ms  max {s['max']:6.2f}s{queued}{failed}"
+            )
+        return lines
+
+    def write_trace(self, path):
+        """Save the recorded spans as JSON lines"""
+        with self.lock:
+            spans = list(self.spans)
+        with open(path, 'w') as f:
+            for span in spans:
+                f.write(json.dumps(span) + "\n")
+
+# Shared executor (see executor())
+_executor = None
+
+def executor():
+    """
+    Shared executor with the backend chosen by `executor.backend`:
+    "local" (default), "simulated", "record" or "replay" (the last two
+    use the tape file `executor.tape`)
+    """
+    global _executor
+    if _executor is None:
+        kind = config.get('executor.backend', 'local')
+        tape = config.get('executor.tape', '/var/log/oopuo/commands.tape')
+        if kind == 'simulated':
+            from simulator import SimulatedBackend
+            backend = SimulatedBackend(speed=config.get('executor.speed', 1.0))
+        elif kind == 'record':
+            backend = RecordingBackend(LocalBackend(), tape)
+        elif kind == 'replay':
+            backend = ReplayBackend(tape, speed=config.get('executor.speed', 1.0))
+        else:
+            backend = LocalBackend()
+        _executor = Executor(backend)
+    return _executor
+
+if __name__ == "__main__":
+    import sys
+
+    # Run a command a few times and show its spans: executor.py hostname -I
+    argv = sys.argv[1:] or ['true']
+    runner = executor()
+    for _ in range(5):
+        result = runner.run(argv)
+        print(f"  exit {result.returncode} in {result.duration * 1000:.1f}ms"
+              + (f" ({result.error})" if result.error else ""))
+    print("\n".join(runner.summary()))
@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+"""
+OOPUO Desktop Environment - Prometheus/OpenMetrics Exporter
+Serves host, GPU, disk, network and guest metrics as OpenMetrics text on a local port
+"""
+import time
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from config import config, LOG_FILE
+from shm import SnapshotReader
+
+OPENMETRICS_TYPE = "application/openmetrics-text; version=1.0.0; charset=utf-8"
+PROMETHEUS_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+def _escape(value):
+    """Escape a label value"""
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items()) + "}"
+
+class MetricFamily:
+    """One metric family: metadata plus samples"""
+
+    def __init__(self, name, help_text, kind='gauge', unit=None):
+        self.name = name
+        self.help = help_text
+        self.kind = kind
+        self.unit = unit
+        self.samples = []
+
+    def add(self, value, **labels):
+        self.samples.append((labels, value))
+        return self
+
+    def render(self):
+        lines = [f"# TYPE {self.name} {self.kind}"]
+        if self.unit:
+            lines.append(f"# UNIT {self.name} {self.unit}")
+        lines.append(f"# HELP {self.name} {self.help}")
+        for labels, value in self.samples:
+            lines.append(f"{self.name}{_labels(labels)} {float(value)!r}")
+        return "\n".join(lines)
+
+class MetricsExporter:
+    """
+    Lightweight HTTP exporter
+
+    The response body is rendered once per collector publish (keyed by the
+    snapshot sequence number) and served from memory for every scrape in
+    between, so high-frequency scraping costs almost nothing.
+    """
+
+    def __init__(self, bind=None, port=None):
+        self.bind = bind or config.get('exporter.bind', '127.0.0.1')
+        self.port = port or config.get('exporter.port', 9847)
+        self.snapshot = SnapshotReader()
+        self.local = None       # MetricsRenderer fallback when collectord is not running
+        self.cache_key = None
+        self.cache_body = b""
+        self.lock = threading.Lock()
+        self.server = None
+
+    def log(self, msg):
+        """Write to log file"""
+        with open(LOG_FILE, 'a') as f:
+            f.write(f"[EXPORTER] {msg}\n")
+
+    # ----- collection -----
+
+    def _current(self):
+        """Return (cache_key, snapshot dict)"""
+        snap = self.snapshot.read(max_age=10)
+        if snap is not None:
+            return ('shm', self.snapshot.last_seq), snap
+
+        # Fall back to the header's collectors, at most once per second
+        key = ('local', int(time.time()))
+        if key == self.cache_key:
+            return key, None
+        if self.local is None:
+            from metrics import MetricsRenderer
+            self.local = MetricsRenderer(collect_locally=True)
+        snap = self.local.collect()
+        snap['ts'] = time.time()
+        for field in ('brain_state', 'guard_state', 'tunnel_state', 'nomad_state',
+                      'consul_state', 'vault_state', 'snapshot_count'):
+            snap.setdefault(field, -1)
+        snap.setdefault('guests', [])
+        return key, snap
+
+    def families(self, snap):
+        """Build metric families from a snapshot dict"""
+        fams = []
+
+        fams.append(MetricFamily('oopuo_cpu_utilization_ratio', "Aggregate host CPU utilization", unit='ratio')
+                    .add(snap['cpu'] / 100.0))
+        fams.append(MetricFamily('oopuo_cpu_core_max_utilization_ratio', "Utilization of the busiest core", unit='ratio')
+                    .add(snap['cpu_hot'] / 100.0))
+
+        if snap['numa']:
+            numa = MetricFamily('oopuo_numa_node_utilization_ratio', "CPU utilization per NUMA node", unit='ratio')
+            for node in snap['numa']:
+                numa.add(node['util'] / 100.0, node=node['node'])
+            fams.append(numa)
+
+        gib = 1024 ** 3
+        fams.append(MetricFamily('oopuo_memory_used_bytes', "Host memory in use", unit='bytes')
+                    .add(snap['ram_used'] * gib))
+        fams.append(MetricFamily('oopuo_memory_total_bytes', "Host memory installed", unit='bytes')
+                    .add(snap['ram_total'] * gib))
+        fams.append(MetricFamily('oopuo_uptime_seconds', "Host uptime", unit='seconds')
+                    .add(snap['uptime']))
+
+        if snap['gpus']:
+            util = MetricFamily('oopuo_gpu_utilization_ratio', "GPU core utilization", unit='ratio')
+            temp = MetricFamily('oopuo_gpu_temperature_celsius', "GPU temperature", unit='celsius')
+            mem_used = MetricFamily('oopuo_gpu_memory_used_bytes', "GPU memory in use", unit='bytes')
+            mem_total = MetricFamily('oopuo_gpu_memory_total_bytes', "GPU memory installed", unit='bytes')
+            power = MetricFamily('oopuo_gpu_power_watts', "GPU board power draw", unit='watts')
+            clock = MetricFamily('oopuo_gpu_sm_clock_hertz', "GPU SM clock", unit='hertz')
+            throttle = MetricFamily('oopuo_gpu_throttle_reasons', "Active clock throttle reason bitmask")
+            for i, gpu in enumerate(snap['gpus']):
+                labels = {'gpu': gpu.get('index', i), 'name': gpu['name']}
+                util.add(gpu['util'] / 100.0, **labels)
+                temp.add(gpu['temp'], **labels)
+                mem_used.add(gpu['mem_used'] * 1048576, **labels)
+                mem_total.add(gpu['mem_total'] * 1048576, **labels)
+                power.add(gpu['power'], **labels)
+                clock.add(gpu['sm_clock'] * 1e6, **labels)
+                throttle.add(gpu['throttle'], **labels)
+            fams.extend([util, temp, mem_used, mem_total, power, clock, throttle])
+
+        if snap['disks']:
+            read = MetricFamily('oopuo_disk_read_bytes_per_second', "Disk read throughput")
+            write = MetricFamily('oopuo_disk_write_bytes_per_second', "Disk write throughput")
+            iops = MetricFamily('oopuo_disk_iops', "Completed disk reads and writes per second")
+            latency = MetricFamily('oopuo_disk_io_latency_seconds', "Average time per completed IO", unit='seconds')
+            busy = MetricFamily('oopuo_disk_utilization_ratio', "Share of time the disk had IO in flight", unit='ratio')
+            for disk in snap['disks']:
+                read.add(disk['read'], device=disk['name'])
+                write.add(disk['write'], device=disk['name'])
+                iops.add(disk['iops'], device=disk['name'])
+                latency.add(disk['latency'] / 1000.0, device=disk['name'])
+                busy.add(disk['util'] / 100.0, device=disk['name'])
+            fams.extend([read, write, iops, latency, busy])
+
+        if snap['nets']:
+            rx = MetricFamily('oopuo_network_receive_bytes_per_second', "Network receive rate")
+            tx = MetricFamily('oopuo_network_transmit_bytes_per_second', "Network transmit rate")
+            for iface in snap['nets']:
+                rx.add(iface['rx'], interface=iface['name'])
+                tx.add(iface['tx'], interface=iface['name'])
+            fams.extend([rx, tx])
+
+        guests = MetricFamily('oopuo_guest_up', "Guest run state (1 = running)")
+        if snap['brain_state'] >= 0:
+            guests.add(snap['brain_state'], guest='brain', type='qemu', id=config.get('ids.brain_vm', 200))
+        if snap['guard_state'] >= 0:
+            guests.add(snap['guard_state'], guest='guard', type='lxc', id=config.get('ids.guard_ct', 100))
+        if guests.samples:
+            fams.append(guests)
+
+        running = [g for g in snap['guests'] if g['state'] == 1]
+        if running:
+            cpu = MetricFamily('oopuo_guest_cpu_cores', "CPU cores in use by the guest cgroup")
+            throttled = MetricFamily('oopuo_guest_cpu_throttled_ratio', "Share of time throttled by cpu.max", unit='ratio')
+            mem = MetricFamily('oopuo_guest_memory_used_bytes', "Guest cgroup memory.current", unit='bytes')
+            mem_max = MetricFamily('oopuo_guest_memory_limit_bytes', "Guest cgroup memory.max", unit='bytes')
+            io_read = MetricFamily('oopuo_guest_io_read_bytes_per_second', "Guest block IO read rate")
+            io_write = MetricFamily('oopuo_guest_io_write_bytes_per_second', "Guest block IO write rate")
+            pressure = MetricFamily('oopuo_guest_pressure_ratio', "PSI avg10 stall share", unit='ratio')
+            for guest in running:
+                labels = {'guest': guest['name'], 'id': guest['id']}
+                cpu.add(guest['cpu'], **labels)
+                throttled.add(guest['throttled'] / 100.0, **labels)
+                mem.add(guest['mem_current'], **labels)
+                if guest['mem_max']:
+                    mem_max.add(guest['mem_max'], **labels)
+                io_read.add(guest['io_read'], **labels)
+                io_write.add(guest['io_write'], **labels)
+                pressure.add(guest['cpu_some'] / 100.0, resource='cpu', kind='some', **labels)
+                pressure.add(guest['mem_some'] / 100.0, resource='memory', kind='some', **labels)
+                pressure.add(guest['mem_full'] / 100.0, resource='memory', kind='full', **labels)
+                pressure.add(guest['io_some'] / 100.0, resource='io', kind='some', **labels)
+            fams.extend(f for f in (cpu, throttled, mem, mem_max, io_read, io_write, pressure) if f.samples)
+
+        if snap['tunnel_state'] >= 0:
+            fams.append(MetricFamily('oopuo_tunnel_up', "Cloudflare tunnel service active")
+                        .add(snap['tunnel_state']))
+
+        services = MetricFamily('oopuo_service_up', "Brain orchestration service health probe (1 = healthy)")
+        for name in ('nomad', 'consul', 'vault'):
+            if snap[f'{name}_state'] >= 0:
+                services.add(snap[f'{name}_state'], service=name)
+        if services.samples:
+            fams.append(services)
+
+        if snap['snapshot_count'] >= 0:
+            fams.append(MetricFamily('oopuo_snapshots', "Snapshots of the Brain VM")
+                        .add(snap['snapshot_count'], vmid=config.get('ids.brain_vm', 200)))
+
+        fams.append(MetricFamily('oopuo_collector_last_update_timestamp_seconds',
+                                 "Time of the last collector publish", unit='seconds')
+                    .add(snap['ts']))
+        return fams
+
+    def render(self):
+        """Return the (cached) response body"""
+        with self.lock:
+            key, snap = self._current()
+            if key == self.cache_key:
+                return self.cache_body
+
+            text = "\n".join(f.render() for f in self.families(snap)) + "\n# EOF\n"
+            self.cache_key = key
+            self.cache_body = text.encode()
+            return self.cache_body
+
+    # ----- HTTP -----
+
+    def _handler(self):
+        exporter = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                if self.path.split('?')[0] not in ('/metrics', '/'):
+                    self.send_error(404)
+                    return
+
+                try:
+                    body = exporter.render()
+                except Exception as e:
+                    exporter.log(f"Render error: {e}")
+                    self.send_error(500)
+                    return
+
+                accept = self.headers.get('Accept', '')
+                ctype = OPENMETRICS_TYPE if 'application/openmetrics-text' in accept else PROMETHEUS_TYPE
+                self.send_response(200)
+                self.send_header('Content-Type', ctype)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        """Serve in a background thread"""
+        self.server = ThreadingHTTPServer((self.bind, self.port), self._handler())
+        self.server.daemon_threads = True
+        thread = threading.Thread(target=self.server.serve_forever, name="exporter", daemon=True)
+        thread.start()
+        self.log(f"Serving OpenMetrics on http://{self.bind}:{self.port}/metrics")
+        return self
+
+    def serve_forever(self):
+        self.server = ThreadingHTTPServer((self.bind, self.port), self._handler())
+        self.server.daemon_threads = True
+        self.log(f"Serving OpenMetrics on http://{self.bind}:{self.port}/metrics")
+        self.server.serve_forever()
+
+    def stop(self):
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+
+if __name__ == "__main__":
+    exporter = MetricsExporter()
+    try:
+        exporter.serve_forever()
+    except KeyboardInterrupt:
+        pass
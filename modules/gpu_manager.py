@@ -4,9 +4,11 @@ OOPUO v9 - GPU Manager
 Automates GPU passthrough to Brain VM
 """
 import os
-import subprocess
 import re
 from config import config, LOG_FILE
+from executor import executor
+from pveapi import proxmox
+from sshmux import ssh_manager
 
 class GPUManager:
     """GPU detection, IOMMU setup, and passthrough automation"""
@@ -26,17 +28,15 @@ class GPUManager:
         Returns: dict with vendor, pci_id, name or None
         """
         try:
-            result = subprocess.run(
-                "lspci | grep -i 'vga\\|3d\\|display'",
-                shell=True,
-                capture_output=True,
-                text=True,
-                timeout=5
-            )
+            result = executor().run(['lspci'], timeout=5)
             
             for line in result.stdout.split('\n'):
                 line_lower = line.lower()
                 
+                # Display controllers only (VGA, 3D, Display classes)
+                if not any(word in line_lower for word in ('vga', '3d', 'display')):
+                    continue
+                
                 if 'nvidia' in line_lower:
                     pci_id = line.split()[0]
                     self.gpu_info = {
@@ -134,7 +134,7 @@ class GPUManager:
                     f.write(updated_content)
                 
                 # Update GRUB
-                subprocess.run(['update-grub'], check=True)
+                executor().run(['update-grub'], check=True)
                 
                 self.log(f"IOMMU enabled with: {iommu_param}")
                 return 'REBOOT_REQUIRED'
@@ -176,7 +176,7 @@ blacklist amdgpu
             self.log("Created GPU driver blacklist")
             
             # Update initramfs
-            subprocess.run(['update-initramfs', '-u', '-k', 'all'], check=True)
+            executor().run(['update-initramfs', '-u', '-k', 'all'], check=True)
             
             self.log("VFIO configuration complete")
             return True
@@ -198,13 +198,10 @@ blacklist amdgpu
         try:
             pci_id = self.gpu_info['full_pci']
             
-            # Configure hostpci
-            cmd = [
-                'qm', 'set', str(vmid),
-                '-hostpci0', f'{pci_id},pcie=1,rombar=0'
-            ]
-            
-            subprocess.run(cmd, check=True)
+            # Configure hostpci (root-only, so always through `qm set`)
+            if not proxmox().vm_set(vmid, hostpci0=f'{pci_id},pcie=1,rombar=0'):
+                self.log(f"Failed to pass GPU {pci_id} through to VM {vmid}")
+                return False
             
             self.log(f"GPU {pci_id} passed through to VM {vmid}")
             
@@ -371,19 +368,16 @@ echo "✓ GPU installation complete!"
                 f.write(script)
             
             # Copy to VM
-            subprocess.run([
-                'scp', '-i', key_path, '-o', 'StrictHostKeyChecking=no',
-                '/tmp/gpu_install.sh',
-                f'{user}@{brain_ip}:/tmp/gpu_install.sh'
-            ], check=True)
+            conn = ssh_manager.connect(brain_ip, user, key_path)
+            if not conn.copy('/tmp/gpu_install.sh', '/tmp/gpu_install.sh'):
+                raise RuntimeError(f"copying the driver script to {brain_ip} failed")
             
             # Execute in VM
             self.log("Installing GPU drivers in VM (this may take 10+ minutes)...")
-            subprocess.run([
-                'ssh', '-i', key_path, '-o', 'StrictHostKeyChecking=no',
-                f'{user}@{brain_ip}',
-                'chmod +x /tmp/gpu_install.sh && /tmp/gpu_install.sh'
-            ], check=True, timeout=1800)  # 30 min timeout
+            conn.run(
+                'chmod +x /tmp/gpu_install.sh && /tmp/gpu_install.sh',
+                check=True, capture=False, timeout=1800  # 30 min timeout
+            )
             
             self.log("GPU drivers installed successfully")
             return True
@@ -392,9 +386,10 @@ echo "✓ GPU installation complete!"
             self.log(f"GPU driver installation error: {e}")
             return False
     
-    def full_setup(self, vmid, brain_ip=None, key_path=None, user=None):
+    def prepare_host(self):
         """
-        Complete GPU passthrough setup workflow
+        Host side of GPU passthrough: detect the GPU, enable IOMMU, bind VFIO
+        (needs nothing from the VM, so it can run while the VM is built)
         Returns: dict with status and next_steps
         """
         result = {'success': False, 'steps': [], 'next_action': None}
@@ -423,6 +418,17 @@ echo "✓ GPU installation complete!"
             result['steps'].append('VFIO configuration: FAILED')
             return result
         
+        result['success'] = True
+        result['next_action'] = 'ATTACH_VM'
+        return result
+    
+    def attach_vm(self, vmid, brain_ip=None, key_path=None, user=None):
+        """
+        VM side of GPU passthrough, after prepare_host() succeeded
+        Returns: dict with status and next_steps
+        """
+        result = {'success': False, 'steps': [], 'next_action': None}
+        
         # Step 4: Passthrough to VM
         if self.passthrough_to_vm(vmid):
             result['steps'].append(f'GPU passthrough to VM {vmid}: OK')
@@ -445,6 +451,19 @@ echo "✓ GPU installation complete!"
             result['next_action'] = 'INSTALL_DRIVERS_LATER'
         
         return result
+    
+    def full_setup(self, vmid, brain_ip=None, key_path=None, user=None):
+        """
+        Complete GPU passthrough setup workflow
+        Returns: dict with status and next_steps
+        """
+        result = self.prepare_host()
+        if not result['success']:
+            return result
+        
+        attached = self.attach_vm(vmid, brain_ip, key_path, user)
+        attached['steps'] = result['steps'] + attached['steps']
+        return attached
 
 if __name__ == "__main__":
     import sys
@@ -0,0 +1,381 @@
+#!/usr/bin/env python3
+"""
+OOPUO Desktop Environment - GPU Sampler
+Long-lived multi-GPU telemetry backend (NVML, nvidia-smi loop, amdgpu sysfs)
+"""
+import os
+import glob
+import time
+import ctypes
+import threading
+import subprocess
+from array import array
+
+# NVML clocks_throttle_reasons bits worth surfacing (idle/app-clock caps are normal)
+THROTTLE_REASONS = (
+    (0x04, "SW_POWER"),
+    (0x08, "HW_SLOWDOWN"),
+    (0x10, "SYNC_BOOST"),
+    (0x20, "SW_THERMAL"),
+    (0x40, "HW_THERMAL"),
+    (0x80, "HW_POWER_BRAKE"),
+)
+
+def throttle_labels(mask):
+    """Decode a throttle-reason bitmask into short labels"""
+    return [label for bit, label in THROTTLE_REASONS if mask & bit]
+
+def summarize(devices):
+    """
+    Aggregate a list of per-device dicts
+    Returns: (avg_util, max_temp, worst_device_dict or None)
+    """
+    if not devices:
+        return 0, 0, None
+    worst = max(devices, key=lambda d: (d['temp'], d['util']))
+    avg_util = sum(d['util'] for d in devices) / len(devices)
+    return avg_util, worst['temp'], worst
+
+class GPUStats:
+    """
+    One sampling pass over every device, stored as per-device arrays
+
+    Units: util %, mem_used/mem_total MiB, temp °C, power W, sm_clock MHz.
+    """
+
+    FIELDS = ('util', 'mem_used', 'mem_total', 'temp', 'power', 'sm_clock')
+
+    def __init__(self, names):
+        self.names = list(names)
+        self.count = len(self.names)
+        for field in self.FIELDS:
+            setattr(self, field, array('f', bytes(4 * self.count)))
+        self.throttle = array('Q', bytes(8 * self.count))
+
+    def devices(self):
+        """Per-device dicts (the shared snapshot layout)"""
+        return [
+            dict(
+                index=i,
+                name=self.names[i],
+                throttle=self.throttle[i],
+                **{field: getattr(self, field)[i] for field in self.FIELDS}
+            )
+            for i in range(self.count)
+        ]
+
+class NVMLBackend:
+    """NVIDIA telemetry through libnvidia-ml, loaded once via ctypes"""
+
+    name = "nvml"
+
+    class _Utilization(ctypes.Structure):
+        _fields_ = [('gpu', ctypes.c_uint), ('memory', ctypes.c_uint)]
+
+    class _Memory(ctypes.Structure):
+        _fields_ = [('total', ctypes.c_ulonglong), ('free', ctypes.c_ulonglong), ('used', ctypes.c_ulonglong)]
+
+    NVML_TEMPERATURE_GPU = 0
+    NVML_CLOCK_SM = 1
+
+    def __init__(self):
+        self.lib = ctypes.CDLL('libnvidia-ml.so.1')
+        if self.lib.nvmlInit_v2() != 0:
+            raise OSError("nvmlInit failed")
+
+        count = ctypes.c_uint(0)
+        if self.lib.nvmlDeviceGetCount_v2(ctypes.byref(count)) != 0 or count.value == 0:
+            raise OSError("No NVML devices")
+
+        # Resolve device handles and names once
+        self.handles = []
+        self.names = []
+        for i in range(count.value):
+            handle = ctypes.c_void_p()
+            self.lib.nvmlDeviceGetHandleByIndex_v2(i, ctypes.byref(handle))
+            buf = ctypes.create_string_buffer(96)
+            self.lib.nvmlDeviceGetName(handle, buf, 96)
+            self.handles.append(handle)
+            self.names.append(buf.value.decode(errors='replace') or f"GPU {i}")
+
+    def sample(self):
+        """Query every device once"""
+        stats = GPUStats(self.names)
+        lib = self.lib
+        util = self._Utilization()
+        mem = self._Memory()
+        uint = ctypes.c_uint(0)
+        mask = ctypes.c_ulonglong(0)
+
+        for i, handle in enumerate(self.handles):
+            if lib.nvmlDeviceGetUtilizationRates(handle, ctypes.byref(util)) == 0:
+                stats.util[i] = util.gpu
+            if lib.nvmlDeviceGetMemoryInfo(handle, ctypes.byref(mem)) == 0:
+                stats.mem_used[i] = mem.used / 1048576
+                stats.mem_total[i] = mem.total / 1048576
+            if lib.nvmlDeviceGetTemperature(handle, self.NVML_TEMPERATURE_GPU, ctypes.byref(uint)) == 0:
+                stats.temp[i] = uint.value
+            if lib.nvmlDeviceGetPowerUsage(handle, ctypes.byref(uint)) == 0:
+                stats.power[i] = uint.value / 1000.0
+            if lib.nvmlDeviceGetClockInfo(handle, self.NVML_CLOCK_SM, ctypes.byref(uint)) == 0:
+                stats.sm_clock[i] = uint.value
+            if lib.nvmlDeviceGetCurrentClocksThrottleReasons(handle, ctypes.byref(mask)) == 0:
+                stats.throttle[i] = mask.value
+        return stats
+
+    def close(self):
+        try:
+            self.lib.nvmlShutdown()
+        except Exception:
+            pass
+
+class SMILoopBackend:
+    """One long-lived `nvidia-smi -lms` child whose CSV stream is parsed incrementally"""
+
+    name = "nvidia-smi"
+
+    # name goes last: it is the only free-text column
+    QUERY = ("index,utilization.gpu,memory.used,memory.total,temperature.gpu,"
+             "power.draw,clocks.sm,clocks_throttle_reasons.active,name")
+
+    def __init__(self, interval_ms=1000):
+        self.rows = {}
+        self.lock = threading.Lock()
+        self.proc = subprocess.Popen(
+            ['nvidia-smi', f'--query-gpu={self.QUERY}',
+             '--format=csv,noheader,nounits', '-lms', str(interval_ms)],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            text=True,
+            bufsize=1
+        )
+        self.reader = threading.Thread(target=self._read_stream, daemon=True)
+        self.reader.start()
+
+    @staticmethod
+    def _num(text):
+        try:
+            return float(text)
+        except ValueError:
+            return 0.0      # "[N/A]", "[Not Supported]"
+
+    def _read_stream(self):
+        """Consume the CSV stream line by line"""
+        for line in self.proc.stdout:
+            parts = [p.strip() for p in line.split(',', 8)]
+            if len(parts) < 9 or not parts[0].isdigit():
+                continue
+            try:
+                throttle = int(parts[7], 16)
+            except ValueError:
+                throttle = 0
+            row = (
+                parts[8],
+                [self._num(p) for p in parts[1:7]],
+                throttle
+            )
+            with self.lock:
+                self.rows[int(parts[0])] = row
+
+    def alive(self):
+        return self.proc.poll() is None
+
+    def sample(self):
+        with self.lock:
+            rows = [self.rows[i] for i in sorted(self.rows)]
+
+        stats = GPUStats(name for name, _, _ in rows)
+        for i, (_, values, throttle) in enumerate(rows):
+            for field, value in zip(GPUStats.FIELDS, values):
+                getattr(stats, field)[i] = value
+            stats.throttle[i] = throttle
+        return stats
+
+    def close(self):
+        try:
+            self.proc.terminate()
+        except Exception:
+            pass
+
+class AMDSysfsBackend:
+    """AMD telemetry from amdgpu sysfs counters (no rocm-smi fork)"""
+
+    name = "amdgpu"
+
+    AMD_VENDOR = "0x1002"
+
+    def __init__(self):
+        self.cards = []
+        for card in sorted(glob.glob('/sys/class/drm/card[0-9]*/device')):
+            try:
+                with open(f"{card}/vendor", 'r') as f:
+                    if f.read().strip() != self.AMD_VENDOR:
+                        continue
+            except OSError:
+                continue
+
+            busy = f"{card}/gpu_busy_percent"
+            if not os.path.exists(busy):
+                continue
+
+            hwmon = (glob.glob(f"{card}/hwmon/hwmon*") or [None])[0]
+            name = "AMD GPU"
+            try:
+                with open(f"{card}/product_name", 'r') as f:
+                    name = f.read().strip() or name
+            except OSError:
+                pass
+
+            power = None
+            if hwmon:
+                for candidate in ('power1_average', 'power1_input'):
+                    if os.path.exists(f"{hwmon}/{candidate}"):
+                        power = f"{hwmon}/{candidate}"
+                        break
+
+            self.cards.append({
+                'busy': busy,
+                'vram_used': f"{card}/mem_info_vram_used",
+                'vram_total': f"{card}/mem_info_vram_total",
+                'temp': f"{hwmon}/temp1_input" if hwmon else None,
+                'power': power,
+                'sclk': f"{card}/pp_dpm_sclk",
+                'name': name
+            })
+
+        if not self.cards:
+            raise OSError("No amdgpu devices")
+
+        self.names = [card['name'] for card in self.cards]
+
+    def _read_int(self, path):
+        if not path:
+            return 0
+        try:
+            with open(path, 'r') as f:
+                return int(f.read().strip())
+        except (OSError, ValueError):
+            return 0
+
+    def _read_sclk(self, path):
+        """Current SM (shader) clock: the pp_dpm_sclk line marked with '*'"""
+        try:
+            with open(path, 'r') as f:
+                for line in f:
+                    if line.rstrip().endswith('*'):
+                        return int(line.split()[1].lower().replace('mhz', ''))
+        except (OSError, ValueError, IndexError):
+            pass
+        return 0
+
+    def sample(self):
+        stats = GPUStats(self.names)
+        for i, card in enumerate(self.cards):
+            stats.util[i] = self._read_int(card['busy'])
+            stats.mem_used[i] = self._read_int(card['vram_used']) / 1048576
+            stats.mem_total[i] = self._read_int(card['vram_total']) / 1048576
+            stats.temp[i] = self._read_int(card['temp']) / 1000.0
+            stats.power[i] = self._read_int(card['power']) / 1e6
+            stats.sm_clock[i] = self._read_sclk(card['sclk'])
+        return stats
+
+    def close(self):
+        pass
+
+class GPUSampler:
+    """
+    Background GPU sampler
+
+    Picks the cheapest available backend once, then keeps the latest
+    all-device sample in memory so render loops never spawn a process per frame.
+    """
+
+    def __init__(self, interval=1.0):
+        self.interval = interval
+        self.backend = None
+        self.stats = GPUStats([])
+        self.updated = 0.0
+        self.lock = threading.Lock()
+        self.running = False
+        self.thread = None
+
+    def _open_backend(self, allow_smi=True):
+        """Try NVML, then a persistent nvidia-smi loop, then amdgpu sysfs"""
+        try:
+            return NVMLBackend()
+        except Exception:
+            pass
+
+        if allow_smi:
+            try:
+                return SMILoopBackend(int(self.interval * 1000))
+            except Exception:
+                pass
+
+        try:
+            return AMDSysfsBackend()
+        except Exception:
+            pass
+
+        return None
+
+    def start(self):
+        """Start the sampling thread"""
+        if self.running:
+            return self
+        self.backend = self._open_backend()
+        if self.backend is None:
+            return self
+
+        self.running = True
+        self.thread = threading.Thread(target=self._loop, daemon=True)
+        self.thread.start()
+        return self
+
+    def _loop(self):
+        while self.running:
+            try:
+                stats = self.backend.sample()
+            except Exception:
+                stats = None
+
+            with self.lock:
+                if stats is not None and stats.count:
+                    self.stats = stats
+                    self.updated = time.time()
+
+            # nvidia-smi exited (driver reload, etc.) - fall back to whatever is left
+            if isinstance(self.backend, SMILoopBackend) and not self.backend.alive():
+                self.backend = self._open_backend(allow_smi=False)
+                if self.backend is None:
+                    self.running = False
+                    break
+
+            time.sleep(self.interval)
+
+    def latest_stats(self):
+        """Most recent all-device sample (GPUStats)"""
+        with self.lock:
+            return self.stats
+
+    def latest(self):
+        """Most recent per-device samples (list of dicts)"""
+        return self.latest_stats().devices()
+
+    def wait(self, timeout=2.0):
+        """Block until the first sample arrives (for one-shot views)"""
+        deadline = time.time() + timeout
+        while self.running and not self.updated and time.time() < deadline:
+            time.sleep(0.05)
+        return self.latest()
+
+    @property
+    def backend_name(self):
+        return self.backend.name if self.backend else "none"
+
+    def stop(self):
+        """Stop sampling and release the backend"""
+        self.running = False
+        if self.backend:
+            self.backend.close()
+            self.backend = None
@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""
+OOPUO Desktop Environment - Service Health Prober
+Background checks of cloudflared, Nomad, Consul and Vault with cached results
+"""
+import json
+import time
+import threading
+import http.client
+from config import config
+from executor import executor
+
+# States (same convention as the shared snapshot)
+UNKNOWN, DOWN, UP = -1, 0, 1
+
+SERVICES = ('tunnel', 'nomad', 'consul', 'vault')
+
+class ProbeResult:
+    """Last outcome of one probe"""
+
+    def __init__(self, state=UNKNOWN, detail="not checked", checked=0.0, latency=0.0, failures=0):
+        self.state = state
+        self.detail = detail
+        self.checked = checked      # unix time of the last check
+        self.latency = latency      # seconds the check took
+        self.failures = failures    # consecutive failed checks
+
+    def as_dict(self):
+        return {
+            'state': self.state,
+            'detail': self.detail,
+            'checked': self.checked,
+            'latency': self.latency,
+            'failures': self.failures
+        }
+
+def _http_get(host, port, path, timeout):
+    """Return (status, body) of a plain HTTP GET"""
+    conn = http.client.HTTPConnection(host, port, timeout=timeout)
+    try:
+        conn.request('GET', path)
+        response = conn.getresponse()
+        return response.status, response.read(4096)
+    finally:
+        conn.close()
+
+def probe_tunnel(timeout):
+    """cloudflared service inside the Guard container"""
+    result = executor().run(
+        ['pct', 'exec', str(config.get('ids.guard_ct', 100)), '--',
+         'systemctl', 'is-active', 'cloudflared'],
+        timeout=timeout
+    )
+    if result.timed_out:
+        return DOWN, "timeout"
+    status = result.stdout.strip() or "unreachable"
+    return (UP if status == "active" else DOWN), status
+
+def _leader_probe(port):
+    """Nomad/Consul: an elected leader means the cluster is serving"""
+    def probe(timeout):
+        host = config.get('network.brain_ip')
+        if not host:
+            return UNKNOWN, "brain IP not configured"
+        status, body = _http_get(host, port, '/v1/status/leader', timeout)
+        if status != 200:
+            return DOWN, f"HTTP {status}"
+        leader = json.loads(body or b'""')
+        return (UP, f"leader {leader}") if leader else (DOWN, "no leader")
+    return probe
+
+def probe_vault(timeout):
+    """Vault: /v1/sys/health encodes init/seal/standby in the status code"""
+    host = config.get('network.brain_ip')
+    if not host:
+        return UNKNOWN, "brain IP not configured"
+    status, _ = _http_get(host, 8200, '/v1/sys/health', timeout)
+    if status == 200:
+        return UP, "active"
+    if status == 429:
+        return UP, "standby"
+    if status == 501:
+        return DOWN, "not initialized"
+    if status == 503:
+        return DOWN, "sealed"
+    return DOWN, f"HTTP {status}"
+
+PROBES = {
+    'tunnel': probe_tunnel,
+    'nomad': _leader_probe(4646),
+    'consul': _leader_probe(8500),
+    'vault': probe_vault,
+}
+
+class HealthProber:
+    """
+    Runs every probe on its own background thread
+
+    Each probe runs at its configured interval. After consecutive
+    failures the delay doubles up to `health.max_backoff`, and it resets
+    on the first success. Results are cached with timestamps; readers
+    call status() and never wait on a subprocess or socket.
+
+    Args:
+        on_result: Optional callback(name, ProbeResult, changed) run on
+            the probe thread after every check
+    """
+
+    def __init__(self, on_result=None, services=SERVICES):
+        self.on_result = on_result
+        self.services = services
+        self.timeout = config.get('health.timeout', 3)
+        self.max_backoff = config.get('health.max_backoff', 300)
+        self.results = {name: ProbeResult() for name in services}
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.threads = []
+
+    def interval(self, name):
+        return config.get(f'health.intervals.{name}', 30)
+
+    def check(self, name):
+        """Run one probe now and store the result"""
+        started = time.monotonic()
+        try:
+            state, detail = PROBES[name](self.timeout)
+        except (OSError, http.client.HTTPException) as e:
+            state, detail = DOWN, str(e) or e.__class__.__name__
+        except Exception as e:
+            state, detail = UNKNOWN, str(e)
+        latency = time.monotonic() - started
+
+        with self.lock:
+            previous = self.results[name]
+            failures = previous.failures + 1 if state == DOWN else 0
+            result = ProbeResult(state, detail, time.time(), latency, failures)
+            changed = state != previous.state
+            self.results[name] = result
+
+        if self.on_result:
+            try:
+                self.on_result(name, result, changed)
+            except Exception:
+                pass
+        return result
+
+    def _delay(self, name, result):
+        """Next check delay: the interval, doubled per consecutive failure"""
+        delay = self.interval(name)
+        if result.failures:
+            delay = min(self.max_backoff, delay * 2 ** min(result.failures, 8))
+        return delay
+
+    def _probe_loop(self, name):
+        while not self.stop_event.is_set():
+            result = self.check(name)
+            self.stop_event.wait(self._delay(name, result))
+
+    def start(self):
+        """Start one thread per probe"""
+        if self.threads:
+            return self
+        for name in self.services:
+            thread = threading.Thread(
+                target=self._probe_loop,
+                args=(name,),
+                name=f"health-{name}",
+                daemon=True
+            )
+            thread.start()
+            self.threads.append(thread)
+        return self
+
+    def status(self, name=None):
+        """Cached result(s): one ProbeResult, or {name: ProbeResult}"""
+        with self.lock:
+            if name is not None:
+                return self.results[name]
+            return dict(self.results)
+
+    def stop(self):
+        self.stop_event.set()
+
+if __name__ == "__main__":
+    prober = HealthProber()
+    for name in prober.services:
+        result = prober.check(name)
+        mark = {UP: "✓", DOWN: "✗"}.get(result.state, "?")
+        print(f"{mark} {name:<7} {result.detail}  ({result.latency * 1000:.0f} ms)")
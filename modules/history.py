@@ -0,0 +1,335 @@
+#!/usr/bin/env python3
+"""
+OOPUO Desktop Environment - Persistent Metrics History
+Memory-mapped, fixed-record time series file with 1s/1m/1h rollup tiers
+"""
+import os
+import mmap
+import fcntl
+import struct
+import time
+from config import METRICS_DB
+
+# Series stored in every record (order is part of the file format)
+SERIES = ('cpu', 'ram', 'gpu_util', 'gpu_temp')
+
+# (name, resolution seconds, capacity records)
+TIERS = (
+    ('1s', 1, 24 * 3600),        # 1 day of raw samples
+    ('1m', 60, 7 * 24 * 60),     # 1 week of minute rollups
+    ('1h', 3600, 365 * 24),      # 1 year of hourly rollups
+)
+
+MAGIC = b'OOPUOTS1'
+HEADER = struct.Struct('<8sII')          # magic, version, series count
+TIER_STATE = struct.Struct('<QQ')        # head, count
+RECORD = struct.Struct('<d' + 'f' * (2 * len(SERIES)))  # ts, avg[N], max[N]
+TS = struct.Struct('<d')
+VERSION = 1
+
+# Seconds between attempts of a read-only fallback to become the writer
+LOCK_RETRY = 30
+
+def _layout():
+    """Compute byte offsets of every tier's record area"""
+    offset = HEADER.size + TIER_STATE.size * len(TIERS)
+    offset = (offset + 63) & ~63
+    layout = []
+    for name, resolution, capacity in TIERS:
+        layout.append((name, resolution, capacity, offset))
+        offset += RECORD.size * capacity
+    return layout, offset
+
+class _Rollup:
+    """Accumulates finer records into one coarser bucket"""
+
+    def __init__(self, resolution):
+        self.resolution = resolution
+        self.bucket = None
+        self.n = 0
+        self.sums = [0.0] * len(SERIES)
+        self.maxs = [0.0] * len(SERIES)
+
+    def add(self, ts, avgs, maxs):
+        """
+        Add one record
+
+        Returns:
+            Completed (ts, avgs, maxs) record when the bucket rolls over, else None
+        """
+        bucket = int(ts // self.resolution)
+        done = None
+
+        if self.bucket is not None and bucket != self.bucket and self.n:
+            done = (
+                float(self.bucket * self.resolution),
+                [s / self.n for s in self.sums],
+                list(self.maxs)
+            )
+            self.n = 0
+            self.sums = [0.0] * len(SERIES)
+            self.maxs = [0.0] * len(SERIES)
+
+        self.bucket = bucket
+        self.n += 1
+        for i in range(len(SERIES)):
+            self.sums[i] += avgs[i]
+            if self.n == 1 or maxs[i] > self.maxs[i]:
+                self.maxs[i] = maxs[i]
+        return done
+
+class MetricsArchive:
+    """
+    Persistent metrics history
+
+    The file has a fixed size: a small header with per-tier ring state
+    followed by one ring of fixed-size records per tier. Writers append to
+    the 1s tier and rollups cascade into the 1m and 1h tiers. The open
+    (partial) buckets live in memory; on reopening they are refilled
+    from the finer tier's records newer than the coarser tier's last
+    one, so a restart does not lose or truncate a minute or an hour.
+    Each completed bucket flushes the mapping to disk. There is one
+    writer per file (an exclusive flock): a second one (the header's
+    local fallback while collectord restarts, a standalone exporter)
+    opens it read-only, drops its samples, and takes over once the
+    lock is free. Readers
+    binary-search the mapped rings, so slicing a time range never loads
+    the whole file.
+    """
+
+    def __init__(self, path=METRICS_DB, readonly=False):
+        self.path = path
+        self.readonly = readonly
+        self.layout, self.size = _layout()
+        self.rollups = [_Rollup(resolution) for _, resolution, _, _ in self.layout[1:]]
+        self.fd = None          # kept open by writers: it holds the lock
+        self.writer = False
+        self.lock_tried = 0.0
+
+        if readonly:
+            self._open_ro()
+        else:
+            self._open_rw()
+
+    def _open_ro(self):
+        fd = os.open(self.path, os.O_RDONLY)
+        try:
+            self.mm = mmap.mmap(fd, 0, access=mmap.ACCESS_READ)
+        finally:
+            os.close(fd)
+        if not self._valid():
+            self.mm.close()
+            raise ValueError(f"Not a metrics archive: {self.path}")
+
+    def _open_rw(self):
+        """Open for writing, or read-only if another process is the writer"""
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self.fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            if self._lock():
+                self._map_rw()
+            else:
+                self._open_ro()
+        except Exception:
+            os.close(self.fd)
+            raise
+
+    def _lock(self):
+        """Try to become the writer"""
+        self.lock_tried = time.monotonic()
+        try:
+            fcntl.flock(self.fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return False
+        self.writer = True
+        return True
+
+    def _map_rw(self):
+        """Map for writing (creating or re-initializing the file if needed)"""
+        fresh = os.fstat(self.fd).st_size != self.size
+        if fresh:
+            os.ftruncate(self.fd, 0)
+            os.ftruncate(self.fd, self.size)
+        self.mm = mmap.mmap(self.fd, self.size)
+
+        if fresh or not self._valid():
+            self.mm[:HEADER.size + TIER_STATE.size * len(TIERS)] = bytes(
+                HEADER.size + TIER_STATE.size * len(TIERS))
+            HEADER.pack_into(self.mm, 0, MAGIC, VERSION, len(SERIES))
+        else:
+            self._rebuild_rollups()
+
+    def _rebuild_rollups(self):
+        """
+        Refill the open buckets from the records not yet rolled up
+
+        Runs fine to coarse, so buckets completed here (the writer
+        stopped right at a boundary) are written and feed the next tier.
+        """
+        for tier, rollup in enumerate(self.rollups, start=1):
+            head, count = self._state(tier)
+            since = 0.0
+            if count:
+                last = TS.unpack_from(self.mm, self._offset(tier, count - 1, head, count))[0]
+                since = last + self.layout[tier][1]
+
+            finer_head, finer_count = self._state(tier - 1)
+            for logical in range(self._first_since(tier - 1, since, finer_head, finer_count), finer_count):
+                record = RECORD.unpack_from(self.mm, self._offset(tier - 1, logical, finer_head, finer_count))
+                done = rollup.add(record[0], record[1:1 + len(SERIES)], record[1 + len(SERIES):])
+                if done is not None:
+                    self._write(tier, *done)
+
+    def _valid(self):
+        magic, version, nseries = HEADER.unpack_from(self.mm, 0)
+        return magic == MAGIC and version == VERSION and nseries == len(SERIES)
+
+    # ----- ring state -----
+
+    def _state(self, tier):
+        return TIER_STATE.unpack_from(self.mm, HEADER.size + TIER_STATE.size * tier)
+
+    def _set_state(self, tier, head, count):
+        TIER_STATE.pack_into(self.mm, HEADER.size + TIER_STATE.size * tier, head, count)
+
+    def _offset(self, tier, logical, head, count):
+        """Byte offset of a logical record (0 = oldest)"""
+        _, _, capacity, base = self.layout[tier]
+        slot = (head - count + logical) % capacity
+        return base + slot * RECORD.size
+
+    def _write(self, tier, ts, avgs, maxs):
+        _, _, capacity, base = self.layout[tier]
+        head, count = self._state(tier)
+        RECORD.pack_into(self.mm, base + head * RECORD.size, ts, *avgs, *maxs)
+        # Record first, then publish the new head
+        self._set_state(tier, (head + 1) % capacity, min(count + 1, capacity))
+
+    # ----- writer -----
+
+    def append(self, values, ts=None):
+        """
+        Append one 1 Hz sample
+
+        Dropped while another process is the writer.
+
+        Args:
+            values: Dict of {series: value}; missing series are stored as 0
+            ts: Unix timestamp (defaults to now)
+        """
+        if not self.writer:
+            if self.fd is None or time.monotonic() - self.lock_tried < LOCK_RETRY or not self._lock():
+                return
+            self.mm.close()
+            self._map_rw()
+
+        ts = ts if ts is not None else time.time()
+        sample = [float(values.get(name, 0) or 0) for name in SERIES]
+        self._write(0, ts, sample, sample)
+
+        # Cascade completed buckets into coarser tiers
+        record = (ts, sample, sample)
+        completed = False
+        for tier, rollup in enumerate(self.rollups, start=1):
+            record = rollup.add(*record)
+            if record is None:
+                break
+            self._write(tier, *record)
+            completed = True
+        if completed:
+            # Once a minute: on disk without waiting for close()
+            self.flush()
+
+    def flush(self):
+        self.mm.flush()
+
+    # ----- reader -----
+
+    def _first_since(self, tier, since, head, count):
+        lo, hi = 0, count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if TS.unpack_from(self.mm, self._offset(tier, mid, head, count))[0] < since:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def pick_tier(self, start):
+        """Finest tier whose retained range reaches back to `start`"""
+        for tier in range(len(self.layout)):
+            head, count = self._state(tier)
+            if not count:
+                continue
+            oldest = TS.unpack_from(self.mm, self._offset(tier, 0, head, count))[0]
+            if oldest <= start:
+                return tier
+        return len(self.layout) - 1
+
+    def query(self, start, end=None, series=None, tier=None):
+        """
+        Slice a time range
+
+        Args:
+            start: Unix timestamp (inclusive)
+            end: Unix timestamp (exclusive, defaults to now)
+            series: Series name to return, or None for all
+            tier: Tier index or name ('1s', '1m', '1h'); picked automatically if None
+
+        Returns:
+            List of (ts, avg, max) when `series` is given,
+            otherwise list of (ts, {series: avg}, {series: max})
+        """
+        end = end if end is not None else time.time()
+        if tier is None:
+            tier = self.pick_tier(start)
+        elif isinstance(tier, str):
+            tier = [name for name, _, _, _ in self.layout].index(tier)
+
+        head, count = self._state(tier)
+        index = SERIES.index(series) if series else None
+        rows = []
+
+        for logical in range(self._first_since(tier, start, head, count), count):
+            record = RECORD.unpack_from(self.mm, self._offset(tier, logical, head, count))
+            ts = record[0]
+            if ts >= end:
+                break
+            if index is not None:
+                rows.append((ts, record[1 + index], record[1 + len(SERIES) + index]))
+            else:
+                avgs = dict(zip(SERIES, record[1:1 + len(SERIES)]))
+                maxs = dict(zip(SERIES, record[1 + len(SERIES):]))
+                rows.append((ts, avgs, maxs))
+        return rows
+
+    def close(self):
+        try:
+            self.mm.flush()
+        except (ValueError, OSError):
+            pass
+        self.mm.close()
+        if self.fd is not None:
+            os.close(self.fd)   # releases the writer lock
+            self.fd = None
+
+if __name__ == "__main__":
+    import sys
+    from datetime import datetime
+
+    # Usage: history.py [SECONDS_BACK] [SERIES]
+    back = float(sys.argv[1]) if len(sys.argv) > 1 else 600
+    series = sys.argv[2] if len(sys.argv) > 2 else None
+
+    try:
+        archive = MetricsArchive(readonly=True)
+    except (OSError, ValueError) as e:
+        print(f"✗ Cannot open metrics history: {e}")
+        sys.exit(1)
+
+    for ts, avg, peak in archive.query(time.time() - back, series=series):
+        stamp = datetime.fromtimestamp(ts).strftime('%Y-%m-%d %H:%M:%S')
+        if series:
+            print(f"{stamp}  avg={avg:6.1f}  max={peak:6.1f}")
+        else:
+            print(stamp + "  " + "  ".join(f"{k}={v:5.1f}/{peak[k]:5.1f}" for k, v in avg.items()))
@@ -4,18 +4,284 @@ OOPUO Desktop Environment - Infrastructure Deployment Engine
 Migrated from v33 with enhancements
 """
 import os
-import subprocess
 import time
 import re
+import hashlib
 from datetime import datetime
 from config import config, LOG_FILE, VAULT_DIR
+from pveapi import proxmox
+from pipeline import Pipeline, Step
+from journal import DeployJournal
+from templates import BrainTemplates
+from downloader import Downloader, fetch_sums, aplinfo_entry
+from readiness import ReadinessProbe
+from sshmux import ssh_manager
+from remote_exec import RemoteScript, RemoteScriptError
+from pkgcache import PackageCache, cache_url
+from pve_status import pve_status, RUNNING
+from executor import executor
+
+# Brain VMs and templates are built from this image
+CLOUD_IMAGE = "/var/lib/vz/template/iso/ubuntu-24.04-cloud.img"
+
+# Installs cloudflared inside the Guard container, through the host's
+# package cache when $PKGCACHE is set
+GUARD_SETUP = (
+    "APT_PROXY=${PKGCACHE:+-o Acquire::http::Proxy=$PKGCACHE}; "
+    "CLOUDFLARED=https://github.com/cloudflare/cloudflared/releases/latest/download/cloudflared-linux-amd64.deb; "
+    "[ -n \"$PKGCACHE\" ] && CLOUDFLARED=$PKGCACHE/files/${CLOUDFLARED#https://}; "
+    "apt-get $APT_PROXY update > /dev/null && "
+    "apt-get $APT_PROXY install -y curl > /dev/null && "
+    "curl -fL --output cloudflared.deb \"$CLOUDFLARED\" "
+    "> /dev/null 2>&1 && "
+    "dpkg -i cloudflared.deb > /dev/null 2>&1"
+)
+
+# Orchestration stack installer, run on the Brain VM (v9)
+STACK_PAYLOAD = r'''#!/bin/bash
+export DEBIAN_FRONTEND=noninteractive
+while sudo fuser /var/lib/dpkg/lock-frontend > /dev/null 2>&1; do sleep 2; done
+
+# Downloads go through the host's package cache ($PKGCACHE, set by the
+# deployer) when this VM can reach it; the VM is left pointing at the
+# upstream sources either way
+TORCH_INDEX=https://download.pytorch.org/whl/cpu
+HASHICORP_REPO=https://apt.releases.hashicorp.com
+fetch_url() { echo "$1"; }
+if [ -n "$PKGCACHE" ] && curl -fsS -m 5 "$PKGCACHE/_ping" > /dev/null 2>&1; then
+    echo "Using package cache at $PKGCACHE"
+    cache_host=${PKGCACHE#http://}
+    # Proxy for http repos; the https repos below point at the cache itself
+    printf 'Acquire::http::Proxy "%s";\nAcquire::http::Proxy::%s "DIRECT";\n' "$PKGCACHE" "${cache_host%%:*}" \
+        | sudo tee /etc/apt/apt.conf.d/01oopuo-cache > /dev/null
+    export PIP_INDEX_URL=$PKGCACHE/simple/ PIP_TRUSTED_HOST=${cache_host%%:*}
+    TORCH_INDEX=$PKGCACHE/index/download.pytorch.org/whl/cpu/
+    HASHICORP_REPO=$PKGCACHE/files/apt.releases.hashicorp.com
+    fetch_url() { echo "$PKGCACHE/files/${1#https://}"; }
+fi
+
+# Independent phases run at the same time; each prints "[n/4] <title>"
+# when it starts and "[n/4] done" or "[n/4] failed (<status>)" when it
+# ends, and leaves $STATE/<n>.ok or $STATE/<n>.failed for phases that
+# wait on it. Output lines are prefixed with the phase's name.
+#
+# A failed phase fails the payload (exit 1), so no stack marker is written
+# and the template is not baked from a half-installed VM. Python package
+# groups are optional: one that cannot be installed is reported as a
+# warning and does not fail its phase.
+TOTAL=4
+STATE=$(mktemp -d)
+
+uncache() {
+    sudo rm -f /etc/apt/apt.conf.d/01oopuo-cache
+    [ -f /etc/apt/sources.list.d/hashicorp.list ] && echo "deb [arch=amd64] https://apt.releases.hashicorp.com $(lsb_release -cs) main" | sudo tee /etc/apt/sources.list.d/hashicorp.list > /dev/null
+    rm -rf "$STATE"
+}
+trap uncache EXIT
+
+phase() {   # phase <n> <title> <function>
+    echo "[$1/$TOTAL] $2"
+    ( set -e; $3 ) 2>&1 | sed -u "s/^/  $3: /"
+    local status=${PIPESTATUS[0]}
+    if [ "$status" -eq 0 ]; then
+        touch "$STATE/$1.ok"
+        echo "[$1/$TOTAL] done"
+    else
+        touch "$STATE/$1.failed"
+        echo "[$1/$TOTAL] failed (exit $status)"
+    fi
+    return "$status"
+}
+
+after() {   # after <n>: block until phase n ended; fails if it failed
+    until [ -e "$STATE/$1.ok" ]; do
+        if [ -e "$STATE/$1.failed" ]; then
+            echo "phase $1 failed"
+            return 1
+        fi
+        sleep 2
+    done
+}
+
+# ===== ORCHESTRATION STACK (every apt package, in one transaction) =====
+apt_stack() {
+    # Add HashiCorp GPG key and repository
+    curl -fsSL "$(fetch_url https://apt.releases.hashicorp.com/gpg)" | sudo apt-key add -
+    echo "deb [arch=amd64] $HASHICORP_REPO $(lsb_release -cs) main" | sudo tee /etc/apt/sources.list.d/hashicorp.list > /dev/null
+    sudo apt-get update > /dev/null
+
+    # Nomad, Consul, Vault, Docker, build tools for llama.cpp, utilities
+    sudo apt-get install -y nomad consul vault docker.io \
+        build-essential cmake htop nvtop iotop tmux vim git > /dev/null
+
+    # Configure Nomad
+    sudo mkdir -p /etc/nomad.d /opt/nomad/data
+    cat << 'EOF' | sudo tee /etc/nomad.d/nomad.hcl > /dev/null
+datacenter = "oopuo-dc1"
+data_dir = "/opt/nomad/data"
+
+server {
+  enabled = true
+  bootstrap_expect = 1
+}
+
+client {
+  enabled = true
+  
+  meta {
+    "node_type" = "brain"
+    "gpu_enabled" = "false"
+  }
+}
+
+plugin "docker" {
+  config {
+    allow_privileged = true
+    volumes {
+      enabled = true
+    }
+  }
+}
+EOF
+
+    # Configure Consul
+    sudo mkdir -p /etc/consul.d /opt/consul/data
+    cat << 'EOF' | sudo tee /etc/consul.d/consul.hcl > /dev/null
+datacenter = "oopuo-dc1"
+data_dir = "/opt/consul/data"
+server = true
+bootstrap_expect = 1
+ui_config {
+  enabled = true
+}
+bind_addr = "0.0.0.0"
+client_addr = "0.0.0.0"
+EOF
+
+    # Configure Vault
+    sudo mkdir -p /etc/vault.d /opt/vault/data
+    cat << 'EOF' | sudo tee /etc/vault.d/vault.hcl > /dev/null
+storage "file" {
+  path = "/opt/vault/data"
+}
+
+listener "tcp" {
+  address = "0.0.0.0:8200"
+  tls_disable = 1
+}
+
+ui = true
+disable_mlock = true
+EOF
+
+    sudo systemctl enable --now nomad consul vault
+}
+
+# ===== PYTHON ENVIRONMENT (PyTorch, then one pip resolve for the rest) =====
+python_env() {
+    # Miniconda
+    mkdir -p ~/miniconda3
+    if ! [ -f ~/miniconda3/bin/conda ]; then
+        wget -q "$(fetch_url https://repo.anaconda.com/miniconda/Miniconda3-latest-Linux-x86_64.sh)" -O ~/miniconda3/miniconda.sh
+        bash ~/miniconda3/miniconda.sh -b -u -p ~/miniconda3 > /dev/null
+        ~/miniconda3/bin/conda init bash > /dev/null
+    fi
+
+    source ~/miniconda3/bin/activate
+
+    local pip_install="pip install --progress-bar off"
+
+    # PyTorch is the CPU build for now (GPU after passthrough), from the
+    # PyTorch index only: resolved together with PyPI, pip may pick the
+    # multi-GB CUDA wheels instead
+    $pip_install --index-url "$TORCH_INDEX" torch torchvision torchaudio > /dev/null \
+        || echo "warning: could not install: torch torchvision torchaudio"
+
+    local groups=(
+        "tensorflow jax flax"
+        "transformers accelerate bitsandbytes langchain langgraph langsmith langchain-openai langchain-community"
+        "vllm"
+        "chromadb qdrant-client weaviate-client pymilvus faiss-cpu"
+        "jupyterlab mlflow wandb bentoml ray[serve] onnxruntime"
+        "syft opacus tensorflow-privacy flwr"
+    )
+
+    # One resolve and one download pass for the rest; if the pins of
+    # all groups together cannot be satisfied, fall back to one install
+    # per group, where a later group may replace an earlier one's versions
+    set -f      # ray[serve] is not a glob
+    if ! $pip_install ${groups[*]} > /dev/null; then
+        echo "combined install did not resolve, installing group by group"
+        for group in "${groups[@]}"; do
+            $pip_install $group > /dev/null || echo "warning: could not install: $group"
+        done
+    fi
+    set +f
+}
+
+# ===== LLM RUNTIMES =====
+ollama_install() {
+    curl -fsSL https://ollama.com/install.sh | sh > /dev/null
+}
+
+llama_cpp() {
+    cd ~
+    if ! [ -d llama.cpp ]; then
+        git clone --depth 1 https://github.com/ggerganov/llama.cpp > /dev/null
+    fi
+    after 1     # compilers and cmake come with the apt phase
+    cd llama.cpp
+    cmake -B build > /dev/null
+    cmake --build build --config Release -j "$(nproc)" > /dev/null
+}
+
+phase 1 "Installing HashiCorp Stack (Nomad/Consul/Vault) and system packages..." apt_stack &
+phase 2 "Installing Python environment (Deep Learning, LLM tools, Vector DBs, Dev tools)..." python_env &
+phase 3 "Installing Ollama..." ollama_install &
+phase 4 "Building llama.cpp..." llama_cpp &
+
+failed=0
+for job in $(jobs -p); do
+    wait "$job" || failed=1
+done
+if [ "$failed" -ne 0 ]; then
+    echo "✗ OOPUO v9 Orchestration Stack installation failed"
+    exit 1
+fi
+
+echo ""
+echo "✓ OOPUO v9 Orchestration Stack installed successfully!"
+echo ""
+echo "Services:"
+echo "  - Nomad UI:  http://$(hostname -I | awk '{print $1}'):4646"
+echo "  - Consul UI: http://$(hostname -I | awk '{print $1}'):8500"
+echo "  - Vault UI:  http://$(hostname -I | awk '{print $1}'):8200"
+echo "  - JupyterLab: Run 'jupyter lab --ip=0.0.0.0' manually"
+echo ""
+'''
+STACK_HASH = hashlib.sha256(STACK_PAYLOAD.encode()).hexdigest()
+
+# Written on the Brain VM once the payload above ran to the end
+STACK_MARKER = "/var/lib/oopuo/stack.sha256"
 
 class InfraEngine:
     """Proxmox VM/CT deployment and management"""
     
     def __init__(self):
-        self.progress = 0
         self.status = "Ready"
+        self.pve = proxmox()    # qm/pct CLI or the REST API (pve.backend)
+        self.pipeline = None
+        self.journal = DeployJournal()
+        self.templates = BrainTemplates(self)
+        self.gpu = None         # GPUManager once the host side has run
+        self.gpu_host = None    # prepare_host() result
+        self.pkgcache = None    # PackageCache served during a deploy
+        self.refresh_image = False  # look for a new cloud image even if the last check is recent
+    
+    @property
+    def progress(self):
+        """Deployment progress in percent, from the finished steps"""
+        return self.pipeline.progress if self.pipeline else 0
     
     def log(self, msg):
         """Write to log file"""
@@ -24,46 +290,87 @@ class InfraEngine:
         with open(LOG_FILE, 'a') as f:
             f.write(f"[INFRA] [{ts}] {msg}\n")
     
-    def run_cmd(self, cmd):
-        """Execute shell command"""
-        try:
-            result = subprocess.check_output(
-                cmd,
-                shell=True,
-                stderr=subprocess.STDOUT
-            )
-            return result.decode().strip()
-        except subprocess.CalledProcessError:
+    def run_cmd(self, argv):
+        """Run a host command (argv, no shell); returns its stripped stdout or None"""
+        output = executor().output(argv)
+        return output.strip() if output is not None else None
+    
+    def ssh(self, command, ip=None):
+        """Run a command on the Brain VM (or the VM at `ip`); returns its output or None"""
+        result = ssh_manager.connect(ip).run(command)
+        if result.returncode != 0:
             return None
+        return result.stdout.strip()
+    
+    def wait_until_ready(self, vmid, ip):
+        """
+        Wait for a started VM to be usable: SSH login works and cloud-init
+        has finished (see readiness.ReadinessProbe); returns True if it is
+        """
+        probe = ReadinessProbe(vmid, ip, pve=self.pve)
+        if probe.wait():
+            return True
+        self.log(f"VM {vmid} at {ip} not ready: {probe.error}")
+        return False
+    
+    def ensure_running(self, vmid, kind):
+        """
+        Check a journaled guest still exists, starting it if it is stopped
+        (after a host reboot); returns False if it is gone
+        """
+        guest = pve_status.guest(vmid, max_age=0)
+        if not guest or guest['type'] != kind:
+            return False
+        if guest['state'] != RUNNING:
+            self.log(f"Starting {guest['name']} ({vmid})...")
+            started = self.pve.vm_start(vmid) if kind == 'qemu' else self.pve.ct_start(vmid)
+            pve_status.invalidate()
+            return started
+        return True
     
     def detect_network(self):
         """Auto-detect network configuration"""
         self.log("Detecting network configuration...")
         
-        host_ip = self.run_cmd("hostname -I | awk '{print $1}'")
-        gateway = self.run_cmd("ip route | grep default | awk '{print $3}' | head -1")
+        host_ip = self.run_cmd(['hostname', '-I']).split()[0]
+        # "default via 192.168.1.1 dev vmbr0 proto kernel ..."
+        route = (self.run_cmd(['ip', 'route', 'show', 'default']) or "").split()
+        gateway = route[route.index('via') + 1] if 'via' in route else None
         prefix = ".".join(host_ip.split('.')[:3])
         
         config.set('network.host_ip', host_ip)
         config.set('network.gateway', gateway)
         config.set('network.brain_ip', f"{prefix}.222")
         config.set('network.guard_ip', f"{prefix}.250")
+        config.set('network.build_ip', f"{prefix}.223")
         
         self.log(f"Network: {prefix}.0/24, Gateway: {gateway}")
+        
+        # Served on the address just detected, for the rest of the deploy
+        if self.pkgcache is None:
+            self.pkgcache = self.start_pkgcache()
     
     def download_assets(self):
         """Download cloud images and templates"""
         self.log("Downloading assets...")
-        self.progress = 10
         
-        iso_dir = "/var/lib/vz/template/iso"
-        os.makedirs(iso_dir, exist_ok=True)
-        
-        img_path = f"{iso_dir}/ubuntu-24.04-cloud.img"
-        if not os.path.exists(img_path):
-            cloud_url = config.get('assets.cloud_img_url')
-            self.log(f"Downloading Ubuntu cloud image...")
-            self.run_cmd(f"wget -q {cloud_url} -O {img_path}")
+        # The Brain template is keyed on this image, so a new one (Ubuntu
+        # republishes current/ every few days) means a template rebuild:
+        # it is only looked for upstream on an explicit rebuild (--fresh)
+        # or once the last check is `assets.image_max_age_days` old
+        cloud_url = config.get('assets.cloud_img_url')
+        max_age = config.get('assets.image_max_age_days', 30) * 86400
+        checked = config.get('assets.cloud_img_checked') or 0
+        if os.path.exists(CLOUD_IMAGE) and not self.refresh_image and time.time() - checked < max_age:
+            self.log(f"Cloud image checked {(time.time() - checked) / 86400:.0f} days ago, kept")
+        else:
+            # Checked against Ubuntu's published SHA256SUMS: a truncated or
+            # corrupt image is downloaded again instead of being imported
+            expected = fetch_sums(cloud_url).get(os.path.basename(cloud_url))
+            if expected is None:
+                self.log("No published checksum for the cloud image, cannot verify it")
+            Downloader().ensure(cloud_url, CLOUD_IMAGE, expected)
+            config.set('assets.cloud_img_checked', time.time())
         
         # Generate SSH key if needed
         key_path = config.get('credentials.key_path')
@@ -71,14 +378,11 @@ class InfraEngine:
         
         if not os.path.exists(key_path):
             self.log("Generating SSH key pair...")
-            self.run_cmd(f"ssh-keygen -t ed25519 -f {key_path} -N '' -q")
-        
-        self.progress = 30
+            self.run_cmd(['ssh-keygen', '-t', 'ed25519', '-f', key_path, '-N', '', '-q'])
     
     def deploy_guard(self):
         """Deploy Guard LXC container"""
         self.log("Building Guard (LXC)...")
-        self.progress = 35
         
         ctid = config.get('ids.guard_ct')
         template = config.get('assets.lxc_template')
@@ -87,77 +391,63 @@ class InfraEngine:
         bridge = config.get('network.bridge')
         password = config.get('credentials.pass')
         
-        # Destroy existing container
-        self.run_cmd(f"pct destroy {ctid} -purge > /dev/null 2>&1 || true")
+        # Destroy existing container (fails harmlessly if there is none)
+        self.pve.ct_destroy(ctid)
         
         # Update available templates
-        self.run_cmd("pveam update > /dev/null 2>&1")
+        self.pve.template_update()
         
         # Download template if needed
         template_path = f"/var/lib/vz/template/cache/{template}"
-        if not os.path.exists(template_path):
+        entry = aplinfo_entry(template)
+        if entry:
+            # Same source and SHA-512 pveam uses, but resumable and cached
+            url, sha512 = entry
+            Downloader().ensure(url, template_path, sha512, algo='sha512')
+        elif not os.path.exists(template_path):
             self.log(f"Downloading LXC template: {template}")
-            self.run_cmd(f"pveam download local {template} > /dev/null 2>&1")
+            self.pve.template_download('local', template)
         
         # Create container
-        cmd = (
-            f"pct create {ctid} local:vztmpl/{template} "
-            f"--hostname oopuopu-gateway "
-            f"--memory 512 --cores 1 "
-            f"--net0 name=eth0,bridge={bridge},ip={guard_ip}/24,gw={gateway} "
-            f"--storage local-lvm "
-            f"--password {password} "
-            f"--features nesting=1 "
-            f"--unprivileged 1 "
-            f"--start 1"
+        created = self.pve.ct_create(
+            ctid, f"local:vztmpl/{template}",
+            hostname='oopuopu-gateway',
+            memory=512, cores=1,
+            net0=f"name=eth0,bridge={bridge},ip={guard_ip}/24,gw={gateway}",
+            storage='local-lvm',
+            password=password,
+            features='nesting=1',
+            unprivileged=1,
+            start=1
         )
-        
-        self.run_cmd(cmd)
+        if not created:
+            raise RuntimeError(f"creating Guard CT {ctid} failed")
         self.log(f"Guard created: CT {ctid} at {guard_ip}")
         
         # Install Cloudflared
         self.log("Installing Cloudflare Tunnel agent...")
-        setup_script = (
-            "apt-get update > /dev/null && "
-            "apt-get install -y curl > /dev/null && "
-            "curl -L --output cloudflared.deb "
-            "https://github.com/cloudflare/cloudflared/releases/latest/download/cloudflared-linux-amd64.deb "
-            "> /dev/null 2>&1 && "
-            "dpkg -i cloudflared.deb > /dev/null 2>&1"
-        )
-        
-        self.run_cmd(f"pct exec {ctid} -- bash -c '{setup_script}'")
+        if self.pve.ct_exec(ctid, ['env', f"PKGCACHE={cache_url() or ''}", 'bash', '-c', GUARD_SETUP]) is None:
+            raise RuntimeError(f"Guard setup in CT {ctid} failed")
         config.set('cloudflare.tunnel_installed', True)
-        
-        self.progress = 50
     
-    def deploy_brain(self):
-        """Deploy Brain VM"""
-        self.log("Building Brain (VM)...")
-        self.progress = 55
-        
-        vmid = config.get('ids.brain_vm')
-        brain_ip = config.get('network.brain_ip')
-        gateway = config.get('network.gateway')
-        bridge = config.get('network.bridge')
+    def write_user_data(self, vmid, hostname):
+        """Write a VM's cloud-init user-data snippet; returns its cicustom value"""
         user = config.get('credentials.user')
         password = config.get('credentials.pass')
         key_path = config.get('credentials.key_path')
         
-        # Stop and destroy existing VM
-        self.run_cmd(f"qm stop {vmid} > /dev/null 2>&1 || true")
-        self.run_cmd(f"qm destroy {vmid} > /dev/null 2>&1 || true")
-        
         # Read public key
         with open(f"{key_path}.pub", 'r') as f:
             pubkey = f.read().strip()
         
         # Generate password hash
-        pwd_hash = self.run_cmd(f"openssl passwd -6 '{password}'")
+        # On stdin, so the password stays out of process lists and command traces
+        result = executor().run(['openssl', 'passwd', '-6', '-stdin'], input=password)
+        pwd_hash = result.stdout.strip() if result.ok else None
         
         # Create cloud-init user-data
         yaml = f"""#cloud-config
-hostname: oopuopu-cloud
+hostname: {hostname}
 users:
   - name: {user}
     sudo: ALL=(ALL) NOPASSWD:ALL
@@ -174,256 +464,158 @@ runcmd:
         os.makedirs("/var/lib/vz/snippets", exist_ok=True)
         with open(f"/var/lib/vz/snippets/user-data-{vmid}.yaml", 'w') as f:
             f.write(yaml)
+        return f"user=local:snippets/user-data-{vmid}.yaml"
+    
+    def personalize(self, vmid, ip, hostname='oopuopu-cloud'):
+        """Point a VM's cloud-init at its own user-data and address"""
+        gateway = config.get('network.gateway')
+        self.pve.vm_set(
+            vmid,
+            cicustom=self.write_user_data(vmid, hostname),
+            ciuser=config.get('credentials.user'),
+            ipconfig0=f"ip={ip}/24,gw={gateway}"
+        )
+    
+    def create_cloud_vm(self, vmid, name, ip):
+        """Create a VM from the Ubuntu cloud image and start it"""
+        bridge = config.get('network.bridge')
         
         # Create VM
         self.log("Creating VM...")
-        self.run_cmd(
-            f"qm create {vmid} --name oopuopu-cloud "
-            f"--memory 8192 --cores 4 "
-            f"--net0 virtio,bridge={bridge} "
-            f"--scsihw virtio-scsi-pci "
-            f"--agent enabled=1"
+        self.pve.vm_create(
+            vmid,
+            name=name,
+            memory=8192, cores=4,
+            net0=f"virtio,bridge={bridge}",
+            scsihw='virtio-scsi-pci',
+            agent='enabled=1'
         )
         
-        # Import disk
-        img_path = "/var/lib/vz/template/iso/ubuntu-24.04-cloud.img"
-        self.run_cmd(f"qm importdisk {vmid} {img_path} local-lvm")
+        # Import disk (from a host path, so always through `qm importdisk`)
+        self.pve.vm_importdisk(vmid, CLOUD_IMAGE, 'local-lvm')
         
         # Configure disk
-        self.run_cmd(
-            f"qm set {vmid} --scsihw virtio-scsi-pci "
-            f"--scsi0 local-lvm:vm-{vmid}-disk-0,ssd=1,discard=on"
+        self.pve.vm_set(
+            vmid,
+            scsihw='virtio-scsi-pci',
+            scsi0=f"local-lvm:vm-{vmid}-disk-0,ssd=1,discard=on"
         )
         
         # Resize disk
-        self.run_cmd(f"qm resize {vmid} scsi0 +80G")
+        self.pve.vm_resize(vmid, 'scsi0', '+80G')
         
         # Set boot and cloud-init
-        self.run_cmd(
-            f"qm set {vmid} --boot c --bootdisk scsi0 "
-            f"--ide2 local-lvm:cloudinit "
-            f"--cicustom user=local:snippets/user-data-{vmid}.yaml "
-            f"--ciuser {user} "
-            f"--ipconfig0 ip={brain_ip}/24,gw={gateway}"
-        )
+        self.pve.vm_set(vmid, boot='c', bootdisk='scsi0', ide2='local-lvm:cloudinit')
+        self.personalize(vmid, ip, name)
         
         # Start VM
         self.log("Starting VM...")
-        self.run_cmd(f"qm start {vmid}")
+        self.pve.vm_start(vmid)
+    
+    def build_template(self):
+        """Find or build the golden Brain template; returns its VMID (None if disabled)"""
+        if not config.get('templates.enabled', True):
+            return None
+        return self.templates.ensure()
+    
+    def deploy_brain(self):
+        """Deploy Brain VM"""
+        self.log("Building Brain (VM)...")
+        
+        vmid = config.get('ids.brain_vm')
+        brain_ip = config.get('network.brain_ip')
+        
+        # Stop and destroy existing VM
+        self.pve.vm_stop(vmid)
+        self.pve.vm_destroy(vmid)
+        ssh_manager.drop(brain_ip)
+        
+        template = self.pipeline.result('template') if self.pipeline else None
+        if template:
+            # Provisioned already: clone and give the copy its own identity
+            self.log(f"Cloning template {template}...")
+            if not self.templates.clone(template, vmid, 'oopuopu-cloud'):
+                raise RuntimeError(f"cloning template {template} failed")
+            self.personalize(vmid, brain_ip)
+            self.log("Starting VM...")
+            self.pve.vm_start(vmid)
+        else:
+            self.create_cloud_vm(vmid, 'oopuopu-cloud', brain_ip)
         
-        # Wait for network
-        self.log("Waiting for network connectivity...")
-        for i in range(60):
-            if os.system(f"ping -c 1 -W 1 {brain_ip} > /dev/null 2>&1") == 0:
-                break
-            time.sleep(2)
+        # Wait for SSH and cloud-init
+        self.log("Waiting for the VM to finish booting...")
+        if not self.wait_until_ready(vmid, brain_ip):
+            raise RuntimeError(f"Brain VM {vmid} never became ready at {brain_ip}")
         
         self.log(f"Brain VM ready at {brain_ip}")
-        self.progress = 70
+    
+    def run_stack_payload(self, ip, step=None):
+        """
+        Run the stack payload on a VM and mark it as installed
+        
+        The script is streamed over SSH; its [n/4] phases run side by side,
+        are logged with their durations and move the pipeline step `step`
+        along.
+        """
+        def progress(fraction, phase):
+            if self.pipeline and step:
+                self.pipeline.report(step, fraction)
+        
+        self.log("Installing stack (this may take 15+ minutes)...")
+        payload = RemoteScript(ssh_manager.connect(ip), STACK_PAYLOAD, name="v9_payload",
+                               log=self.log, on_progress=progress, concurrent=True,
+                               env={'PKGCACHE': cache_url() or ''})
+        try:
+            payload.run()
+        except RemoteScriptError as e:
+            self.log("Stack payload failed; last output:")
+            for line in e.tail:
+                self.log(f"  | {line}")
+            raise
+        
+        # Lets a re-run (or a clone of this VM) see this exact payload already ran
+        self.ssh(f"sudo mkdir -p {os.path.dirname(STACK_MARKER)} && echo {STACK_HASH} | sudo tee {STACK_MARKER} > /dev/null", ip)
     
     def install_orchestration_stack(self):
         """Install Nomad/Consul/Vault orchestration stack (v9)"""
         self.log("Installing Nomad Orchestration Stack...")
-        self.progress = 75
         
-        brain_ip = config.get('network.brain_ip')
-        user = config.get('credentials.user')
-        key_path = config.get('credentials.key_path')
+        # A Brain cloned from the template has it already
+        if self.verify_stack():
+            self.log("Orchestration stack already installed")
+            return
         
-        payload = r'''#!/bin/bash
-export DEBIAN_FRONTEND=noninteractive
-while sudo fuser /var/lib/dpkg/lock-frontend > /dev/null 2>&1; do sleep 2; done
-
-# ===== ORCHESTRATION STACK =====
-echo "[1/5] Installing HashiCorp Stack (Nomad/Consul/Vault)..."
-
-# Add HashiCorp GPG key and repository
-curl -fsSL https://apt.releases.hashicorp.com/gpg | sudo apt-key add -
-sudo apt-add-repository "deb [arch=amd64] https://apt.releases.hashicorp.com $(lsb_release -cs) main"
-sudo apt-get update > /dev/null
-
-# Install Nomad, Consul, Vault
-sudo apt-get install -y nomad consul vault docker.io > /dev/null
-
-# Configure Nomad
-sudo mkdir -p /etc/nomad.d /opt/nomad/data
-cat << 'EOF' | sudo tee /etc/nomad.d/nomad.hcl > /dev/null
-datacenter = "oopuo-dc1"
-data_dir = "/opt/nomad/data"
-
-server {
-  enabled = true
-  bootstrap_expect = 1
-}
-
-client {
-  enabled = true
-  
-  meta {
-    "node_type" = "brain"
-    "gpu_enabled" = "false"
-  }
-}
-
-plugin "docker" {
-  config {
-    allow_privileged = true
-    volumes {
-      enabled = true
-    }
-  }
-}
-EOF
-
-sudo systemctl enable nomad
-sudo systemctl start nomad
-
-# Configure Consul
-sudo mkdir -p /etc/consul.d /opt/consul/data
-cat << 'EOF' | sudo tee /etc/consul.d/consul.hcl > /dev/null
-datacenter = "oopuo-dc1"
-data_dir = "/opt/consul/data"
-server = true
-bootstrap_expect = 1
-ui_config {
-  enabled = true
-}
-bind_addr = "0.0.0.0"
-client_addr = "0.0.0.0"
-EOF
-
-sudo systemctl enable consul
-sudo systemctl start consul
-
-# Configure Vault
-sudo mkdir -p /etc/vault.d /opt/vault/data
-cat << 'EOF' | sudo tee /etc/vault.d/vault.hcl > /dev/null
-storage "file" {
-  path = "/opt/vault/data"
-}
-
-listener "tcp" {
-  address = "0.0.0.0:8200"
-  tls_disable = 1
-}
-
-ui = true
-disable_mlock = true
-EOF
-
-sudo systemctl enable vault
-sudo systemctl start vault
-
-# ===== DEEP LEARNING FRAMEWORKS =====
-echo "[2/5] Installing Deep Learning Frameworks..."
-
-# Miniconda
-mkdir -p ~/miniconda3
-if ! [ -f ~/miniconda3/bin/conda ]; then
-    wget -q https://repo.anaconda.com/miniconda/Miniconda3-latest-Linux-x86_64.sh -O ~/miniconda3/miniconda.sh
-    bash ~/miniconda3/miniconda.sh -b -u -p ~/miniconda3 > /dev/null
-    ~/miniconda3/bin/conda init bash > /dev/null
-fi
-
-source ~/miniconda3/bin/activate
-
-# PyTorch (CPU for now, GPU after passthrough)
-pip install torch torchvision torchaudio --index-url https://download.pytorch.org/whl/cpu > /dev/null 2>&1
-
-# TensorFlow
-pip install tensorflow > /dev/null 2>&1
-
-# JAX + Flax
-pip install jax flax > /dev/null 2>&1
-
-# ===== LLM TOOLS =====
-echo "[3/5] Installing LLM Tools..."
-
-# Core LLM frameworks
-pip install transformers accelerate bitsandbytes > /dev/null 2>&1
-pip install langchain langgraph langsmith langchain-openai langchain-community > /dev/null 2>&1
-
-# Fast inference
-pip install vllm > /dev/null 2>&1
-
-# Ollama
-curl -fsSL https://ollama.com/install.sh | sh > /dev/null 2>&1
-
-# llama.cpp
-cd ~
-if ! [ -d llama.cpp ]; then
-    git clone https://github.com/ggerganov/llama.cpp > /dev/null 2>&1
-    cd llama.cpp
-    make > /dev/null 2>&1
-fi
-
-# ===== VECTOR DATABASES =====
-echo "[4/5] Installing Vector Databases..."
-
-pip install chromadb qdrant-client weaviate-client pymilvus faiss-cpu > /dev/null 2>&1
-
-# ===== DEVELOPMENT TOOLS =====
-echo "[5/5] Installing Development & Privacy Tools..."
-
-# Core dev tools
-pip install jupyterlab mlflow wandb bentoml ray[serve] > /dev/null 2>&1
-
-# ONNX Runtime
-pip install onnxruntime > /dev/null 2>&1
-
-# Privacy tools (Phase 2 ready)
-pip install syft opacus tensorflow-privacy flwr > /dev/null 2>&1
-
-# Utilities
-sudo apt-get install -y htop nvtop iotop tmux vim git > /dev/null
-
-echo ""
-echo "✓ OOPUO v9 Orchestration Stack installed successfully!"
-echo ""
-echo "Services:"
-echo "  - Nomad UI:  http://$(hostname -I | awk '{print $1}'):4646"
-echo "  - Consul UI: http://$(hostname -I | awk '{print $1}'):8500"
-echo "  - Vault UI:  http://$(hostname -I | awk '{print $1}'):8200"
-echo "  - JupyterLab: Run 'jupyter lab --ip=0.0.0.0' manually"
-echo ""
-'''
+        self.run_stack_payload(config.get('network.brain_ip'), step='stack')
         
-        # Copy payload
-        with open("/tmp/v9_payload.sh", 'w') as f:
-            f.write(payload)
+        self.log("Orchestration stack installation complete")
+    
+    def prepare_gpu_host(self):
+        """Host side of GPU passthrough (IOMMU, VFIO); independent of the VM"""
+        self.log("Preparing host for GPU passthrough...")
         
-        self.run_cmd(
-            f"scp -i {key_path} -o StrictHostKeyChecking=no "
-            f"/tmp/v9_payload.sh {user}@{brain_ip}:/tmp/v9_payload.sh"
-        )
+        from gpu_manager import GPUManager
         
-        # Execute payload
-        self.log("Installing stack (this may take 15+ minutes)...")
-        self.run_cmd(
-            f"ssh -i {key_path} -o StrictHostKeyChecking=no "
-            f"{user}@{brain_ip} 'chmod +x /tmp/v9_payload.sh && /tmp/v9_payload.sh'"
-        )
+        self.gpu = GPUManager()
+        self.gpu_host = self.gpu.prepare_host()
         
-        self.progress = 95
-        self.log("Orchestration stack installation complete")
+        for step in self.gpu_host['steps']:
+            self.log(step)
     
     def setup_gpu_passthrough(self):
         """Configure GPU passthrough for Brain VM"""
         self.log("Setting up GPU passthrough...")
         
-        from gpu_manager import GPUManager
-        
-        gpu_mgr = GPUManager()
         vmid = config.get('ids.brain_vm')
         brain_ip = config.get('network.brain_ip')
         key_path = config.get('credentials.key_path')
         user = config.get('credentials.user')
         
-        # Run full GPU setup
-        result = gpu_mgr.full_setup(vmid, brain_ip, key_path, user)
-        
-        for step in result['steps']:
-            self.log(step)
+        # Attach the GPU prepared by prepare_gpu_host()
+        result = self.gpu_host
+        if result['success']:
+            result = self.gpu.attach_vm(vmid, brain_ip, key_path, user)
+            for step in result['steps']:
+                self.log(step)
         
         if result['next_action'] == 'REBOOT_HOST':
             self.log("⚠ HOST REBOOT REQUIRED - Re-run deployment after reboot")
@@ -455,46 +647,152 @@ EOF
 sudo systemctl restart nomad
 """
             
-            self.run_cmd(
-                f"ssh -i {key_path} -o StrictHostKeyChecking=no "
-                f"{user}@{brain_ip} '{update_nomad_gpu}'"
-            )
+            self.ssh(update_nomad_gpu)
             
             return 'GPU_CONFIGURED'
         else:
             return 'GPU_FAILED'
     
+    # ----- journal: step inputs and checks that a recorded run still holds -----
+    
+    def guard_inputs(self):
+        return [
+            config.get('ids.guard_ct'), config.get('assets.lxc_template'),
+            config.get('network.guard_ip'), config.get('network.gateway'),
+            config.get('network.bridge'), config.get('credentials.pass'), GUARD_SETUP
+        ]
+    
+    def verify_guard(self):
+        ctid = config.get('ids.guard_ct')
+        if not self.ensure_running(ctid, 'lxc'):
+            return False
+        return self.pve.ct_exec(ctid, ['test', '-x', '/usr/bin/cloudflared'], timeout=30) is not None
+    
+    def brain_inputs(self):
+        key_path = config.get('credentials.key_path')
+        try:
+            with open(f"{key_path}.pub") as f:
+                pubkey = f.read().strip()
+        except OSError:
+            pubkey = None
+        return [
+            config.get('ids.brain_vm'), config.get('network.brain_ip'),
+            config.get('network.gateway'), config.get('network.bridge'),
+            config.get('credentials.user'), config.get('credentials.pass'),
+            pubkey, config.get('assets.cloud_img_url'),
+            # the template the Brain is cloned from (None: built directly)
+            self.templates.key() if self.pipeline.result('template') else None
+        ]
+    
+    def verify_brain(self):
+        if not self.ensure_running(config.get('ids.brain_vm'), 'qemu'):
+            return False
+        return self.wait_until_ready(config.get('ids.brain_vm'), config.get('network.brain_ip'))
+    
+    def stack_inputs(self):
+        return [STACK_HASH, config.get('network.brain_ip'), config.get('credentials.user')]
+    
+    def verify_stack(self):
+        return self.ssh(f"cat {STACK_MARKER}") == STACK_HASH
+    
+    def gpu_vm_inputs(self):
+        pci_id = self.gpu.gpu_info['full_pci'] if self.gpu and self.gpu.gpu_info else None
+        return [config.get('ids.brain_vm'), pci_id, config.get('network.brain_ip')]
+    
+    def verify_gpu_vm(self):
+        vm_config = self.pve.vm_config(config.get('ids.brain_vm')) or {}
+        pci_id = self.gpu.gpu_info['full_pci'] if self.gpu and self.gpu.gpu_info else None
+        return bool(pci_id) and vm_config.get('hostpci0', '').startswith(pci_id)
+    
+    def build_pipeline(self):
+        """
+        Deployment step graph
+        
+        Guard and Brain only share the network settings, and the GPU host
+        steps touch neither guest, so they overlap; the GPU is attached
+        once the stack is installed (both use apt inside the VM). Weights
+        follow the share of a typical deployment each step takes.
+        
+        The Brain is cloned from the golden template, which is built only
+        when its inputs changed, so the stack step normally finds the
+        payload installed already.
+        
+        Guard, Brain, the stack and the GPU attachment are journaled: a
+        re-run (e.g. after the reboot GPU passthrough asks for) checks
+        that they are still in place and skips them. Network, assets, the
+        template lookup and the host GPU steps are quick and idempotent,
+        so they always run.
+        """
+        return Pipeline([
+            Step('network', self.detect_network, weight=10),
+            Step('assets', self.download_assets, weight=20),
+            Step('guard', self.deploy_guard, deps=['network'], weight=20,
+                 fingerprint=self.guard_inputs, verify=self.verify_guard),
+            Step('template', self.build_template, deps=['network', 'assets'], weight=15),
+            Step('brain', self.deploy_brain, deps=['network', 'assets', 'template'], weight=10,
+                 fingerprint=self.brain_inputs, verify=self.verify_brain),
+            Step('gpu_host', self.prepare_gpu_host, weight=5),
+            Step('stack', self.install_orchestration_stack, deps=['brain'], weight=15,
+                 fingerprint=self.stack_inputs, verify=self.verify_stack),
+            Step('gpu_vm', self.setup_gpu_passthrough, deps=['gpu_host', 'stack'], weight=5,
+                 fingerprint=self.gpu_vm_inputs, verify=self.verify_gpu_vm,
+                 complete=lambda status: status == 'GPU_CONFIGURED')
+        ], workers=config.get('deploy.workers', 3), log=self.log, journal=self.journal)
+    
+    def start_pkgcache(self):
+        """
+        Serve the package cache while deploying; returns it, or None if it
+        is disabled or the port is taken (e.g. by a standalone pkgcache.py)
+        """
+        if not config.get('pkgcache.enabled', True):
+            return None
+        try:
+            return PackageCache().start()
+        except OSError as e:
+            self.log(f"Package cache not started here: {e}")
+            return None
+    
     def deploy_full_stack(self):
-        """Full deployment sequence (v9)"""
+        """Full deployment (v9), independent steps in parallel"""
+        self.pipeline = self.build_pipeline()
         try:
-            self.detect_network()
-            self.download_assets()
-            self.deploy_guard()
-            self.deploy_brain()
-            
-            # v9: Install orchestration stack
-            self.install_orchestration_stack()
-            
-            # v9: GPU passthrough (optional)
-            gpu_status = self.setup_gpu_passthrough()
-            
-            if gpu_status == 'REBOOT_REQUIRED':
-                self.log("Deployment paused - reboot required for GPU passthrough")
-                self.progress = 95
-                return 'REBOOT_REQUIRED'
-            
-            self.progress = 100
-            self.log("OOPUO v9 DEPLOYMENT COMPLETE")
-            return True
-            
-        except Exception as e:
-            self.log(f"ERROR: {str(e)}")
-            import traceback
-            self.log(traceback.format_exc())
+            success = self.pipeline.run()
+        finally:
+            # Started by the network step
+            if self.pkgcache:
+                self.log(f"Package cache: {self.pkgcache.summary()}")
+                self.pkgcache.stop()
+                self.pkgcache = None
+        
+        for name, state, offset, duration in self.pipeline.timings():
+            if offset is None:
+                self.log(f"  {name:<10} {state}")
+            else:
+                self.log(f"  {name:<10} {state:<8} +{offset:.1f}s  {duration:.1f}s")
+        self.log(self.pipeline.summary())
+        for line in executor().summary():
+            self.log(f"  {line}")
+        
+        if not success:
+            self.log("Deployment failed")
             return False
+        
+        if self.pipeline.result('gpu_vm') == 'REBOOT_REQUIRED':
+            self.log("Deployment paused - reboot required for GPU passthrough")
+            return 'REBOOT_REQUIRED'
+        
+        self.log("OOPUO v9 DEPLOYMENT COMPLETE")
+        return True
 
 if __name__ == "__main__":
+    import sys
+    
     engine = InfraEngine()
+    if '--fresh' in sys.argv:
+        # Rebuild everything, even steps the journal has as done, from the
+        # latest cloud image
+        engine.journal.reset()
+        engine.refresh_image = True
     success = engine.deploy_full_stack()
     
     if success == 'REBOOT_REQUIRED':
@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+"""
+OOPUO Desktop Environment - Disk and Network Throughput Collectors
+Per-device rates from /proc/diskstats and per-interface rates from /proc/net/dev
+"""
+import os
+import time
+from array import array
+
+PROC_DISKSTATS = "/proc/diskstats"
+PROC_NET_DEV = "/proc/net/dev"
+
+# Virtual block devices (zd* are Proxmox zvols - guest disks, already counted by their pool)
+SKIP_DISKS = ('loop', 'ram', 'zram', 'dm-', 'zd', 'nbd', 'sr')
+
+# Guest-side and helper interfaces on a Proxmox host
+SKIP_IFACES = ('lo', 'tap', 'veth', 'fwbr', 'fwpr', 'fwln', 'ifb')
+
+class _ProcReader:
+    """Persistent fd plus a reusable read buffer for one /proc file"""
+
+    def __init__(self, path, size=65536):
+        self.fd = os.open(path, os.O_RDONLY)
+        self.buf = bytearray(size)
+
+    def read(self):
+        """Whole file contents (the buffer grows if the file outgrows it)"""
+        while True:
+            n = os.preadv(self.fd, [self.buf], 0)
+            if n < len(self.buf):
+                return memoryview(self.buf)[:n]
+            self.buf = bytearray(2 * len(self.buf))
+
+    def close(self):
+        try:
+            os.close(self.fd)
+        except OSError:
+            pass
+
+class DiskCollector:
+    """
+    Per-disk read/write throughput, IOPS, latency and utilization
+
+    Only the physical whole disks are tracked. Their previous counters live
+    in one flat array that is swapped with the current one every sample.
+    """
+
+    # diskstats counters after (major, minor, name)
+    READS, SECTORS_READ, MS_READING = 0, 2, 3
+    WRITES, SECTORS_WRITTEN, MS_WRITING = 4, 6, 7
+    MS_IO = 9
+    FIELDS = (READS, SECTORS_READ, MS_READING, WRITES, SECTORS_WRITTEN, MS_WRITING, MS_IO)
+    SECTOR = 512
+
+    def __init__(self):
+        self.reader = _ProcReader(PROC_DISKSTATS)
+        self.names = []
+        self.rows = []          # token rows of the tracked disks
+        self.prev = array('Q')
+        self.prev_time = 0.0
+        self.disks = []
+        self.sample()
+
+    @staticmethod
+    def _tracked(name):
+        if name.startswith(SKIP_DISKS):
+            return False
+        # Whole disks only (partitions have no /sys/block entry)
+        return os.path.isdir(f"/sys/block/{name}")
+
+    def sample(self):
+        """
+        Take one sample
+
+        Returns:
+            List of {name, read, write (bytes/s), iops, latency (ms), util (%)}
+        """
+        try:
+            data = bytes(self.reader.read())
+        except OSError:
+            return self.disks
+
+        now = time.monotonic()
+        tokens = data.split()
+        stride = len(data[:data.find(b'\n')].split())
+        names = [name.decode() for name in tokens[2::stride]]
+
+        # Device set changed (hotplug) - rebuild the row map and restart the baseline
+        if names != self.names:
+            self.names = names
+            self.rows = [i for i, name in enumerate(names) if self._tracked(name)]
+            self.prev = array('Q')
+
+        counters = array('Q', [
+            int(tokens[row * stride + 3 + field])
+            for row in self.rows
+            for field in self.FIELDS
+        ])
+
+        if len(self.prev) == len(counters):
+            elapsed = now - self.prev_time
+            width = len(self.FIELDS)
+            disks = []
+            for slot, row in enumerate(self.rows):
+                base = slot * width
+                d = [counters[base + k] - self.prev[base + k] for k in range(width)]
+                ios = d[0] + d[3]
+                disks.append({
+                    'name': self.names[row],
+                    'read': d[1] * self.SECTOR / elapsed if elapsed else 0.0,
+                    'write': d[4] * self.SECTOR / elapsed if elapsed else 0.0,
+                    'iops': ios / elapsed if elapsed else 0.0,
+                    'latency': (d[2] + d[5]) / ios if ios else 0.0,
+                    'util': min(100.0, d[6] / (elapsed * 10)) if elapsed else 0.0,
+                })
+            self.disks = disks
+
+        self.prev = counters
+        self.prev_time = now
+        return self.disks
+
+    def close(self):
+        self.reader.close()
+
+class NetCollector:
+    """Per-interface rx/tx rates and link utilization"""
+
+    def __init__(self):
+        self.reader = _ProcReader(PROC_NET_DEV, size=16384)
+        self.names = []
+        self.speeds = {}        # iface -> link speed in Mbit/s (0 = unknown)
+        self.prev = array('Q')
+        self.prev_time = 0.0
+        self.ifaces = []
+        self.sample()
+
+    def _speed(self, name):
+        try:
+            with open(f"/sys/class/net/{name}/speed", 'r') as f:
+                return max(0, int(f.read().strip()))
+        except (OSError, ValueError):
+            return 0
+
+    def sample(self):
+        """
+        Take one sample
+
+        Returns:
+            List of {name, rx, tx (bytes/s), util (% of link speed, 0 if unknown)}
+        """
+        try:
+            data = bytes(self.reader.read())
+        except OSError:
+            return self.ifaces
+
+        now = time.monotonic()
+        names = []
+        values = []
+        # Skip the two header lines; 'iface: rx_bytes ... (8 rx) tx_bytes ...'
+        for line in data.split(b'\n')[2:]:
+            name, _, counters = line.partition(b':')
+            name = name.strip().decode()
+            if not counters or name.startswith(SKIP_IFACES):
+                continue
+            fields = counters.split()
+            names.append(name)
+            values.append(int(fields[0]))
+            values.append(int(fields[8]))
+        counters = array('Q', values)
+
+        if names != self.names:
+            self.names = names
+            self.speeds = {name: self._speed(name) for name in names}
+            self.prev = array('Q')
+
+        if len(self.prev) == len(counters):
+            elapsed = now - self.prev_time
+            ifaces = []
+            for i, name in enumerate(self.names):
+                rx = (counters[2 * i] - self.prev[2 * i]) / elapsed if elapsed else 0.0
+                tx = (counters[2 * i + 1] - self.prev[2 * i + 1]) / elapsed if elapsed else 0.0
+                speed = self.speeds[name]
+                util = min(100.0, max(rx, tx) * 8 / (speed * 1e4)) if speed else 0.0
+                ifaces.append({'name': name, 'rx': rx, 'tx': tx, 'util': util})
+            self.ifaces = ifaces
+
+        self.prev = counters
+        self.prev_time = now
+        return self.ifaces
+
+    def close(self):
+        self.reader.close()
+
+if __name__ == "__main__":
+    disks = DiskCollector()
+    nets = NetCollector()
+    try:
+        while True:
+            time.sleep(1)
+            for disk in disks.sample():
+                print(
+                    f"{disk['name']:<10} r {disk['read'] / 1048576:7.1f} w {disk['write'] / 1048576:7.1f} MB/s  "
+                    f"{disk['iops']:7.0f} IOPS  {disk['latency']:5.1f} ms  {disk['util']:5.1f}%"
+                )
+            for iface in nets.sample():
+                print(f"{iface['name']:<10} rx {iface['rx'] / 1048576:7.1f} tx {iface['tx'] / 1048576:7.1f} MB/s")
+            print()
+    except KeyboardInterrupt:
+        pass
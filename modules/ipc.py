@@ -4,6 +4,7 @@ OOPUO Desktop Environment - IPC (Inter-Process Communication)
 FIFO-based communication between panes
 """
 import os
+import stat
 import time
 from pathlib import Path
 from config import FIFO_PATH, LOG_FILE
@@ -19,7 +20,7 @@ class IPC:
         """Create FIFO if it doesn't exist"""
         if os.path.exists(self.fifo_path):
             # Remove if it's not a FIFO
-            if not os.path.isfifo(self.fifo_path):
+            if not stat.S_ISFIFO(os.stat(self.fifo_path).st_mode):
                 os.remove(self.fifo_path)
         
         if not os.path.exists(self.fifo_path):
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+OOPUO Desktop Environment - Deployment Journal
+Completed deployment steps and the inputs they ran with, kept across runs
+"""
+import os
+import json
+import time
+import hashlib
+import threading
+from config import DEPLOY_STATE
+
+JOURNAL_VERSION = 1
+
+def fingerprint(*parts):
+    """Stable hash of a step's inputs (anything JSON can represent)"""
+    blob = json.dumps(parts, sort_keys=True, default=str)
+    return hashlib.sha256(blob.encode()).hexdigest()
+
+class DeployJournal:
+    """
+    Persistent record of finished deployment steps
+
+    Each entry keeps the fingerprint of the step's inputs, its result and
+    when it completed. A re-run whose fingerprint matches (and whose
+    result still checks out on the host) can skip the step. The file is
+    rewritten atomically after every change, so a crash or reboot in the
+    middle of a deployment keeps every step finished before it.
+    """
+
+    def __init__(self, path=DEPLOY_STATE):
+        self.path = path
+        self.lock = threading.Lock()
+        self.steps = self._load()
+
+    def _load(self):
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        if not isinstance(data, dict) or data.get('version') != JOURNAL_VERSION:
+            return {}
+        return data.get('steps', {})
+
+    def _save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp = f"{self.path}.{os.getpid()}"
+        with open(tmp, 'w') as f:
+            json.dump({'version': JOURNAL_VERSION, 'steps': self.steps}, f, indent=2)
+        os.replace(tmp, self.path)
+
+    def get(self, name):
+        """Entry for a step ({'key', 'result', 'completed', 'duration'}), or None"""
+        with self.lock:
+            return self.steps.get(name)
+
+    def record(self, name, key, result, duration):
+        with self.lock:
+            self.steps[name] = {
+                'key': key,
+                'result': result,
+                'completed': time.time(),
+                'duration': round(duration, 1)
+            }
+            self._save()
+
+    def forget(self, name):
+        with self.lock:
+            if self.steps.pop(name, None) is not None:
+                self._save()
+
+    def reset(self):
+        """Forget every step (the next deployment starts from scratch)"""
+        with self.lock:
+            self.steps = {}
+            self._save()
+
+if __name__ == "__main__":
+    journal = DeployJournal()
+    if not journal.steps:
+        print(f"No completed steps in {journal.path}")
+    for name, entry in sorted(journal.steps.items(), key=lambda item: item[1]['completed']):
+        completed = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(entry['completed']))
+        print(f"  {name:<10} {completed}  {entry['duration']:>7.1f}s  {entry['key'][:12]}")
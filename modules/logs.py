@@ -4,10 +4,11 @@ OOPUO Desktop Environment - Live Logs Module
 Aggregated log streaming from multiple sources
 """
 import sys
-import subprocess
 import shutil
 from colors import col, box_chars, C_PRIMARY, C_SUCCESS, C_MUTED, C_TEXT
 from config import config
+from sshmux import ssh_manager
+from executor import executor
 
 def show_logs():
     """Display aggregated logs from host and Brain VM"""
@@ -31,12 +32,12 @@ def show_logs():
     main_pane = config.get('panes.main', 'oopuo-desktop:0.2')
     
     # Split main pane horizontally
-    subprocess.run([
+    executor().run([
         'tmux', 'split-window', '-v', '-t', main_pane
     ])
     
     # Top pane: Host syslog
-    subprocess.run([
+    executor().run([
         'tmux', 'send-keys', '-t', f'{main_pane}.0',
         'tail -f /var/log/syslog | grep -i --color=never "oopuo\\|error\\|warn"',
         'Enter'
@@ -48,14 +49,15 @@ def show_logs():
     user = config.get('credentials.user')
     
     if brain_ip and key_path:
-        subprocess.run([
+        # Attaches to the shared connection if one is up, else connects directly
+        conn = ssh_manager.connect(brain_ip, user, key_path)
+        executor().run([
             'tmux', 'send-keys', '-t', f'{main_pane}.1',
-            f'ssh -i {key_path} -o StrictHostKeyChecking=no {user}@{brain_ip} '
-            f'"tail -f /var/log/syslog 2>/dev/null || echo \'Brain logs unavailable\'"',
+            conn.command_line("tail -f /var/log/syslog 2>/dev/null || echo 'Brain logs unavailable'"),
             'Enter'
         ])
     else:
-        subprocess.run([
+        executor().run([
             'tmux', 'send-keys', '-t', f'{main_pane}.1',
             'echo "Brain VM not configured"',
             'Enter'
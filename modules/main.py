@@ -45,9 +45,11 @@ def main():
         sys.exit(1)
     
     # Start viewport manager in background thread
-    viewport = ViewportManager()
-    viewport_thread = threading.Thread(target=viewport.run, daemon=True)
-    viewport_thread.start()
+    # (in single-process mode the TUI host handles viewport commands itself)
+    if config.get('tui.mode', 'panes') != 'single':
+        viewport = ViewportManager()
+        viewport_thread = threading.Thread(target=viewport.run, daemon=True)
+        viewport_thread.start()
     
     # Attach to tmux session (foreground)
     print("✓ OOPUO Desktop Environment initialized")
@@ -1,32 +1,107 @@
 #!/usr/bin/env python3
 """
 OOPUO Desktop Environment - Header Metrics (BTOP-Inspired)
-Displays GPU, CPU, RAM, and uptime with gradient bars
+Displays GPU, CPU, RAM, disk, network and uptime with gradient bars
 """
-import sys
-import os
 import time
-import shutil
-import subprocess
+import threading
 from datetime import datetime, timedelta
-from colors import col, gradient_bar, temp_color, C_PRIMARY, C_SUCCESS, C_MUTED, C_TEXT, bold
+from colors import col, gradient_bar, mini_sparkline, temp_color, C_PRIMARY, C_SUCCESS, C_ERROR, C_MUTED, C_TEXT, bold
 from config import config
+from gpu_sampler import GPUSampler, summarize, throttle_labels
+from cpu_stat import CPUCollector
+from iostat import DiskCollector, NetCollector
+from timeseries import SeriesStore
+from history import MetricsArchive
+from shm import SnapshotReader
+from screen import Screen
+
+def format_uptime(uptime_seconds):
+    """Format seconds as a short uptime string"""
+    delta = timedelta(seconds=int(uptime_seconds))
+    days = delta.days
+    hours = delta.seconds // 3600
+    minutes = (delta.seconds % 3600) // 60
+    
+    if days > 0:
+        return f"{days}d {hours}h"
+    elif hours > 0:
+        return f"{hours}h {minutes}m"
+    else:
+        return f"{minutes}m"
+
+def format_rate(bytes_per_sec):
+    """Format a byte rate compactly (e.g. 512K, 12.3M, 1.1G)"""
+    if bytes_per_sec >= 1024 ** 3:
+        return f"{bytes_per_sec / 1024 ** 3:.1f}G"
+    if bytes_per_sec >= 1024 ** 2:
+        return f"{bytes_per_sec / 1024 ** 2:.1f}M"
+    return f"{int(bytes_per_sec / 1024)}K"
 
 class MetricsRenderer:
     """Renders the top header pane with system metrics"""
     
-    def __init__(self):
-        self.history_cpu = []
-        self.history_gpu = []
-        self.max_history = 60  # Keep 60 data points
+    def __init__(self, collect_locally=False, screen=None):
+        # 3 hours of 1 Hz history per series (~130 KB each)
+        self.history = SeriesStore(capacity=3 * 3600)
+        self.spark_width = 10
+        
+        # Prefer the shared collector daemon; sample locally only as a fallback
+        self.collect_locally = collect_locally
+        self.snapshot = SnapshotReader()
+        self.gpu_sampler = None
+        self.cpu_collector = None
+        self.disk_collector = None
+        self.net_collector = None
+        self.net_peak = 1.0     # scale for interfaces without a known link speed
+        self.archive = None
+        self.screen = screen    # created on first render (collectord never draws)
+        self.stop_event = threading.Event()
+        
+        self._restore_history()
+    
+    def start_collectors(self):
+        """Start local collectors (used by collectord, or when it is not running)"""
+        if self.cpu_collector is not None:
+            return
+        
+        # GPU telemetry is sampled in the background (no fork per frame)
+        self.gpu_sampler = GPUSampler(interval=1.0).start()
+        self.cpu_collector = CPUCollector()
+        self.disk_collector = DiskCollector()
+        self.net_collector = NetCollector()
+        
+        self.open_archive()
+    
+    def open_archive(self):
+        """
+        Persistent history (survives pane restarts and host reboots)
+        
+        Only one process writes it; the others get a read-only archive
+        that drops their samples (see MetricsArchive).
+        """
+        try:
+            self.archive = MetricsArchive()
+        except Exception:
+            self.archive = None
+    
+    def _restore_history(self):
+        """Refill the in-memory store from the last hour on disk"""
+        try:
+            archive = MetricsArchive(readonly=True)
+        except Exception:
+            return
+        
+        now = time.time()
+        for ts, avgs, _ in archive.query(now - 3600, now, tier='1s'):
+            self.history.record(avgs, ts)
+        archive.close()
     
     def get_cpu_usage(self):
-        """Get CPU usage percentage"""
+        """Get CPU utilization percentage from /proc/stat deltas"""
         try:
-            load = os.getloadavg()[0]
-            cpu_count = os.cpu_count() or 1
-            return min(100, int((load / cpu_count) * 100))
-        except:
+            return int(round(self.cpu_collector.sample()))
+        except Exception:
             return 0
     
     def get_ram_usage(self):
@@ -55,112 +130,156 @@ class MetricsRenderer:
     
     def get_gpu_info(self):
         """
-        Get GPU usage and temperature
+        Get aggregate GPU usage and the worst device's temperature
         Returns: (gpu_percent, temp_celsius, gpu_name)
         """
+        devices = self.gpu_sampler.latest()
+        avg_util, max_temp, worst = summarize(devices)
+        if worst is None:
+            return 0, 0, "No GPU"
+        return int(avg_util), int(max_temp), worst['name']
+    
+    def get_uptime_seconds(self):
+        """Get system uptime in seconds"""
         try:
-            # Try nvidia-smi first
-            result = subprocess.run(
-                ['nvidia-smi', '--query-gpu=utilization.gpu,temperature.gpu,name', 
-                 '--format=csv,noheader,nounits'],
-                capture_output=True,
-                text=True,
-                timeout=2
-            )
-            
-            if result.returncode == 0:
-                parts = result.stdout.strip().split(',')
-                if len(parts) >= 3:
-                    gpu_util = int(parts[0].strip())
-                    gpu_temp = int(parts[1].strip())
-                    gpu_name = parts[2].strip()
-                    return gpu_util, gpu_temp, gpu_name
-        except:
-            pass
-        
-        # Try AMD rocm-smi
-        try:
-            result = subprocess.run(
-                ['rocm-smi', '--showuse', '--showtemp'],
-                capture_output=True,
-                text=True,
-                timeout=2
-            )
-            
-            if result.returncode == 0:
-                # Parse rocm-smi output (format varies)
-                lines = result.stdout.split('\n')
-                gpu_util = 0
-                gpu_temp = 0
-                
-                for line in lines:
-                    if 'GPU use' in line:
-                        gpu_util = int(line.split()[-1].replace('%', ''))
-                    if 'Temperature' in line:
-                        gpu_temp = int(line.split()[-1].replace('°C', ''))
-                
-                return gpu_util, gpu_temp, "AMD GPU"
+            with open('/proc/uptime', 'r') as f:
+                return float(f.readline().split()[0])
         except:
-            pass
-        
-        # No GPU detected
-        return 0, 0, "No GPU"
+            return 0.0
     
     def get_uptime(self):
         """Get system uptime as formatted string"""
-        try:
-            with open('/proc/uptime', 'r') as f:
-                uptime_seconds = float(f.readline().split()[0])
-            
-            delta = timedelta(seconds=int(uptime_seconds))
-            days = delta.days
-            hours = delta.seconds // 3600
-            minutes = (delta.seconds % 3600) // 60
-            
-            if days > 0:
-                return f"{days}d {hours}h"
-            elif hours > 0:
-                return f"{hours}h {minutes}m"
-            else:
-                return f"{minutes}m"
-        except:
-            return "unknown"
+        seconds = self.get_uptime_seconds()
+        return format_uptime(seconds) if seconds else "unknown"
     
-    def render(self):
-        """Render the header metrics"""
-        width, _ = shutil.get_terminal_size()
+    def collect(self):
+        """
+        Sample every local collector once
+        Returns: dict in the shared snapshot layout (see shm.py)
+        """
+        self.start_collectors()
+        if self.archive is None and not self.collect_locally:
+            self.open_archive()     # handed back to collectord earlier (see current())
         
-        # Get metrics
         cpu = self.get_cpu_usage()
         mem_used, mem_total, mem_percent = self.get_ram_usage()
-        gpu_util, gpu_temp, gpu_name = self.get_gpu_info()
-        uptime = self.get_uptime()
+        core_id, core_pct = self.cpu_collector.hottest_core()
+        
+        sample = {
+            'cpu': cpu,
+            'cpu_hot': core_pct,
+            'cpu_hot_core': core_id if core_id is not None else -1,
+            'numa': [
+                {'node': node, 'util': pct}
+                for node, pct in self.cpu_collector.per_node.items()
+            ],
+            'ram': mem_percent,
+            'ram_used': mem_used,
+            'ram_total': mem_total,
+            'uptime': self.get_uptime_seconds(),
+            'gpus': self.gpu_sampler.latest(),
+            'disks': self.disk_collector.sample(),
+            'nets': self.net_collector.sample(),
+        }
+        
+        if self.archive:
+            gpu_util, gpu_temp, _ = summarize(sample['gpus'])
+            self.archive.append({
+                'cpu': cpu,
+                'ram': mem_percent,
+                'gpu_util': gpu_util,
+                'gpu_temp': gpu_temp
+            })
+        
+        return sample
+    
+    def current(self):
+        """Latest metrics: the daemon snapshot if fresh, else a local sample"""
+        if not self.collect_locally:
+            snap = self.snapshot.read(max_age=3)
+            if snap is not None:
+                if self.archive is not None:
+                    # collectord is back: release the writer lock to it
+                    self.archive.close()
+                    self.archive = None
+                return snap
+        return self.collect()
+    
+    def check_alerts(self):
+        """
+        Evaluate alert thresholds over the recent history window
+        Returns: list of short alert labels
+        """
+        window = config.get('alerts.window_sec', 60)
+        rules = [
+            ('cpu', 'avg', config.get('alerts.cpu_avg', 90), "CPU"),
+            ('ram', 'avg', config.get('alerts.ram_avg', 90), "RAM"),
+            ('gpu_temp', 'p95', config.get('alerts.gpu_temp_p95', 85), "GPU TEMP"),
+        ]
+        
+        alerts = []
+        for series, stat, threshold, label in rules:
+            stats = self.history.stats(series, seconds=window)
+            if stats and stats[stat] >= threshold:
+                alerts.append(label)
+        return alerts
+    
+    def render(self):
+        """Render the header metrics"""
+        # Get metrics
+        metrics = self.current()
+        cpu = int(metrics['cpu'])
+        mem_used, mem_total, mem_percent = metrics['ram_used'], metrics['ram_total'], int(metrics['ram'])
+        gpus = metrics['gpus']
+        avg_util, max_temp, worst = summarize(gpus)
+        gpu_util, gpu_temp = int(avg_util), int(max_temp)
+        uptime = format_uptime(metrics['uptime']) if metrics['uptime'] else "unknown"
         
         # Update history
-        self.history_cpu.append(cpu)
-        self.history_gpu.append(gpu_util)
-        if len(self.history_cpu) > self.max_history:
-            self.history_cpu.pop(0)
-        if len(self.history_gpu) > self.max_history:
-            self.history_gpu.pop(0)
+        self.history.record({
+            'cpu': cpu,
+            'ram': mem_percent,
+            'gpu_util': gpu_util,
+            'gpu_temp': gpu_temp
+        })
+        alerts = self.check_alerts()
         
         # Build header layout
         # Format: [ OOPUO OS ] | GPU: [bar] 45% 75°C | CPU: [bar] 23% | RAM: [bar] 4.2/16GB | UP: 12d 4h
         
         logo = bold(col("[ OOPUO OS ]", C_PRIMARY))
         
-        # GPU section (most important!)
+        # GPU section (most important!) - average load, worst device highlighted
+        gpu_label = f"GPU×{len(gpus)}:" if len(gpus) > 1 else "GPU:"
         gpu_bar = gradient_bar(gpu_util, 100, width=12)
         gpu_temp_col = temp_color(gpu_temp)
         gpu_section = (
-            f"{col('GPU:', C_TEXT)} {gpu_bar} "
+            f"{col(gpu_label, C_TEXT)} {gpu_bar} "
             f"{col(f'{gpu_util}%', C_SUCCESS)} "
-            f"{col(f'{gpu_temp}°C', gpu_temp_col)}"
         )
+        if len(gpus) > 1:
+            worst_idx, worst_util = worst['index'], int(worst['util'])
+            gpu_section += col(f"#{worst_idx} {worst_util}% {gpu_temp}°C", gpu_temp_col)
+        else:
+            gpu_section += col(f"{gpu_temp}°C", gpu_temp_col)
+        if worst is not None and throttle_labels(worst['throttle']):
+            gpu_section += " " + col("THR", C_ERROR)
+        gpu_section += f" {mini_sparkline(self.history.tail('gpu_util', self.spark_width), self.spark_width)}"
         
         # CPU section
         cpu_bar = gradient_bar(cpu, 100, width=10)
-        cpu_section = f"{col('CPU:', C_TEXT)} {cpu_bar} {col(f'{cpu}%', C_SUCCESS)}"
+        cpu_section = (
+            f"{col('CPU:', C_TEXT)} {cpu_bar} {col(f'{cpu}%', C_SUCCESS)} "
+            f"{mini_sparkline(self.history.tail('cpu', self.spark_width), self.spark_width)}"
+        )
+        
+        # Saturation hints: busiest core and NUMA node split
+        if metrics['cpu_hot_core'] >= 0:
+            core_pct = metrics['cpu_hot']
+            cpu_section += f" {col(f'▲{int(core_pct)}%', temp_color(core_pct))}"
+        for node in metrics['numa']:
+            node_id, node_pct = node['node'], int(node['util'])
+            cpu_section += f" {col(f'N{node_id}:{node_pct}%', C_MUTED)}"
         
         # RAM section
         ram_bar = gradient_bar(mem_percent, 100, width=10)
@@ -169,30 +288,72 @@ class MetricsRenderer:
             f"{col(f'{mem_used:.1f}/{mem_total:.1f}GB', C_SUCCESS)}"
         )
         
+        # Disk section - bar shows the busiest disk's utilization
+        disks = metrics['disks']
+        disk_util = int(max((d['util'] for d in disks), default=0))
+        disk_read = sum(d['read'] for d in disks)
+        disk_write = sum(d['write'] for d in disks)
+        disk_section = (
+            f"{col('DISK:', C_TEXT)} {gradient_bar(disk_util, 100, width=8)} "
+            f"{col(f'r{format_rate(disk_read)} w{format_rate(disk_write)}', C_SUCCESS)}"
+        )
+        if disks:
+            busiest = max(disks, key=lambda d: d['util'])
+            latency = busiest['latency']
+            if busiest['iops'] >= 1:
+                disk_section += f" {col(f'{latency:.1f}ms', C_MUTED)}"
+        
+        # Network section - link utilization, or share of the peak seen when speed is unknown
+        nets = metrics['nets']
+        net_rx = sum(n['rx'] for n in nets)
+        net_tx = sum(n['tx'] for n in nets)
+        net_util = max((n['util'] for n in nets), default=0)
+        if not any(n['util'] for n in nets):
+            self.net_peak = max(self.net_peak, net_rx, net_tx)
+            net_util = max(net_rx, net_tx) * 100 / self.net_peak
+        net_section = (
+            f"{col('NET:', C_TEXT)} {gradient_bar(int(net_util), 100, width=8)} "
+            f"{col(f'↓{format_rate(net_rx)} ↑{format_rate(net_tx)}', C_SUCCESS)}"
+        )
+        
         # Uptime
         uptime_section = f"{col('UP:', C_TEXT)} {col(uptime, C_MUTED)}"
         
         # Combine sections
-        sections = [logo, gpu_section, cpu_section, ram_section, uptime_section]
+        sections = [logo, gpu_section, cpu_section, ram_section, disk_section, net_section, uptime_section]
+        if alerts:
+            sections.append(col("⚠ " + " ".join(alerts), C_ERROR))
         header = "  ".join(sections)
         
-        # Render (clear screen and print)
-        sys.stdout.write("\033[H\033[J")  # Clear screen
-        sys.stdout.write(header)
-        sys.stdout.flush()
+        # Render through the screen buffer (only changed cells are sent)
+        if self.screen is None:
+            self.screen = Screen()
+        self.screen.resize()
+        self.screen.clear()
+        self.screen.draw(1, 1, header, wrap=True)
+        self.screen.flush()
+    
+    def stop(self):
+        """Leave the main loop (safe to call from another thread)"""
+        self.stop_event.set()
     
     def run(self):
         """Main loop: update every 1 second"""
-        sys.stdout.write("\033[?25l")  # Hide cursor
+        if self.screen is None:
+            self.screen = Screen()
+        out = self.screen.out
+        out.write("\033[?25l")  # Hide cursor
         
         try:
             while True:
                 self.render()
-                time.sleep(1)
+                if self.stop_event.wait(1):
+                    break
         except KeyboardInterrupt:
             pass
         finally:
-            sys.stdout.write("\033[?25h")  # Show cursor
+            out.write("\033[?25h")  # Show cursor
+            out.flush()
 
 if __name__ == "__main__":
     renderer = MetricsRenderer()
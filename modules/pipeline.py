@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+"""
+OOPUO Desktop Environment - Step Pipeline
+Runs deployment steps as a dependency graph on a bounded worker pool
+"""
+import time
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from journal import fingerprint
+
+# Step states
+PENDING, RUNNING, DONE, FAILED, SKIPPED = 'pending', 'running', 'done', 'failed', 'skipped'
+
+class Step:
+    """
+    One unit of work and the steps it waits for
+
+    Steps with a `fingerprint` (a callable returning the inputs that
+    decide the outcome) are journaled: on a later run with the same
+    inputs, `verify()` checks the result is still in place and the
+    step is skipped. `complete(result)` decides whether a result is
+    final enough to be kept (default: any result is).
+    """
+
+    def __init__(self, name, func, deps=(), weight=1, fingerprint=None, verify=None, complete=None):
+        self.name = name
+        self.func = func
+        self.deps = tuple(deps)
+        self.weight = weight        # share of the progress bar
+        self.fingerprint = fingerprint
+        self.verify = verify
+        self.complete = complete
+        self.reused = False         # skipped: the journal had a verified run
+        self.fraction = 0.0         # share done while running, if the step reports it
+        self.state = PENDING
+        self.result = None
+        self.error = None
+        self.trace = None           # formatted traceback if the step raised
+        self.started = None
+        self.finished = None
+
+    @property
+    def duration(self):
+        """Seconds the step ran (so far), or None if it never started"""
+        if self.started is None:
+            return None
+        return (self.finished or time.monotonic()) - self.started
+
+class Pipeline:
+    """
+    Dependency-ordered step runner
+
+    A step starts as soon as every step it depends on is done, so
+    independent branches overlap while at most `workers` steps run at
+    once. A step fails by raising; everything that depends on it
+    (directly or not) is skipped, while unrelated branches carry on.
+    Progress is the weight of finished steps over the graph's total.
+
+    With a journal, a fingerprinted step whose inputs and dependencies
+    are unchanged since its last recorded run is verified and skipped.
+    A dependency that ran again changes the key of everything after it.
+
+    Args:
+        steps: Step objects; dependencies must name steps in the list
+        workers: Steps running at the same time
+        log: Callable taking one message string
+        journal: DeployJournal to skip and record steps with (optional)
+    """
+
+    def __init__(self, steps, workers=3, log=None, journal=None):
+        self.steps = {step.name: step for step in steps}
+        self.workers = workers
+        self.log = log or (lambda msg: None)
+        self.journal = journal
+        self.lock = threading.Lock()
+        self.started = None
+        self.finished = None
+
+        for step in steps:
+            for dep in step.deps:
+                if dep not in self.steps:
+                    raise ValueError(f"step {step.name} depends on unknown step {dep}")
+        self._check_cycles()
+
+    def _check_cycles(self):
+        visiting, visited = set(), set()
+
+        def visit(name):
+            if name in visited:
+                return
+            if name in visiting:
+                raise ValueError(f"dependency cycle through step {name}")
+            visiting.add(name)
+            for dep in self.steps[name].deps:
+                visit(dep)
+            visiting.discard(name)
+            visited.add(name)
+
+        for name in self.steps:
+            visit(name)
+
+    def result(self, name):
+        """Return value of a finished step (None otherwise)"""
+        return self.steps[name].result
+
+    def report(self, name, fraction):
+        """Let a running step say how far along it is (0.0 to 1.0)"""
+        self.steps[name].fraction = min(1.0, max(0.0, fraction))
+
+    @property
+    def progress(self):
+        """
+        Percent of the graph's weight that has finished (skipped counts),
+        plus the reported share of running steps
+        """
+        total = sum(step.weight for step in self.steps.values())
+        with self.lock:
+            finished = sum(step.weight for step in self.steps.values() if step.state in (DONE, SKIPPED))
+            finished += sum(step.weight * step.fraction for step in self.steps.values() if step.state == RUNNING)
+        return int(100 * finished / total) if total else 100
+
+    @property
+    def ok(self):
+        return all(step.state == DONE for step in self.steps.values())
+
+    def _ready(self):
+        """Pending steps whose dependencies are all done"""
+        return [
+            step for step in self.steps.values()
+            if step.state == PENDING and all(self.steps[dep].state == DONE for dep in step.deps)
+        ]
+
+    def _skip_dependents(self):
+        """Skip pending steps that wait on a failed or skipped step"""
+        changed = True
+        while changed:
+            changed = False
+            for step in self.steps.values():
+                if step.state != PENDING:
+                    continue
+                blocked = [dep for dep in step.deps if self.steps[dep].state in (FAILED, SKIPPED)]
+                if blocked:
+                    step.state = SKIPPED
+                    self.log(f"Skipping {step.name} ({blocked[0]} did not complete)")
+                    changed = True
+
+    def _key(self, step):
+        """Journal key: the step's inputs plus when each dependency last completed"""
+        stamps = []
+        for dep in step.deps:
+            entry = self.journal.get(dep)
+            stamps.append(entry['completed'] if entry else None)
+        return fingerprint(step.fingerprint(), stamps)
+
+    def _reusable(self, step, key):
+        """True if the journal has a run with this key that still checks out"""
+        entry = self.journal.get(step.name)
+        if not entry or entry['key'] != key:
+            return False
+        if step.verify is None:
+            return True
+        try:
+            if step.verify():
+                return True
+        except Exception as e:
+            self.log(f"{step.name}: verification error: {e}")
+        self.log(f"{step.name}: recorded run no longer checks out, running again")
+        return False
+
+    def _run_step(self, step):
+        if self.journal is None or step.fingerprint is None:
+            return step.func()
+
+        key = self._key(step)
+        if self._reusable(step, key):
+            step.reused = True
+            return self.journal.get(step.name)['result']
+
+        self.journal.forget(step.name)
+        result = step.func()
+        if step.complete is None or step.complete(result):
+            self.journal.record(step.name, key, result, time.monotonic() - step.started)
+        return result
+
+    def _execute(self, step):
+        step.started = time.monotonic()
+        try:
+            return self._run_step(step)
+        except Exception:
+            step.trace = traceback.format_exc().rstrip()
+            raise
+        finally:
+            step.finished = time.monotonic()
+
+    def run(self):
+        """
+        Run every step; returns True if all of them completed
+        """
+        self.started = time.monotonic()
+        running = {}
+
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="step") as pool:
+            while True:
+                with self.lock:
+                    for step in self._ready():
+                        step.state = RUNNING
+                        running[pool.submit(self._execute, step)] = step
+                if not running:
+                    break
+
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    step = running.pop(future)
+                    with self.lock:
+                        try:
+                            step.result = future.result()
+                            step.state = DONE
+                            how = "unchanged, verified in " if step.reused else ""
+                            self.log(f"✓ {step.name} ({how}{step.duration:.1f}s)")
+                        except Exception as e:
+                            step.error = e
+                            step.state = FAILED
+                            self.log(f"✗ {step.name} failed after {step.duration:.1f}s: {e}")
+                            self.log(step.trace)
+                        self._skip_dependents()
+
+        self.finished = time.monotonic()
+        return self.ok
+
+    def timings(self):
+        """(name, state, start offset, duration) per step, in start order"""
+        rows = []
+        for step in self.steps.values():
+            offset = step.started - self.started if step.started is not None else None
+            state = 'reused' if step.reused else step.state
+            rows.append((step.name, state, offset, step.duration))
+        return sorted(rows, key=lambda row: float('inf') if row[2] is None else row[2])
+
+    def summary(self):
+        """One line: wall-clock time against the sum of step times"""
+        wall = (self.finished or time.monotonic()) - self.started
+        serial = sum(step.duration or 0 for step in self.steps.values())
+        reused = sum(step.reused for step in self.steps.values())
+        skipped = f", {reused} unchanged" if reused else ""
+        return f"{len(self.steps)} steps in {wall:.1f}s (sequential: {serial:.1f}s{skipped})"
+
+if __name__ == "__main__":
+    # Demo graph shaped like a deployment, with sleeps standing in for work
+    def work(seconds):
+        return lambda: time.sleep(seconds)
+
+    pipeline = Pipeline([
+        Step('network', work(0.1), weight=10),
+        Step('assets', work(0.6), weight=20),
+        Step('guard', work(0.8), deps=['network'], weight=20),
+        Step('brain', work(0.5), deps=['network', 'assets'], weight=20),
+        Step('gpu_host', work(0.4), weight=5),
+        Step('stack', work(0.7), deps=['brain'], weight=20),
+        Step('gpu_vm', work(0.2), deps=['brain', 'gpu_host', 'stack'], weight=5)
+    ], log=print)
+    pipeline.run()
+
+    for name, state, offset, duration in pipeline.timings():
+        print(f"  {name:<10} {state:<8} +{offset:.2f}s  {duration:.2f}s")
+    print(pipeline.summary())
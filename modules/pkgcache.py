@@ -0,0 +1,516 @@
+#!/usr/bin/env python3
+"""
+OOPUO Desktop Environment - Package Cache
+Caching proxy on the host for the guests' apt packages, Python wheels and downloads
+"""
+import os
+import re
+import json
+import html
+import time
+import hashlib
+import threading
+import ipaddress
+import http.client
+import urllib.error
+import urllib.request
+from datetime import datetime
+from contextlib import contextmanager
+from urllib.parse import urljoin, urlsplit
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from config import config, LOG_FILE
+
+# Never change once published: apt pool and by-hash files, PyPI's
+# content-addressed /packages/ paths, wheels. Anything else (apt indexes,
+# simple index pages, "latest" downloads) is revalidated after max_age.
+IMMUTABLE_RE = re.compile(r'(/pool/|/by-hash/|files\.pythonhosted\.org/packages/|\.whl$|\.whl\.metadata$)')
+
+# Bytes per read from upstream
+CHUNK = 1024 * 1024
+
+HREF_RE = re.compile(r'(href=)"([^"]*)"')
+
+# Hosts the cache fetches from (".example.org" also matches its subdomains):
+# the Ubuntu mirrors, PyPI, the PyTorch index and the other downloads the
+# Guard setup and the stack payload make
+UPSTREAMS = [
+    'archive.ubuntu.com', '.archive.ubuntu.com', 'security.ubuntu.com', 'ports.ubuntu.com',
+    'pypi.org', 'files.pythonhosted.org', 'download.pytorch.org',
+    'apt.releases.hashicorp.com', 'repo.anaconda.com',
+    'github.com', 'objects.githubusercontent.com'
+]
+
+def upstream_url(target):
+    """
+    Map a request target to (upstream URL, kind), or None
+
+    - `http://host/path` (proxy request, e.g. apt): fetched as is
+    - `/files/<host>/<path>`: https://<host>/<path>
+    - `/index/<host>/<path>`: the PEP 503 page https://<host>/<path>,
+      with its file links rewritten to /files/
+    - `/simple/<path>`: same as /index/pypi.org/simple/<path>
+    """
+    if target.startswith('http://'):
+        return target, 'file'
+    for prefix, kind in (('/files/', 'file'), ('/index/', 'index')):
+        if target.startswith(prefix) and '/' in target[len(prefix):]:
+            return 'https://' + target[len(prefix):], kind
+    if target.startswith('/simple/'):
+        return 'https://pypi.org' + target, 'index'
+    return None
+
+def allowed_upstream(url, upstreams):
+    """True if `url` is on a listed host, on the scheme's default port"""
+    parts = urlsplit(url)
+    try:
+        port = parts.port
+    except ValueError:
+        return False
+    if parts.scheme not in ('http', 'https') or port not in (None, 80, 443):
+        return False
+    host = (parts.hostname or '').lower()
+    return any(host == entry or (entry.startswith('.') and host.endswith(entry)) for entry in upstreams)
+
+class RedirectGuard(urllib.request.HTTPRedirectHandler):
+    """Follow redirects only to allowed upstreams"""
+
+    def __init__(self, upstreams):
+        super().__init__()
+        self.upstreams = upstreams
+
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        if not allowed_upstream(newurl, self.upstreams):
+            raise urllib.error.HTTPError(newurl, 403, "Redirect to a host not in pkgcache.upstreams", headers, fp)
+        return super().redirect_request(req, fp, code, msg, headers, newurl)
+
+def rewrite_index(body, page_url):
+    """Point a simple index page's https links at this cache's /files/"""
+    def local(match):
+        link = urlsplit(urljoin(page_url, html.unescape(match.group(2))))
+        if link.scheme != 'https':
+            return match.group(0)
+        path = f"/files/{link.netloc}{link.path}"
+        if link.query:
+            path += f"?{link.query}"
+        if link.fragment:
+            path += f"#{link.fragment}"     # sha256=..., checked by pip
+        return f'{match.group(1)}"{html.escape(path)}"'
+
+    return HREF_RE.sub(local, body)
+
+class PackageCache:
+    """
+    Pull-through cache for deployments
+
+    Serves the guests on the LAN what they would otherwise fetch from
+    the internet on every deploy. It is filled on first use:
+
+    - apt: set as the HTTP proxy (Acquire::http::Proxy); HTTPS repos
+      go through /files/<host>/...
+    - pip: /simple/ (PyPI) and /index/<host>/<path>/ (extra indexes) are
+      PEP 503 indexes whose links lead to the cached files
+    - anything else: /files/<host>/<path> for https://<host>/<path>
+
+    Immutable files are kept for good; indexes are revalidated
+    (If-None-Match / If-Modified-Since) after `max_age` seconds, and a
+    cached copy is served when the upstream cannot be reached, so a
+    deploy whose packages were all fetched before works offline. Past
+    `max_gb`, the least recently used objects are evicted.
+
+    It is not an open proxy: it listens on the host's bridge address,
+    answers only the guests (and the host itself), and fetches only
+    from `pkgcache.upstreams`; anything else gets a 403.
+    """
+
+    def __init__(self, cache_dir=None, bind=None, port=None, max_age=None, timeout=30):
+        self.cache_dir = cache_dir or config.get('pkgcache.dir', '/var/cache/oopuo/pkgcache')
+        bind = bind or config.get('pkgcache.bind')
+        if bind in (None, '0.0.0.0'):
+            # 0.0.0.0 was the old default, saved into existing config files
+            bind = config.get('network.host_ip') or '127.0.0.1'
+        self.bind = bind
+        self.port = port or config.get('pkgcache.port', 3142)
+        self.max_age = config.get('pkgcache.max_age', 3600) if max_age is None else max_age
+        self.max_bytes = int(config.get('pkgcache.max_gb', 20) * 1e9)
+        self.upstreams = config.get('pkgcache.upstreams') or UPSTREAMS
+        self.opener = urllib.request.build_opener(RedirectGuard(self.upstreams))
+        self.timeout = timeout
+        self.server = None
+        self.lock = threading.Lock()
+        self.url_locks = {}     # url -> [lock, users]; dropped when unused
+        self.index = {}         # url -> [size, last used] of every cached object
+        self.total = 0
+        self.stats = {'hits': 0, 'misses': 0, 'stale': 0, 'evicted': 0, 'bytes_served': 0, 'bytes_fetched': 0}
+
+    def log(self, msg):
+        """Write to log file"""
+        ts = datetime.now().strftime('%H:%M:%S')
+        with open(LOG_FILE, 'a') as f:
+            f.write(f"[PKGCACHE] [{ts}] {msg}\n")
+
+    def count(self, name, amount=1):
+        with self.lock:
+            self.stats[name] += amount
+
+    # ----- storage -----
+
+    def object_path(self, url):
+        digest = hashlib.sha256(url.encode()).hexdigest()
+        return os.path.join(self.cache_dir, 'objects', digest[:2], digest)
+
+    def load_meta(self, url):
+        path = self.object_path(url)
+        try:
+            with open(f"{path}.json") as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return meta if os.path.exists(path) else None
+
+    def save_meta(self, url, meta):
+        path = f"{self.object_path(url)}.json"
+        with open(f"{path}.tmp", 'w') as f:
+            json.dump(meta, f)
+        os.replace(f"{path}.tmp", path)
+
+    def fresh(self, url, meta):
+        return bool(IMMUTABLE_RE.search(url)) or time.time() - meta['fetched'] < self.max_age
+
+    @contextmanager
+    def url_lock(self, url):
+        """One fetch per URL at a time; others wait and get the cached copy"""
+        with self.lock:
+            entry = self.url_locks.setdefault(url, [threading.Lock(), 0])
+            entry[1] += 1
+        try:
+            with entry[0]:
+                yield
+        finally:
+            with self.lock:
+                entry[1] -= 1
+                if not entry[1]:
+                    del self.url_locks[url]
+
+    def load_index(self):
+        """Size and last use (object mtime) of everything in the cache"""
+        index = {}
+        for root, _, files in os.walk(os.path.join(self.cache_dir, 'objects')):
+            for name in files:
+                if not name.endswith('.json'):
+                    continue
+                try:
+                    with open(os.path.join(root, name)) as f:
+                        url = json.load(f)['url']
+                    stat = os.stat(os.path.join(root, name[:-len('.json')]))
+                except (OSError, ValueError, KeyError):
+                    continue
+                index[url] = [stat.st_size, stat.st_mtime]
+        with self.lock:
+            self.index = index
+            self.total = sum(size for size, _ in index.values())
+
+    def touch(self, url, size=None):
+        """Record a use of `url` (and its new size after a fetch)"""
+        now = time.time()
+        try:
+            os.utime(self.object_path(url), (now, now))
+        except OSError:
+            pass
+        with self.lock:
+            old = self.index.get(url, [0, 0])[0]
+            size = old if size is None else size
+            self.index[url] = [size, now]
+            self.total += size - old
+
+    def evict(self):
+        """Remove the least recently used objects until the cache fits max_bytes"""
+        with self.lock:
+            if self.total <= self.max_bytes:
+                return
+            # Objects being fetched or opened are left alone
+            candidates = sorted((used, url) for url, (_, used) in self.index.items() if url not in self.url_locks)
+            removed = []
+            for _, url in candidates:
+                if self.total <= self.max_bytes:
+                    break
+                self.total -= self.index.pop(url)[0]
+                removed.append(url)
+            self.stats['evicted'] += len(removed)
+        for url in removed:
+            path = self.object_path(url)
+            for name in (f"{path}.json", path):
+                try:
+                    os.remove(name)
+                except OSError:
+                    pass
+        if removed:
+            self.log(f"Evicted {len(removed)} objects, cache at {self.total / 1e9:.1f} GB")
+
+    # ----- upstream -----
+
+    def open_upstream(self, url, meta, kind):
+        """
+        Start fetching `url`; returns the response, or None if the cached
+        copy is still current (304)
+        """
+        headers = {'User-Agent': 'oopuo-pkgcache'}
+        if kind == 'index':
+            headers['Accept'] = 'text/html'     # PEP 503 HTML, not the JSON API
+        if meta and meta.get('etag'):
+            headers['If-None-Match'] = meta['etag']
+        if meta and meta.get('last_modified'):
+            headers['If-Modified-Since'] = meta['last_modified']
+        try:
+            return self.opener.open(urllib.request.Request(url, headers=headers), timeout=self.timeout)
+        except urllib.error.HTTPError as e:
+            if e.code == 304 and meta:
+                return None
+            raise
+
+    def store(self, url, response, kind, client=None):
+        """
+        Save an upstream response, copying it to `client` (a writable
+        handler) as it arrives if its size is known; returns the meta
+        """
+        path = self.object_path(url)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{threading.get_ident()}.part"
+        meta = {
+            'url': url,
+            'etag': response.headers.get('ETag'),
+            'last_modified': response.headers.get('Last-Modified'),
+            'content_type': response.headers.get('Content-Type', 'application/octet-stream'),
+            'fetched': time.time()
+        }
+
+        try:
+            if kind == 'index':
+                body = response.read().decode('utf-8', errors='replace')
+                data = rewrite_index(body, response.geturl()).encode()
+                with open(tmp, 'wb') as f:
+                    f.write(data)
+                meta['size'] = len(data)
+                self.count('bytes_fetched', len(data))
+            else:
+                length = response.headers.get('Content-Length')
+                if client and length is not None:
+                    client.start(200, meta, int(length))
+                size = 0
+                with open(tmp, 'wb') as f:
+                    while True:
+                        chunk = response.read(CHUNK)
+                        if not chunk:
+                            break
+                        f.write(chunk)
+                        size += len(chunk)
+                        if client and length is not None:
+                            client.send_chunk(chunk)
+                if length is not None and size != int(length):
+                    raise http.client.IncompleteRead(b'', int(length) - size)
+                meta['size'] = size
+                self.count('bytes_fetched', size)
+            os.replace(tmp, path)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+        self.save_meta(url, meta)
+        return meta
+
+    # ----- serving -----
+
+    def serve(self, client, url, kind):
+        """Answer one request from the cache, filling it first if needed"""
+        with self.url_lock(url):
+            meta = self.load_meta(url)
+            if meta and self.fresh(url, meta):
+                self.count('hits')
+            else:
+                try:
+                    response = self.open_upstream(url, meta, kind)
+                    if response is None:
+                        meta['fetched'] = time.time()
+                        self.save_meta(url, meta)
+                        self.count('hits')
+                    else:
+                        with response:
+                            self.count('misses')
+                            meta = self.store(url, response, kind, client)
+                        self.touch(url, meta['size'])
+                        if client.started:
+                            self.evict()
+                            return      # streamed while it was stored
+                except urllib.error.HTTPError as e:
+                    # A mirror answering 5xx is as good as down, and an index
+                    # it refuses is one we still have: the last copy will do
+                    if not meta or (e.code < 500 and kind != 'index'):
+                        client.fail(e.code, e.reason)
+                        return
+                    self.log(f"{url}: upstream answered {e.code}, serving cached copy")
+                    self.count('stale')
+                except (urllib.error.URLError, OSError, http.client.HTTPException) as e:
+                    if client.started:
+                        client.abort()
+                        self.log(f"{url}: upstream failed mid-transfer: {e}")
+                        return
+                    if not meta:
+                        self.log(f"{url}: upstream unreachable, not cached: {e}")
+                        client.fail(502, "Upstream unreachable")
+                        return
+                    # Offline (or the mirror is down): the last copy will do
+                    self.log(f"{url}: upstream unreachable, serving cached copy: {e}")
+                    self.count('stale')
+            self.touch(url, meta['size'])
+            # Opened under the lock: eviction may unlink it afterwards, but
+            # not before it is open
+            f = open(self.object_path(url), 'rb')
+
+        with f:
+            self.evict()
+            client.send_file(f, meta)
+
+    def allowed_client(self, address):
+        """Guests (by their configured addresses) and the host itself"""
+        try:
+            if ipaddress.ip_address(address).is_loopback:
+                return True
+        except ValueError:
+            return False
+        guests = [config.get(f'network.{name}') for name in ('host_ip', 'brain_ip', 'guard_ip', 'build_ip')]
+        return address in guests + list(config.get('pkgcache.clients', []))
+
+    def _handler(self):
+        cache = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                self.started = False
+                self.gone = False       # client disconnected while the cache filled
+                if not cache.allowed_client(self.client_address[0]):
+                    self.fail(403, "Forbidden")
+                    return
+                if self.path == '/_ping':
+                    self.send_response(200)
+                    self.send_header('Content-Length', '2')
+                    self.end_headers()
+                    self.wfile.write(b'ok')
+                    return
+                target = upstream_url(self.path)
+                if target is None:
+                    self.fail(404, "Not Found")
+                    return
+                if not allowed_upstream(target[0], cache.upstreams):
+                    self.fail(403, "Upstream not in pkgcache.upstreams")
+                    return
+                try:
+                    cache.serve(self, *target)
+                except (BrokenPipeError, ConnectionResetError):
+                    self.close_connection = True
+
+            def fail(self, code, reason):
+                self.send_response(code, reason)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+
+            def start(self, status, meta, length):
+                self.started = True
+                self.send_response(status)
+                self.send_header('Content-Type', meta['content_type'])
+                self.send_header('Content-Length', str(length))
+                if meta.get('etag'):
+                    self.send_header('ETag', meta['etag'])
+                if meta.get('last_modified'):
+                    self.send_header('Last-Modified', meta['last_modified'])
+                self.end_headers()
+
+            def send_chunk(self, chunk):
+                # A client that went away does not stop the cache filling
+                if self.started and not self.gone:
+                    try:
+                        self.wfile.write(chunk)
+                        cache.count('bytes_served', len(chunk))
+                    except (BrokenPipeError, ConnectionResetError):
+                        self.gone = True
+                        self.close_connection = True
+
+            def abort(self):
+                self.close_connection = True
+
+            def send_file(self, f, meta):
+                offset = 0
+                match = re.fullmatch(r'bytes=(\d+)-', self.headers.get('Range', ''))
+                if match and int(match.group(1)) < meta['size']:
+                    offset = int(match.group(1))    # apt resuming a .partial file
+                self.send_response(206 if offset else 200)
+                self.send_header('Content-Type', meta['content_type'])
+                self.send_header('Content-Length', str(meta['size'] - offset))
+                if offset:
+                    self.send_header('Content-Range', f"bytes {offset}-{meta['size'] - 1}/{meta['size']}")
+                if meta.get('etag'):
+                    self.send_header('ETag', meta['etag'])
+                if meta.get('last_modified'):
+                    self.send_header('Last-Modified', meta['last_modified'])
+                self.end_headers()
+                f.seek(offset)
+                while True:
+                    chunk = f.read(CHUNK)
+                    if not chunk:
+                        break
+                    self.wfile.write(chunk)
+                    cache.count('bytes_served', len(chunk))
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        """Serve in a background thread"""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self.load_index()
+        self.server = ThreadingHTTPServer((self.bind, self.port), self._handler())
+        self.server.daemon_threads = True
+        thread = threading.Thread(target=self.server.serve_forever, name="pkgcache", daemon=True)
+        thread.start()
+        self.log(f"Serving package cache on {self.bind}:{self.server.server_address[1]} from {self.cache_dir}")
+        return self
+
+    def serve_forever(self):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self.load_index()
+        self.server = ThreadingHTTPServer((self.bind, self.port), self._handler())
+        self.server.daemon_threads = True
+        self.log(f"Serving package cache on {self.bind}:{self.server.server_address[1]} from {self.cache_dir}")
+        self.server.serve_forever()
+
+    def summary(self):
+        s = self.stats
+        return (f"{s['hits']} hits, {s['misses']} misses, {s['stale']} stale, {s['evicted']} evicted; "
+                f"{s['bytes_served'] / 1e6:.0f} MB served, {s['bytes_fetched'] / 1e6:.0f} MB fetched; "
+                f"{self.total / 1e9:.1f} GB cached")
+
+    def stop(self):
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+            self.log(f"Package cache stopped ({self.summary()})")
+
+def cache_url():
+    """Address guests reach the cache at, or None if it is disabled or not running"""
+    host_ip = config.get('network.host_ip')
+    if not config.get('pkgcache.enabled', True) or not host_ip:
+        return None
+    url = f"http://{host_ip}:{config.get('pkgcache.port', 3142)}"
+    try:
+        with urllib.request.urlopen(f"{url}/_ping", timeout=3):
+            return url
+    except (OSError, http.client.HTTPException):
+        return None
+
+if __name__ == "__main__":
+    cache = PackageCache()
+    try:
+        cache.serve_forever()
+    except KeyboardInterrupt:
+        pass
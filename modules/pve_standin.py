@@ -0,0 +1,367 @@
+#!/usr/bin/env python3
+"""
+OOPUO Desktop Environment - Proxmox API Stand-In
+Local fake of the PVE REST endpoints pveapi uses, for testing without a Proxmox host
+"""
+import re
+import json
+import time
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qsl, unquote
+
+TOKEN = "root@pam!standin=00000000-0000-0000-0000-000000000000"
+USER = "root@pam"
+PASSWORD = "standin"
+
+# How long every asynchronous task pretends to run
+TASK_SECONDS = 0.2
+
+class StandinError(Exception):
+    """Becomes an HTTP error response shaped like PVE's"""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+class StandinState:
+    """Guests, snapshots and tasks of the fake node"""
+
+    def __init__(self, node):
+        self.node = node
+        self.guests = {}        # vmid -> {'type', 'name', 'status', 'config', 'snapshots'}
+        self.tasks = {}         # upid -> {'end', 'action', 'exitstatus', 'done'}
+        self.templates = set()
+        self.task_count = 0
+        self.requests = 0
+        self.calls = []         # (method, path, params) of every request handled
+        self.connections = 0
+        self.lock = threading.Lock()
+
+    def guest(self, vmid, kind):
+        guest = self.guests.get(int(vmid))
+        if guest is None or guest['type'] != kind:
+            raise StandinError(500, f"Configuration file 'nodes/{self.node}/{kind}/{vmid}.conf' does not exist")
+        return guest
+
+    def task(self, kind, vmid, action=None):
+        """Start a fake task; `action` runs (and may fail) when it ends"""
+        self.task_count += 1
+        upid = f"UPID:{self.node}:{self.task_count:08X}:00000000:{int(time.time()):08X}:{kind}:{vmid}:{USER}:"
+        self.tasks[upid] = {'end': time.monotonic() + TASK_SECONDS, 'action': action, 'exitstatus': 'OK', 'done': False}
+        return upid
+
+    def task_status(self, upid):
+        task = self.tasks.get(upid)
+        if task is None:
+            raise StandinError(500, f"no such task '{upid}'")
+        if not task['done'] and time.monotonic() >= task['end']:
+            task['done'] = True
+            if task['action']:
+                try:
+                    task['action']()
+                except StandinError as e:
+                    task['exitstatus'] = str(e)
+        if not task['done']:
+            return {'status': 'running', 'upid': upid}
+        return {'status': 'stopped', 'exitstatus': task['exitstatus'], 'upid': upid}
+
+# ----- routes: (method, path regex, handler(state, params, *groups)) -----
+
+def _ticket(state, params):
+    if params.get('username') != USER or params.get('password') != PASSWORD:
+        raise StandinError(401, "authentication failure")
+    return {'ticket': f"PVE:{USER}:STANDIN", 'CSRFPreventionToken': "STANDIN-CSRF", 'username': USER}
+
+def _resources(state, params):
+    resources = []
+    for vmid, guest in sorted(state.guests.items()):
+        resources.append({
+            'id': f"{guest['type']}/{vmid}", 'vmid': vmid, 'type': guest['type'],
+            'name': guest['name'], 'node': state.node, 'status': guest['status'],
+            'uptime': int(time.time() - guest['started']) if guest['status'] == 'running' else 0,
+            'cpu': 0.05 if guest['status'] == 'running' else 0, 'maxcpu': int(guest['config'].get('cores', 1)),
+            'mem': 0, 'maxmem': int(guest['config'].get('memory', 512)) * 1048576,
+            'disk': 0, 'maxdisk': 0, 'template': guest.get('template', 0)
+        })
+    return resources
+
+def _create(kind):
+    def create(state, params, node):
+        vmid = int(params.pop('vmid'))
+        if vmid in state.guests:
+            raise StandinError(500, f"{kind} {vmid} already exists")
+        name = params.get('name') or params.get('hostname') or f"{kind}{vmid}"
+
+        def finish():
+            state.guests[vmid] = {
+                'type': kind, 'name': name, 'status': 'stopped', 'started': 0,
+                'config': dict(params), 'snapshots': []
+            }
+            if params.get('start') in ('1', 1):
+                state.guests[vmid]['status'] = 'running'
+                state.guests[vmid]['started'] = time.time()
+        return state.task(f"{kind}create", vmid, finish)
+    return create
+
+def _set_config(state, params, node, vmid):
+    guest = state.guest(vmid, 'qemu')
+    guest['config'].update(params)
+    guest['name'] = guest['config'].get('name', guest['name'])
+    return None
+
+def _get_config(state, params, node, vmid):
+    return dict(state.guest(vmid, 'qemu')['config'])
+
+def _power(kind, action):
+    def power(state, params, node, vmid):
+        guest = state.guest(vmid, kind)
+
+        def finish():
+            guest['status'] = 'running' if action == 'start' else 'stopped'
+            guest['started'] = time.time()
+        return state.task(f"{'qm' if kind == 'qemu' else 'vz'}{action}", vmid, finish)
+    return power
+
+def _agent_ping(state, params, node, vmid):
+    if state.guest(vmid, 'qemu')['status'] != 'running':
+        raise StandinError(500, f"VM {vmid} is not running")
+    return {'result': {}}
+
+def _template(state, params, node, vmid):
+    guest = state.guest(vmid, 'qemu')
+    if guest['status'] == 'running':
+        raise StandinError(500, f"VM {vmid} is running")
+    guest['template'] = 1
+    return state.task('qmtemplate', vmid, lambda: None)
+
+def _clone(state, params, node, vmid):
+    source = state.guest(vmid, 'qemu')
+    newid = int(params['newid'])
+    if newid in state.guests:
+        raise StandinError(500, f"VM {newid} already exists")
+
+    def finish():
+        config = dict(source['config'], name=params.get('name', f"Copy-of-VM-{vmid}"))
+        state.guests[newid] = {
+            'type': 'qemu', 'name': config['name'], 'status': 'stopped', 'started': 0,
+            'config': config, 'snapshots': [], 'template': 0
+        }
+    return state.task('qmclone', vmid, finish)
+
+def _destroy(kind):
+    def destroy(state, params, node, vmid):
+        guest = state.guest(vmid, kind)
+        if guest['status'] == 'running':
+            raise StandinError(500, f"{kind} {vmid} is running - destroy failed")
+        return state.task(f"{kind}destroy", vmid, lambda: state.guests.pop(int(vmid), None))
+    return destroy
+
+def _resize(state, params, node, vmid):
+    state.guest(vmid, 'qemu')['config'][f"{params['disk']}_size"] = params['size']
+    return None
+
+def _snapshots(state, params, node, vmid):
+    guest = state.guest(vmid, 'qemu')
+    return guest['snapshots'] + [{'name': 'current', 'description': 'You are here!'}]
+
+def _snapshot(state, params, node, vmid):
+    guest = state.guest(vmid, 'qemu')
+    entry = {'name': params['snapname'], 'description': params.get('description', ''), 'snaptime': int(time.time())}
+    return state.task('qmsnapshot', vmid, lambda: guest['snapshots'].append(entry))
+
+def _rollback(state, params, node, vmid, name):
+    guest = state.guest(vmid, 'qemu')
+
+    def finish():
+        if name not in [s['name'] for s in guest['snapshots']]:
+            raise StandinError(500, f"snapshot '{name}' does not exist")
+        guest['status'] = 'stopped'
+    return state.task('qmrollback', vmid, finish)
+
+def _aplinfo(state, params, node):
+    return state.task('download', 0, lambda: state.templates.add(params['template']))
+
+def _task_status(state, params, node, upid):
+    return state.task_status(upid)
+
+def _task_log(state, params, node, upid):
+    status = state.task_status(upid)
+    return [{'n': 1, 't': status.get('exitstatus', 'running')}]
+
+ROUTES = [
+    ('POST', r'/access/ticket', _ticket),
+    ('GET', r'/cluster/resources', _resources),
+    ('POST', r'/nodes/([^/]+)/qemu', _create('qemu')),
+    ('GET', r'/nodes/([^/]+)/qemu/(\d+)/config', _get_config),
+    ('PUT', r'/nodes/([^/]+)/qemu/(\d+)/config', _set_config),
+    ('POST', r'/nodes/([^/]+)/qemu/(\d+)/status/start', _power('qemu', 'start')),
+    ('POST', r'/nodes/([^/]+)/qemu/(\d+)/status/stop', _power('qemu', 'stop')),
+    ('POST', r'/nodes/([^/]+)/qemu/(\d+)/status/shutdown', _power('qemu', 'shutdown')),
+    ('POST', r'/nodes/([^/]+)/qemu/(\d+)/template', _template),
+    ('POST', r'/nodes/([^/]+)/qemu/(\d+)/agent/ping', _agent_ping),
+    ('POST', r'/nodes/([^/]+)/qemu/(\d+)/clone', _clone),
+    ('DELETE', r'/nodes/([^/]+)/qemu/(\d+)', _destroy('qemu')),
+    ('PUT', r'/nodes/([^/]+)/qemu/(\d+)/resize', _resize),
+    ('GET', r'/nodes/([^/]+)/qemu/(\d+)/snapshot', _snapshots),
+    ('POST', r'/nodes/([^/]+)/qemu/(\d+)/snapshot', _snapshot),
+    ('POST', r'/nodes/([^/]+)/qemu/(\d+)/snapshot/([^/]+)/rollback', _rollback),
+    ('POST', r'/nodes/([^/]+)/lxc', _create('lxc')),
+    ('POST', r'/nodes/([^/]+)/lxc/(\d+)/status/start', _power('lxc', 'start')),
+    ('DELETE', r'/nodes/([^/]+)/lxc/(\d+)', _destroy('lxc')),
+    ('POST', r'/nodes/([^/]+)/aplinfo', _aplinfo),
+    ('GET', r'/nodes/([^/]+)/tasks/([^/]+)/status', _task_status),
+    ('GET', r'/nodes/([^/]+)/tasks/([^/]+)/log', _task_log),
+]
+
+def find_route(method, path):
+    """(handler, path arguments) for an API path below /api2/json, or (None, None)"""
+    for route_method, pattern, handler in ROUTES:
+        match = re.fullmatch(pattern, path)
+        if route_method == method and match:
+            return handler, [unquote(group) for group in match.groups()]
+    return None, None
+
+class StandinHandler(BaseHTTPRequestHandler):
+    """HTTP/1.1 keep-alive handler dispatching to ROUTES"""
+
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True  # headers and body go out in separate writes
+
+    def setup(self):
+        super().setup()
+        with self.server.state.lock:
+            self.server.state.connections += 1
+
+    def log_message(self, *args):
+        pass
+
+    def _authorized(self, method):
+        if self.headers.get('Authorization') == f"PVEAPIToken={TOKEN}":
+            return True
+        if f"PVEAuthCookie=PVE:{USER}:STANDIN" in (self.headers.get('Cookie') or ""):
+            return method == 'GET' or self.headers.get('CSRFPreventionToken') == "STANDIN-CSRF"
+        return False
+
+    def _respond(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _handle(self, method):
+        url = urlsplit(self.path)
+        params = dict(parse_qsl(url.query))
+        length = int(self.headers.get('Content-Length') or 0)
+        if length:
+            params.update(parse_qsl(self.rfile.read(length).decode()))
+
+        path = url.path
+        if not path.startswith('/api2/json/'):
+            self._respond(404, {'data': None})
+            return
+        path = path[len('/api2/json'):]
+
+        state = self.server.state
+        handler, args = find_route(method, path)
+        if handler is None:
+            self._respond(501, {'data': None, 'errors': {'path': f"no stand-in route for {method} {path}"}})
+            return
+        if handler is not _ticket and not self._authorized(method):
+            self._respond(401, {'data': None})
+            return
+        try:
+            with state.lock:
+                state.requests += 1
+                state.calls.append((method, path, dict(params)))
+                data = handler(state, params, *args)
+        except StandinError as e:
+            self._respond(e.status, {'data': None, 'errors': {'message': str(e)}})
+            return
+        except KeyError as e:
+            self._respond(400, {'data': None, 'errors': {str(e.args[0]): "property is missing"}})
+            return
+        self._respond(200, {'data': data})
+
+    def do_GET(self):
+        self._handle('GET')
+
+    def do_POST(self):
+        self._handle('POST')
+
+    def do_PUT(self):
+        self._handle('PUT')
+
+    def do_DELETE(self):
+        self._handle('DELETE')
+
+class StandinServer:
+    """
+    Fake PVE API on 127.0.0.1 (plain HTTP, random port by default)
+
+    Accepts the TOKEN API token or a ticket for USER/PASSWORD. Creating,
+    starting, stopping, destroying, snapshots and rollbacks return a
+    UPID and take TASK_SECONDS, so task polling is exercised as well.
+    """
+
+    def __init__(self, port=0, node='standin'):
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', port), StandinHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.state = StandinState(node)
+        self.state = self.httpd.state
+        self.port = self.httpd.server_address[1]
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, name="pve-standin", daemon=True)
+        self.thread.start()
+        return self
+
+    def client(self, token=True):
+        """A PVEClient pointed at this server (token or ticket auth)"""
+        from pveapi import PVEClient
+        return PVEClient(
+            port=self.port,
+            token=TOKEN if token else None,
+            password=None if token else PASSWORD,
+            node=self.state.node,
+            tls=False
+        )
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+if __name__ == "__main__":
+    from pveapi import APIBackend
+
+    server = StandinServer().start()
+    client = server.client(token=False)
+    pve = APIBackend(client)
+
+    steps = [
+        ("create VM", lambda: pve.vm_create(900, name='standin-vm', memory=2048, cores=2)),
+        ("set options", lambda: pve.vm_set(900, scsihw='virtio-scsi-pci', agent='enabled=1')),
+        ("resize disk", lambda: pve.vm_resize(900, 'scsi0', '+8G')),
+        ("start", lambda: pve.vm_start(900)),
+        ("snapshot", lambda: pve.snapshot(900, 'standin-snap', "stand-in test")),
+        ("list snapshots", lambda: pve.snapshots(900)),
+        ("rollback", lambda: pve.rollback(900, 'standin-snap')),
+        ("bad rollback", lambda: pve.rollback(900, 'missing')),
+        ("resources", lambda: len(pve.resources())),
+        ("destroy", lambda: pve.vm_destroy(900)),
+        ("create CT", lambda: pve.ct_create(901, 'local:vztmpl/standin.tar.zst', hostname='standin-ct')),
+        ("destroy CT", lambda: pve.ct_destroy(901)),
+    ]
+    started = time.monotonic()
+    for label, step in steps:
+        t = time.monotonic()
+        result = step()
+        print(f"  {label:<15} {result!s:<44.44} {(time.monotonic() - t) * 1000:6.1f} ms")
+    total = time.monotonic() - started
+
+    print(f"{len(steps)} operations in {total:.2f}s over {server.state.connections} connection(s), "
+          f"{server.state.requests} requests")
+    server.stop()
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+OOPUO Desktop Environment - Proxmox Guest Status
+State, uptime and usage of every guest from one /cluster/resources call
+"""
+import os
+import json
+import time
+import threading
+from config import config
+from pveapi import proxmox
+
+# Shared by every pane and collectord: one resources call per TTL window in total
+CACHE_PATH = "/tmp/oopuo_pve_resources.json"
+
+# Guest states (same convention as the shared snapshot)
+UNKNOWN, STOPPED, RUNNING = -1, 0, 1
+
+def fetch_resources():
+    """
+    Raw guest list from the cluster resource index
+
+    Returns:
+        List of dicts as returned by Proxmox, or None if the call failed
+    """
+    return proxmox().resources()
+
+def normalize(entry):
+    """One /cluster/resources entry as a guest dict"""
+    status = entry.get('status', 'unknown')
+    if status == 'running':
+        state = RUNNING
+    elif status == 'unknown':
+        state = UNKNOWN     # node offline or not answering
+    else:
+        state = STOPPED
+    return {
+        'vmid': int(entry.get('vmid', 0)),
+        'type': entry.get('type', ''),              # 'qemu' or 'lxc'
+        'name': entry.get('name', ''),
+        'node': entry.get('node', ''),
+        'status': status,
+        'state': state,
+        'uptime': entry.get('uptime', 0),
+        'cpu': entry.get('cpu', 0.0) * entry.get('maxcpu', 0),    # cores in use
+        'maxcpu': entry.get('maxcpu', 0),
+        'mem': entry.get('mem', 0),
+        'maxmem': entry.get('maxmem', 0),
+        'disk': entry.get('disk', 0),
+        'maxdisk': entry.get('maxdisk', 0),
+        'template': bool(entry.get('template', 0)),
+        'lock': entry.get('lock', '')
+    }
+
+class PVEStatus:
+    """
+    Cached status of every guest on the cluster
+
+    Instead of one `qm status` / `pct status` fork per guest (~300 ms
+    each), a single /cluster/resources call (pvesh or the REST API,
+    per `pve.backend`) returns every guest, so the cost does not
+    grow with the guest count. Results are kept for `pve.status_ttl`
+    seconds in memory and in CACHE_PATH, so panes and collectord share
+    one call per window. Concurrent callers wait for the call in flight
+    instead of starting their own.
+    """
+
+    def __init__(self, ttl=None, cache_path=CACHE_PATH):
+        self.ttl = config.get('pve.status_ttl', 5) if ttl is None else ttl
+        self.cache_path = cache_path
+        self.guests = {}
+        self.fetched = 0.0
+        self.lock = threading.Lock()
+
+    def _load_file(self):
+        """(timestamp, guests) from the shared cache, or None"""
+        try:
+            with open(self.cache_path) as f:
+                cached = json.load(f)
+            return cached['ts'], {int(vmid): guest for vmid, guest in cached['guests'].items()}
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+
+    def _save_file(self, ts, guests):
+        tmp = f"{self.cache_path}.{os.getpid()}"
+        try:
+            with open(tmp, 'w') as f:
+                json.dump({'ts': ts, 'guests': guests}, f)
+            os.replace(tmp, self.cache_path)
+        except OSError:
+            pass
+
+    def all(self, max_age=None):
+        """
+        Every guest keyed by VMID
+
+        Args:
+            max_age: Accept data up to this many seconds old (default: the TTL)
+
+        Returns:
+            {vmid: guest dict}, empty if Proxmox could not be queried
+        """
+        max_age = self.ttl if max_age is None else max_age
+        with self.lock:
+            now = time.time()
+            if now - self.fetched <= max_age:
+                return self.guests
+
+            cached = self._load_file()
+            if cached is not None and now - cached[0] <= max_age:
+                self.fetched, self.guests = cached
+                return self.guests
+
+            entries = fetch_resources()
+            # A failed call is cached too, so hosts without Proxmox pay once per TTL
+            self.guests = {}
+            if entries is not None:
+                self.guests = {guest['vmid']: guest for guest in map(normalize, entries)}
+                self._save_file(now, self.guests)
+            self.fetched = now
+            return self.guests
+
+    def guest(self, vmid, max_age=None):
+        """One guest's dict, or None if unknown"""
+        return self.all(max_age).get(int(vmid))
+
+    def state(self, vmid, max_age=None):
+        """RUNNING, STOPPED or UNKNOWN"""
+        guest = self.guest(vmid, max_age)
+        return guest['state'] if guest else UNKNOWN
+
+    def invalidate(self):
+        """Drop cached data (after starting, stopping or rolling back a guest)"""
+        with self.lock:
+            self.fetched = 0.0
+            try:
+                os.remove(self.cache_path)
+            except OSError:
+                pass
+
+# Global instance
+pve_status = PVEStatus()
+
+if __name__ == "__main__":
+    started = time.monotonic()
+    guests = pve_status.all(max_age=0)
+    elapsed = (time.monotonic() - started) * 1000
+
+    for vmid, guest in sorted(guests.items()):
+        print(f"{vmid:>6} {guest['type']:<5} {guest['name'][:20]:<20} {guest['status']:<8} "
+              f"cpu {guest['cpu']:.2f}c  mem {guest['mem'] / 1024 ** 3:.1f}/{guest['maxmem'] / 1024 ** 3:.1f}G")
+    print(f"{len(guests)} guests in {elapsed:.0f} ms")
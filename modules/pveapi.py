@@ -0,0 +1,595 @@
+#!/usr/bin/env python3
+"""
+OOPUO Desktop Environment - Proxmox API Client
+PVE REST calls over pooled keep-alive connections, with the qm/pct CLI as fallback
+"""
+import os
+import re
+import ssl
+import json
+import time
+import socket
+import threading
+import http.client
+from urllib.parse import urlencode, quote
+from datetime import datetime
+from config import config, LOG_FILE
+from executor import executor
+
+API_PREFIX = "/api2/json"
+
+# Tickets are valid for two hours; renew well before that
+TICKET_LIFETIME = 5400
+
+# The node's own CA (the API certificate is signed by it)
+PVE_CA = "/etc/pve/pve-root-ca.pem"
+
+# `qm listsnapshot` prints the snapshot time before the description
+SNAPTIME_RE = re.compile(r'(\d{4}-\d\d-\d\d \d\d:\d\d:\d\d)\s*(.*)')
+
+# VM options PVE accepts only from root@pam itself, never from a token
+ROOT_ONLY = ('hostpci', 'args')
+
+def log(msg):
+    """Write to log file"""
+    ts = datetime.now().strftime('%H:%M:%S')
+    with open(LOG_FILE, 'a') as f:
+        f.write(f"[PVE] [{ts}] {msg}\n")
+
+class PVEError(Exception):
+    """A failed API request or task"""
+
+    def __init__(self, message, status=None):
+        super().__init__(message)
+        self.status = status
+
+def encode_params(params):
+    """Form-encode parameters as PVE expects (booleans as 1/0, None dropped)"""
+    fields = {}
+    for key, value in params.items():
+        if value is None:
+            continue
+        fields[key] = int(value) if isinstance(value, bool) else value
+    return urlencode(fields)
+
+class PVEClient:
+    """
+    Minimal PVE REST client
+
+    Requests go to https://127.0.0.1:8006 over keep-alive connections
+    kept in a small pool, so a deploy's dozens of calls share a couple
+    of TLS handshakes instead of starting a Perl CLI each time. It
+    authenticates with an API token (`user@realm!name=secret`), or with
+    a ticket from user/password that is renewed before it expires.
+    Asynchronous calls return a task UPID, and run() polls it to the end.
+
+    Args:
+        host, port: API endpoint (loopback by default)
+        token: API token, or None to log in with user/password
+        user, password: Credentials for ticket authentication
+        node: Node name used in /nodes/... paths (default: this host)
+        tls: Use HTTPS (the local stand-in server speaks plain HTTP)
+        verify: Verify the certificate against the node's CA
+        timeout: Socket timeout per request, in seconds
+        pool_size: Idle connections kept open
+    """
+
+    def __init__(self, host='127.0.0.1', port=8006, token=None, user='root@pam', password=None,
+                 node=None, tls=True, verify=False, timeout=30, pool_size=4):
+        self.host = host
+        self.port = port
+        self.token = token
+        self.user = user
+        self.password = password
+        self.node = node or socket.gethostname().split('.')[0]
+        self.tls = tls
+        self.timeout = timeout
+        self.pool_size = pool_size
+        self.pool = []
+        self.lock = threading.Lock()
+        self.ticket = None
+        self.csrf = None
+        self.ticket_time = 0.0
+        self.connections = 0    # opened so far (pooling keeps this small)
+
+        self.ssl_context = None
+        if tls:
+            if verify:
+                self.ssl_context = ssl.create_default_context(
+                    cafile=PVE_CA if os.path.exists(PVE_CA) else None
+                )
+            else:
+                self.ssl_context = ssl.create_default_context()
+                self.ssl_context.check_hostname = False
+                self.ssl_context.verify_mode = ssl.CERT_NONE
+
+    @classmethod
+    def from_config(cls):
+        """
+        Client for `pve.api.*`; creates an API token on first use if needed
+
+        Raises:
+            PVEError if there is no token, no password and none could be created
+        """
+        token = config.get('pve.api.token')
+        password = config.get('pve.api.password')
+        if not token and not password:
+            token = create_api_token()
+            if not token:
+                raise PVEError("no API token or password configured, and creating a token failed")
+        return cls(
+            host=config.get('pve.api.host', '127.0.0.1'),
+            port=config.get('pve.api.port', 8006),
+            token=token,
+            user=config.get('pve.api.user', 'root@pam'),
+            password=password,
+            node=config.get('pve.api.node'),
+            verify=config.get('pve.api.verify_tls', False)
+        )
+
+    # ----- connections -----
+
+    def _acquire(self):
+        """(connection, reused) - an idle pooled connection or a new one"""
+        with self.lock:
+            if self.pool:
+                return self.pool.pop(), True
+            self.connections += 1
+        if self.tls:
+            conn = http.client.HTTPSConnection(self.host, self.port, timeout=self.timeout, context=self.ssl_context)
+        else:
+            conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+        return conn, False
+
+    def _release(self, conn):
+        with self.lock:
+            if len(self.pool) < self.pool_size:
+                self.pool.append(conn)
+                return
+        conn.close()
+
+    def close(self):
+        with self.lock:
+            pool, self.pool = self.pool, []
+        for conn in pool:
+            conn.close()
+
+    # ----- requests -----
+
+    def _auth_headers(self, method):
+        if self.token:
+            return {'Authorization': f"PVEAPIToken={self.token}"}
+        if not self.ticket or time.time() - self.ticket_time > TICKET_LIFETIME:
+            self.login()
+        headers = {'Cookie': f"PVEAuthCookie={self.ticket}"}
+        if method != 'GET':
+            headers['CSRFPreventionToken'] = self.csrf
+        return headers
+
+    def login(self):
+        """Get a fresh ticket with user/password"""
+        if not self.password:
+            raise PVEError("no API token or password configured")
+        data = self._send('POST', '/access/ticket', {'username': self.user, 'password': self.password}, {})
+        self.ticket = data['ticket']
+        self.csrf = data['CSRFPreventionToken']
+        self.ticket_time = time.time()
+
+    def _send(self, method, path, params, headers):
+        """One request on a pooled connection; returns the response's `data`"""
+        url = API_PREFIX + path
+        query = encode_params(params) if params else ""
+        body = None
+        headers = dict(headers, Accept='application/json')
+        if method in ('GET', 'DELETE'):
+            if query:
+                url += '?' + query
+        else:
+            body = query.encode()
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+
+        while True:
+            conn, reused = self._acquire()
+            try:
+                conn.request(method, url, body=body, headers=headers)
+                response = conn.getresponse()
+                payload = response.read()
+            except (http.client.HTTPException, OSError) as e:
+                conn.close()
+                if reused:
+                    continue    # the server closed an idle keep-alive socket
+                raise PVEError(f"{method} {path}: {e}")
+            break
+
+        if response.will_close:
+            conn.close()
+        else:
+            self._release(conn)
+
+        try:
+            decoded = json.loads(payload) if payload else {}
+        except ValueError:
+            decoded = {}
+        if response.status >= 400:
+            errors = decoded.get('errors') if isinstance(decoded, dict) else None
+            detail = f" {errors}" if errors else ""
+            raise PVEError(f"{method} {path}: {response.status} {response.reason}{detail}", response.status)
+        return decoded.get('data') if isinstance(decoded, dict) else None
+
+    def request(self, method, path, **params):
+        """
+        Call the API
+
+        Returns:
+            The response's `data` (a UPID string for asynchronous calls)
+
+        Raises:
+            PVEError on connection errors and HTTP errors
+        """
+        try:
+            return self._send(method, path, params, self._auth_headers(method))
+        except PVEError as e:
+            if e.status != 401 or self.token:
+                raise
+            # Ticket expired early (e.g. pveproxy restarted): log in once more
+            self.ticket = None
+            return self._send(method, path, params, self._auth_headers(method))
+
+    def get(self, path, **params):
+        return self.request('GET', path, **params)
+
+    def post(self, path, **params):
+        return self.request('POST', path, **params)
+
+    def put(self, path, **params):
+        return self.request('PUT', path, **params)
+
+    def delete(self, path, **params):
+        return self.request('DELETE', path, **params)
+
+    # ----- tasks -----
+
+    def wait_task(self, upid, timeout=600):
+        """
+        Poll a task until it stops
+
+        Polling starts at 50 ms and backs off to 1 s, so short tasks
+        return quickly without hammering the API during long ones.
+
+        Returns:
+            The task's exit status ("OK" or "WARNINGS: n")
+
+        Raises:
+            PVEError if the task failed or did not finish in time
+        """
+        node = upid.split(':')[1]
+        path = f"/nodes/{node}/tasks/{quote(upid, safe='')}"
+        deadline = time.monotonic() + timeout
+        delay = 0.05
+
+        while True:
+            status = self.get(f"{path}/status") or {}
+            if status.get('status') == 'stopped':
+                exitstatus = status.get('exitstatus', '')
+                if exitstatus == 'OK' or exitstatus.startswith('WARNINGS'):
+                    return exitstatus
+                lines = self.get(f"{path}/log", start=0, limit=1000) or []
+                tail = " | ".join(line.get('t', '') for line in lines[-3:])
+                raise PVEError(f"task {upid} failed: {exitstatus} ({tail})")
+            if time.monotonic() > deadline:
+                raise PVEError(f"task {upid} did not finish within {timeout}s")
+            time.sleep(delay)
+            delay = min(1.0, delay * 1.5)
+
+    def run(self, method, path, wait=600, **params):
+        """
+        request(), then wait up to `wait` seconds for the task if PVE
+        answered with a UPID (`params` go to PVE as they are, `timeout`
+        included)
+        """
+        result = self.request(method, path, **params)
+        if isinstance(result, str) and result.startswith('UPID:'):
+            self.wait_task(result, wait)
+        return result
+
+def create_api_token(name='oopuo'):
+    """
+    Create a root@pam API token once and store it in the config
+
+    Uses pveum (one fork, only the first time the API backend is used).
+    A token of that name left from an earlier config (reset or restored)
+    has a secret nobody knows any more, so it is replaced.
+
+    Returns:
+        Token string, or None if pveum failed
+    """
+    add = ['pveum', 'user', 'token', 'add', 'root@pam', name, '--privsep', '0', '--output-format', 'json']
+    result = executor().run(add)
+    if not result.ok and 'already exists' in result.stderr:
+        log(f"API token root@pam!{name} exists without its secret in the config, replacing it")
+        executor().run(['pveum', 'user', 'token', 'remove', 'root@pam', name])
+        result = executor().run(add)
+    if not result.ok:
+        log(f"Creating API token root@pam!{name} failed: {result.error or result.stderr.strip()[-200:]}")
+        return None
+    try:
+        data = json.loads(result.stdout)
+    except ValueError:
+        return None
+    if 'value' not in data:
+        return None
+
+    token = f"{data['full-tokenid']}={data['value']}"
+    config.set('pve.api.token', token)
+    log(f"Created API token {data['full-tokenid']}")
+    return token
+
+def _cli_options(options):
+    """{'memory': 512, 'net0': '...'} -> ['--memory', '512', '--net0', '...']"""
+    argv = []
+    for key, value in options.items():
+        if value is None:
+            continue
+        argv += [f"--{key}", str(int(value) if isinstance(value, bool) else value)]
+    return argv
+
+class CLIBackend:
+    """Proxmox operations through qm, pct, pveam and pvesh (argv, no shell)"""
+
+    name = 'cli'
+
+    def _run(self, argv, timeout=None, quiet=False):
+        """Run a CLI tool (executor default timeout unless given); returns stdout, or None on failure"""
+        return executor().output(argv, timeout, quiet)
+
+    def _cli_ok(self, argv, timeout=None):
+        return self._run(argv, timeout) is not None
+
+    def resources(self):
+        """Every guest from /cluster/resources (list of dicts), or None"""
+        # Polled every few seconds, so hosts without pvesh fail silently
+        output = self._run(['pvesh', 'get', '/cluster/resources', '--type', 'vm', '--output-format', 'json'],
+                           timeout=10, quiet=True)
+        try:
+            return json.loads(output) if output is not None else None
+        except ValueError:
+            return None
+
+    # ----- VMs -----
+
+    def vm_create(self, vmid, **options):
+        return self._cli_ok(['qm', 'create', str(vmid), *_cli_options(options)])
+
+    def vm_config(self, vmid):
+        """A VM's configuration as {option: value}, or None"""
+        output = self._run(['qm', 'config', str(vmid)], timeout=10)
+        if output is None:
+            return None
+        options = {}
+        for line in output.split('\n'):
+            key, sep, value = line.partition(': ')
+            if sep:
+                options[key] = value
+        return options
+
+    def vm_set(self, vmid, **options):
+        return self._cli_ok(['qm', 'set', str(vmid), *_cli_options(options)])
+
+    def vm_start(self, vmid):
+        return self._cli_ok(['qm', 'start', str(vmid)])
+
+    def vm_stop(self, vmid):
+        return self._cli_ok(['qm', 'stop', str(vmid)])
+
+    def vm_agent_ping(self, vmid):
+        """True if qemu-guest-agent answers (polled, so failures are not logged)"""
+        return self._run(['qm', 'guest', 'cmd', str(vmid), 'ping'], timeout=10, quiet=True) is not None
+
+    def vm_shutdown(self, vmid, timeout=120):
+        """Clean ACPI shutdown, waiting up to `timeout` seconds"""
+        return self._cli_ok(['qm', 'shutdown', str(vmid), '--timeout', str(timeout)], timeout=timeout + 30)
+
+    def vm_destroy(self, vmid):
+        return self._cli_ok(['qm', 'destroy', str(vmid)])
+
+    def vm_template(self, vmid):
+        """Convert a stopped VM into a template"""
+        return self._cli_ok(['qm', 'template', str(vmid)])
+
+    def vm_clone(self, vmid, newid, name, full=False):
+        return self._cli_ok(['qm', 'clone', str(vmid), str(newid), '--name', name, '--full', str(int(full))])
+
+    def vm_resize(self, vmid, disk, size):
+        return self._cli_ok(['qm', 'resize', str(vmid), disk, size])
+
+    def vm_importdisk(self, vmid, image, storage):
+        # Copies the whole image; far longer than qm's default timeout
+        return self._cli_ok(['qm', 'importdisk', str(vmid), image, storage], timeout=1800)
+
+    def snapshots(self, vmid):
+        """
+        Snapshots of a VM, oldest first (without the 'current' marker)
+
+        Returns:
+            List of {'name', 'description', 'snaptime'} (unix time or
+            None), or None on failure
+        """
+        output = self._run(['qm', 'listsnapshot', str(vmid)], timeout=10)
+        if output is None:
+            return None
+        snapshots = []
+        # Format: `-> snapname    2024-05-01 12:00:00    description
+        for line in output.split('\n'):
+            if '`->' not in line:
+                continue
+            fields = line.split('`->')[1].split(None, 1)
+            if not fields or fields[0] == 'current':
+                continue
+            rest = fields[1].strip() if len(fields) > 1 else ""
+            snaptime = None
+            match = SNAPTIME_RE.match(rest)
+            if match:
+                snaptime = datetime.strptime(match.group(1), '%Y-%m-%d %H:%M:%S').timestamp()
+                rest = match.group(2)
+            snapshots.append({'name': fields[0], 'description': rest, 'snaptime': snaptime})
+        return snapshots
+
+    def snapshot(self, vmid, name, description=""):
+        return self._cli_ok(['qm', 'snapshot', str(vmid), name, '--description', description])
+
+    def rollback(self, vmid, name):
+        return self._cli_ok(['qm', 'rollback', str(vmid), name])
+
+    # ----- containers -----
+
+    def ct_create(self, ctid, ostemplate, **options):
+        return self._cli_ok(['pct', 'create', str(ctid), ostemplate, *_cli_options(options)])
+
+    def ct_start(self, ctid):
+        return self._cli_ok(['pct', 'start', str(ctid)])
+
+    def ct_destroy(self, ctid):
+        return self._cli_ok(['pct', 'destroy', str(ctid), '--purge'])
+
+    def ct_exec(self, ctid, argv, timeout=None):
+        """Run a command inside a container; returns stdout or None"""
+        return self._run(['pct', 'exec', str(ctid), '--', *argv], timeout)
+
+    def template_update(self):
+        return self._cli_ok(['pveam', 'update'])
+
+    def template_download(self, storage, template):
+        return self._cli_ok(['pveam', 'download', storage, template])
+
+class APIBackend(CLIBackend):
+    """
+    Proxmox operations through the REST API
+
+    Falls back to the CLI where the API has no equivalent: `pct exec`,
+    `pveam update`, importing a disk from a host path, and options that
+    only root@pam may set (raw PCI passthrough).
+    """
+
+    name = 'api'
+
+    def __init__(self, client=None):
+        self.api = client or PVEClient.from_config()
+
+    def _call(self, method, path, **params):
+        """API call that waits for its task; returns (ok, data)"""
+        try:
+            return True, self.api.run(method, path, **params)
+        except PVEError as e:
+            log(str(e))
+            return False, None
+
+    def _ok(self, method, path, **params):
+        return self._call(method, path, **params)[0]
+
+    def _qemu(self, vmid, suffix=""):
+        return f"/nodes/{self.api.node}/qemu/{vmid}{suffix}"
+
+    def resources(self):
+        ok, data = self._call('GET', '/cluster/resources', type='vm')
+        return data if ok else None
+
+    def vm_create(self, vmid, **options):
+        return self._ok('POST', f"/nodes/{self.api.node}/qemu", vmid=vmid, **options)
+
+    def vm_set(self, vmid, **options):
+        if any(key.startswith(ROOT_ONLY) for key in options):
+            return super().vm_set(vmid, **options)
+        return self._ok('PUT', self._qemu(vmid, '/config'), **options)
+
+    def vm_config(self, vmid):
+        ok, data = self._call('GET', self._qemu(vmid, '/config'))
+        return {key: str(value) for key, value in data.items()} if ok and data else None
+
+    def vm_start(self, vmid):
+        return self._ok('POST', self._qemu(vmid, '/status/start'))
+
+    def vm_stop(self, vmid):
+        return self._ok('POST', self._qemu(vmid, '/status/stop'))
+
+    def vm_agent_ping(self, vmid):
+        try:
+            self.api.post(self._qemu(vmid, '/agent/ping'))
+            return True
+        except PVEError:
+            return False
+
+    def vm_shutdown(self, vmid, timeout=120):
+        # `timeout` is PVE's own shutdown timeout; the task ends by then
+        return self._ok('POST', self._qemu(vmid, '/status/shutdown'), timeout=timeout, wait=timeout + 30)
+
+    def vm_destroy(self, vmid):
+        return self._ok('DELETE', self._qemu(vmid))
+
+    def vm_template(self, vmid):
+        return self._ok('POST', self._qemu(vmid, '/template'))
+
+    def vm_clone(self, vmid, newid, name, full=False):
+        return self._ok('POST', self._qemu(vmid, '/clone'), newid=newid, name=name, full=full)
+
+    def vm_resize(self, vmid, disk, size):
+        return self._ok('PUT', self._qemu(vmid, '/resize'), disk=disk, size=size)
+
+    def snapshots(self, vmid):
+        ok, data = self._call('GET', self._qemu(vmid, '/snapshot'))
+        if not ok:
+            return None
+        snapshots = sorted((s for s in data or [] if s.get('name') != 'current'), key=lambda s: s.get('snaptime', 0))
+        return [
+            {'name': s['name'], 'description': s.get('description', '').strip(), 'snaptime': s.get('snaptime')}
+            for s in snapshots
+        ]
+
+    def snapshot(self, vmid, name, description=""):
+        return self._ok('POST', self._qemu(vmid, '/snapshot'), snapname=name, description=description)
+
+    def rollback(self, vmid, name):
+        return self._ok('POST', self._qemu(vmid, f"/snapshot/{quote(name, safe='')}/rollback"))
+
+    def ct_create(self, ctid, ostemplate, **options):
+        return self._ok('POST', f"/nodes/{self.api.node}/lxc", vmid=ctid, ostemplate=ostemplate, **options)
+
+    def ct_start(self, ctid):
+        return self._ok('POST', f"/nodes/{self.api.node}/lxc/{ctid}/status/start")
+
+    def ct_destroy(self, ctid):
+        return self._ok('DELETE', f"/nodes/{self.api.node}/lxc/{ctid}", purge=1)
+
+    def template_download(self, storage, template):
+        return self._ok('POST', f"/nodes/{self.api.node}/aplinfo", storage=storage, template=template)
+
+_backend = None
+_backend_lock = threading.Lock()
+
+def proxmox():
+    """
+    Shared backend chosen by `pve.backend`: "cli" (default) or "api"
+
+    The API backend falls back to the CLI when it has no credentials.
+    """
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            if config.get('pve.backend', 'cli') == 'api':
+                try:
+                    _backend = APIBackend()
+                except PVEError as e:
+                    log(f"API backend unavailable ({e}), using the CLI")
+                    _backend = CLIBackend()
+            else:
+                _backend = CLIBackend()
+        return _backend
+
+if __name__ == "__main__":
+    backend = proxmox()
+    started = time.monotonic()
+    guests = backend.resources()
+    elapsed = (time.monotonic() - started) * 1000
+    if guests is None:
+        print(f"✗ {backend.name} backend: cluster resources unavailable (see logs)")
+    else:
+        print(f"✓ {backend.name} backend: {len(guests)} guests in {elapsed:.0f} ms")
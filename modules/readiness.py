@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+OOPUO Desktop Environment - Guest Readiness
+Waits for a freshly started VM to be usable: SSH up, cloud-init done, guest agent answering
+"""
+import os
+import time
+import asyncio
+from datetime import datetime
+from config import config, LOG_FILE
+from pveapi import proxmox
+from sshmux import ssh_manager
+
+# First retry delay, growth factor and cap for every polled phase
+BACKOFF_START = 0.25
+BACKOFF_FACTOR = 1.6
+BACKOFF_MAX = 5.0
+
+class ReadinessProbe:
+    """
+    Staged readiness check for one VM
+
+    Phases run as soon as the previous one passes, each polled with
+    exponential backoff under one hard deadline:
+
+    - tcp22: port 22 accepts a connection (asyncio connect, no fork)
+    - ssh: key login works (the user exists once cloud-init's users
+      stage ran); this opens the SSH ControlMaster
+    - cloud-init: `cloud-init status --wait` returns, over the master
+      connection
+
+    qemu-guest-agent is polled alongside. The cloud image only gets the
+    agent from cloud-init, so it is not required: once cloud-init is
+    done it gets `agent_grace` more seconds and is reported as missing
+    if it still does not answer.
+
+    `phases` maps each phase to the seconds from start until it passed,
+    to show where boot time goes.
+    """
+
+    def __init__(self, vmid, ip, user=None, key_path=None, deadline=None, pve=None):
+        self.vmid = vmid
+        self.ip = ip
+        self.conn = ssh_manager.connect(ip, user, key_path)
+        self.deadline = deadline or config.get('readiness.deadline', 600)
+        self.agent_grace = config.get('readiness.agent_grace', 15)
+        self.pve = pve or proxmox()
+        self.phases = {}
+        self.error = None
+        self.started = None
+
+    def log(self, msg):
+        """Write to log file"""
+        ts = datetime.now().strftime('%H:%M:%S')
+        with open(LOG_FILE, 'a') as f:
+            f.write(f"[READY] [{ts}] {msg}\n")
+
+    def remaining(self):
+        return self.deadline - (time.monotonic() - self.started)
+
+    # ----- checks (True when the phase passed) -----
+
+    async def tcp22(self):
+        try:
+            _, writer = await asyncio.wait_for(asyncio.open_connection(self.ip, 22), timeout=3)
+        except (OSError, asyncio.TimeoutError):
+            return False
+        writer.close()
+        return True
+
+    async def ssh(self):
+        return await asyncio.to_thread(self.conn.ensure)
+
+    async def cloud_init(self):
+        """
+        Blocks inside the guest until cloud-init finishes; raises if it failed
+        """
+        proc = await asyncio.create_subprocess_exec(
+            *self.conn.argv('cloud-init status --wait'),
+            stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.STDOUT
+        )
+        try:
+            output, _ = await asyncio.wait_for(proc.communicate(), timeout=max(1, self.remaining()))
+        except asyncio.TimeoutError:
+            proc.kill()
+            return False
+        # 0: done, 2: done with recoverable errors (cloud-init >= 23.4)
+        if proc.returncode == 2:
+            self.log(f"cloud-init finished with warnings: {output.decode().strip()[-200:]}")
+        elif proc.returncode == 255:
+            return False    # connection dropped (e.g. cloud-init restarted sshd); ask again
+        elif proc.returncode != 0:
+            raise RuntimeError(f"cloud-init failed: {output.decode().strip()[-200:]}")
+        return True
+
+    async def agent(self):
+        return await asyncio.to_thread(self.pve.vm_agent_ping, self.vmid)
+
+    # ----- driver -----
+
+    async def poll(self, name, check):
+        """Retry a check with backoff until it passes; records its latency"""
+        delay = BACKOFF_START
+        while True:
+            if await check():
+                self.phases[name] = time.monotonic() - self.started
+                return True
+            if self.remaining() <= 0:
+                return False
+            await asyncio.sleep(min(delay, max(0.05, self.remaining())))
+            delay = min(BACKOFF_MAX, delay * BACKOFF_FACTOR)
+
+    async def run(self):
+        self.started = time.monotonic()
+        agent = asyncio.create_task(self.poll('agent', self.agent))
+        try:
+            for name, check in (('tcp22', self.tcp22), ('ssh', self.ssh), ('cloud-init', self.cloud_init)):
+                if not await self.poll(name, check):
+                    self.error = f"{name} not ready after {self.deadline}s"
+                    return False
+            try:
+                await asyncio.wait_for(asyncio.shield(agent), timeout=max(0.1, min(self.agent_grace, self.remaining())))
+            except asyncio.TimeoutError:
+                self.log(f"VM {self.vmid}: qemu-guest-agent not answering")
+            return True
+        except RuntimeError as e:
+            self.error = str(e)
+            return False
+        finally:
+            agent.cancel()
+
+    def wait(self):
+        """
+        Block until the VM is ready or the deadline passes
+
+        Returns:
+            True if ready (see `phases` and `error`)
+        """
+        ready = asyncio.run(self.run())
+        summary = ", ".join(f"{name} {seconds:.1f}s" for name, seconds in
+                            sorted(self.phases.items(), key=lambda item: item[1]))
+        if ready:
+            self.log(f"VM {self.vmid} at {self.ip} ready ({summary})")
+        else:
+            self.log(f"VM {self.vmid} at {self.ip} not ready: {self.error} ({summary or 'no phase passed'})")
+        return ready
+
+if __name__ == "__main__":
+    import sys
+
+    vmid = int(sys.argv[1]) if len(sys.argv) > 1 else config.get('ids.brain_vm', 200)
+    ip = sys.argv[2] if len(sys.argv) > 2 else config.get('network.brain_ip')
+    probe = ReadinessProbe(vmid, ip, deadline=int(os.environ.get('DEADLINE', 600)))
+    ready = probe.wait()
+    for name, seconds in sorted(probe.phases.items(), key=lambda item: item[1]):
+        print(f"  {name:<11} {seconds:6.1f}s")
+    print("ready" if ready else f"not ready: {probe.error}")
+    sys.exit(0 if ready else 1)
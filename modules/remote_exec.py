@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+"""
+OOPUO Desktop Environment - Remote Script Execution
+Streams a shell script to a guest over SSH and follows its progress live
+"""
+import os
+import re
+import gzip
+import time
+import shlex
+import selectors
+import threading
+import subprocess
+from collections import deque
+
+# "[2/5] Installing Deep Learning Frameworks..." starts phase 2 of 5;
+# "[2/5] done" and "[2/5] failed (...)" end it
+PHASE_RE = re.compile(r'^\[(\d+)/(\d+)\]\s*(.*)$')
+
+# The script arrives gzipped on stdin and is unpacked into bash's argument
+# (not piped into `bash -s`), so commands in it that read stdin get
+# /dev/null instead of the rest of the script
+REMOTE_COMMAND = 'exec bash -c "$(gzip -dc)" {name} < /dev/null'
+
+class RemoteScriptError(RuntimeError):
+    """A remote script exited non-zero; `tail` holds its last output lines"""
+
+    def __init__(self, message, phase=None, tail=()):
+        super().__init__(message)
+        self.phase = phase
+        self.tail = list(tail)
+
+class Phase:
+    """One `[n/N] title` section of a script's output"""
+
+    def __init__(self, index, total, title, started):
+        self.index = index
+        self.total = total
+        self.title = title
+        self.started = started
+        self.finished = None
+        self.ok = None      # set when it ends
+
+    @property
+    def duration(self):
+        return (self.finished or time.monotonic()) - self.started
+
+class RemoteScript:
+    """
+    Run a script on a guest without copying it there first
+
+    The script is gzipped and written to the SSH channel's stdin while
+    stdout and stderr are read line by line as they arrive. Lines like
+    `[2/5] Installing...` on stdout start phases, and `[2/5] done` or
+    `[2/5] failed ...` end them. In a sequential script a phase also
+    ends when the next one starts; with `concurrent`, phases overlap
+    and only their own end marker ends them. Each phase's duration is
+    logged, and `fraction` (ended phases over the total) is passed to
+    `on_progress(fraction, phase)`. Only the last `tail_lines` lines are
+    kept, for the error raised on failure.
+
+    Args:
+        conn: sshmux.SSHConnection to the guest
+        script: Shell script text (run by bash)
+        name: Script name, for $0 on the guest and log lines
+        log: Callable taking one message string
+        on_progress: Callable(fraction, phase) on every phase change
+        tail_lines: Output lines kept for failure reports
+        concurrent: Phases run in parallel and print end markers
+        env: Environment variables for the script
+    """
+
+    def __init__(self, conn, script, name="payload", log=None, on_progress=None, tail_lines=40,
+                 concurrent=False, env=None):
+        self.conn = conn
+        self.script = script
+        self.name = name
+        self.concurrent = concurrent
+        self.env = env or {}
+        self.log = log or (lambda msg: None)
+        self.on_progress = on_progress
+        self.tail = deque(maxlen=tail_lines)
+        self.phases = []
+        self.running = {}   # phase index -> Phase not ended yet
+        self.total = 0
+        self.fraction = 0.0
+        self.returncode = None
+
+    @property
+    def phase(self):
+        """Phase running now (or the last one), None before the first marker"""
+        return self.phases[-1] if self.phases else None
+
+    def _feed(self, stdin, data):
+        try:
+            stdin.write(data)
+            stdin.close()
+        except OSError:
+            pass    # ssh exited early; its exit status tells why
+
+    def _line(self, stream, line):
+        self.tail.append(line if stream == 'stdout' else f"[{stream}] {line}")
+        if stream != 'stdout':
+            return
+        match = PHASE_RE.match(line)
+        if not match:
+            return
+
+        index, total, title = int(match.group(1)), int(match.group(2)), match.group(3)
+        self.total = total
+        if title == 'done' or title.startswith('failed'):
+            if index in self.running:
+                self._end(self.running[index], title == 'done', title)
+            return
+
+        if not self.concurrent:
+            for phase in list(self.running.values()):
+                self._end(phase, True)
+        phase = Phase(index, total, title, time.monotonic())
+        self.phases.append(phase)
+        self.running[index] = phase
+        self.log(f"{self.name}: [{index}/{total}] {title}")
+        self._progress(phase)
+
+    def _end(self, phase, ok, detail='done'):
+        phase.finished = time.monotonic()
+        phase.ok = ok
+        del self.running[phase.index]
+        if ok:
+            self.log(f"{self.name}: phase {phase.index}/{phase.total} done in {phase.duration:.1f}s")
+        else:
+            self.log(f"{self.name}: phase {phase.index}/{phase.total} {detail} after {phase.duration:.1f}s")
+        self._progress(phase)
+
+    def _progress(self, phase):
+        ended = sum(1 for p in self.phases if p.finished is not None)
+        self.fraction = ended / self.total if self.total else 0.0
+        if self.on_progress:
+            self.on_progress(self.fraction, phase)
+
+    def run(self, timeout=None):
+        """
+        Run the script to the end
+
+        Returns:
+            Phase list (with durations)
+
+        Raises:
+            RemoteScriptError if the script (or ssh) failed or timed out
+        """
+        started = time.monotonic()
+        self.conn.ensure()
+        data = gzip.compress(self.script.encode())
+        assignments = "".join(f"{key}={shlex.quote(str(value))} " for key, value in self.env.items())
+        proc = subprocess.Popen(
+            self.conn.argv(assignments + REMOTE_COMMAND.format(name=shlex.quote(self.name))),
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE
+        )
+        # Written from a thread: a script that prints a lot before ssh has
+        # read all of stdin would otherwise deadlock against us
+        feeder = threading.Thread(target=self._feed, args=(proc.stdin, data), daemon=True)
+        feeder.start()
+
+        selector = selectors.DefaultSelector()
+        selector.register(proc.stdout, selectors.EVENT_READ, 'stdout')
+        selector.register(proc.stderr, selectors.EVENT_READ, 'stderr')
+        partial = {'stdout': b'', 'stderr': b''}
+        timed_out = False
+
+        while selector.get_map():
+            wait = None if timeout is None else timeout - (time.monotonic() - started)
+            if wait is not None and wait <= 0:
+                timed_out = True
+                proc.kill()
+                break
+            for key, _ in selector.select(wait):
+                chunk = os.read(key.fd, 65536)
+                if not chunk:
+                    selector.unregister(key.fileobj)
+                    lines = [partial[key.data]] if partial[key.data] else []
+                else:
+                    *lines, partial[key.data] = (partial[key.data] + chunk).split(b'\n')
+                for line in lines:
+                    self._line(key.data, line.decode(errors='replace').rstrip('\r'))
+        selector.close()
+
+        self.returncode = proc.wait()
+        feeder.join()
+        # Phases still open ended with the script
+        unfinished = list(self.running.values())
+        for phase in unfinished:
+            phase.finished = time.monotonic()
+            phase.ok = self.returncode == 0 and not timed_out
+        self.running = {}
+
+        blamed = [phase for phase in self.phases if phase.ok is False] or unfinished[-1:]
+        where = ", ".join(f"{phase.index}/{phase.total} ({phase.title})" for phase in blamed)
+        where = f" in phase {where}" if where else ""
+        if timed_out:
+            raise RemoteScriptError(f"{self.name} timed out after {timeout}s{where}", blamed[0] if blamed else None, self.tail)
+        if self.returncode != 0:
+            raise RemoteScriptError(f"{self.name} exited with {self.returncode}{where}", blamed[0] if blamed else None, self.tail)
+
+        self.fraction = 1.0
+        if self.on_progress:
+            self.on_progress(self.fraction, self.phase)
+        self.log(f"{self.name}: finished in {time.monotonic() - started:.1f}s")
+        return self.phases
+
+if __name__ == "__main__":
+    import sys
+    from sshmux import ssh_manager
+
+    class LocalShell:
+        """Stands in for an SSH connection: runs the remote command locally"""
+
+        def ensure(self):
+            return True
+
+        def argv(self, command):
+            return ['bash', '-c', command]
+
+    demo = """
+echo "[1/3] Warming up"; sleep 0.3
+read -t 1 line || echo "stdin is empty, as it should be"
+echo "[2/3] Working"; for i in 1 2 3; do echo "step $i"; sleep 0.2; done
+echo "to stderr" >&2
+echo "[3/3] Finishing"; sleep 0.1
+exit ${DEMO_EXIT:-0}
+"""
+    conn = ssh_manager.connect(sys.argv[1]) if len(sys.argv) > 1 else LocalShell()
+    script = RemoteScript(conn, demo, name="demo", log=print,
+                          on_progress=lambda fraction, phase: print(f"  progress {fraction:.0%}"))
+    try:
+        for phase in script.run(timeout=30):
+            print(f"  {phase.index}/{phase.total} {phase.title:<20} {phase.duration:.2f}s")
+    except RemoteScriptError as e:
+        print(f"Failed: {e}")
+        print("\n".join(e.tail))
@@ -0,0 +1,298 @@
+#!/usr/bin/env python3
+"""
+OOPUO Desktop Environment - Damage-Tracked Screen Buffer
+Panes draw into a cell grid; flush() sends only the cells that changed
+"""
+import os
+import re
+import sys
+import shutil
+import unicodedata
+
+# SGR escape sequences as produced by colors.py (col, bg, bold, dim)
+SGR_RE = re.compile(r'\033\[([0-9;]*)m')
+
+# Style bit layout: fg+1 (9 bits) | bg+1 (9 bits) | bold | dim
+FG_MASK = 0x1FF
+BG_SHIFT = 9
+BOLD = 1 << 18
+DIM = 1 << 19
+
+# Rewriting a short run of unchanged cells is cheaper than a cursor move
+SKIP_GAP = 4
+
+def apply_sgr(style, params):
+    """Apply one SGR parameter string to a packed style"""
+    codes = params.split(';') if params else ['0']
+    i = 0
+    while i < len(codes):
+        code = codes[i]
+        if code in ('', '0'):
+            style = 0
+        elif code == '1':
+            style |= BOLD
+        elif code == '2':
+            style |= DIM
+        elif code == '22':
+            style &= ~(BOLD | DIM)
+        elif code in ('38', '48') and i + 2 < len(codes) and codes[i + 1] == '5':
+            color = int(codes[i + 2]) + 1
+            if code == '38':
+                style = (style & ~FG_MASK) | color
+            else:
+                style = (style & ~(FG_MASK << BG_SHIFT)) | (color << BG_SHIFT)
+            i += 2
+        elif code == '39':
+            style &= ~FG_MASK
+        elif code == '49':
+            style &= ~(FG_MASK << BG_SHIFT)
+        i += 1
+    return style
+
+def sgr(prev, style):
+    """Shortest SGR sequence that turns terminal style `prev` into `style`"""
+    if style == prev:
+        return ""
+
+    codes = []
+    # Attributes can only be switched off by a reset
+    if (prev & (BOLD | DIM)) & ~style:
+        codes.append('0')
+        prev = 0
+    if style & BOLD and not prev & BOLD:
+        codes.append('1')
+    if style & DIM and not prev & DIM:
+        codes.append('2')
+
+    fg, prev_fg = style & FG_MASK, prev & FG_MASK
+    if fg != prev_fg:
+        codes.append(f"38;5;{fg - 1}" if fg else '39')
+    bgc, prev_bg = (style >> BG_SHIFT) & FG_MASK, (prev >> BG_SHIFT) & FG_MASK
+    if bgc != prev_bg:
+        codes.append(f"48;5;{bgc - 1}" if bgc else '49')
+
+    return f"\033[{';'.join(codes)}m"
+
+def char_width(ch):
+    """Terminal columns taken by one character"""
+    if unicodedata.combining(ch):
+        return 0
+    return 2 if unicodedata.east_asian_width(ch) in ('W', 'F') else 1
+
+def terminal_size(out):
+    """Size of the terminal behind `out` (stdout also honours $COLUMNS/$LINES)"""
+    if out is not sys.stdout:
+        try:
+            return os.get_terminal_size(out.fileno())
+        except (AttributeError, ValueError, OSError):
+            pass
+    return shutil.get_terminal_size()
+
+class Screen:
+    """
+    Double-buffered terminal screen
+
+    Views clear the back buffer, draw the whole frame with the usual
+    col()/bold() strings and call flush(). The frame is compared row by
+    row with what the terminal already shows, and only changed cells are
+    written: runs are joined across small gaps, the cursor is moved only
+    when it is not already in place, and SGR codes are emitted only when
+    the style actually changes. An unchanged frame costs zero bytes.
+    """
+
+    def __init__(self, out=None):
+        self.out = out or sys.stdout
+        self.width = 0
+        self.height = 0
+        self.chars = []         # back buffer (being drawn)
+        self.styles = []
+        self.front_chars = None # what the terminal shows (None = unknown)
+        self.front_styles = None
+        self.resize()
+
+    def resize(self, width=None, height=None):
+        """
+        Match the terminal size (forces a full repaint if it changed)
+
+        Returns:
+            (width, height)
+        """
+        if width is None or height is None:
+            width, height = terminal_size(self.out)
+        if (width, height) != (self.width, self.height):
+            self.width, self.height = width, height
+            self.invalidate()
+            self.clear()
+        return self.width, self.height
+
+    def invalidate(self):
+        """Forget the terminal contents; the next flush repaints everything"""
+        self.front_chars = None
+        self.front_styles = None
+
+    def clear(self):
+        """Blank the back buffer"""
+        size = self.width * self.height
+        self.chars = [' '] * size
+        self.styles = [0] * size
+
+    def draw(self, y, x, text, wrap=False):
+        """
+        Draw styled text at a 1-based position (like "\\033[y;xH")
+
+        Args:
+            y, x: Row and column, 1-based
+            text: Text with optional SGR sequences from colors.py
+            wrap: Continue on the next row instead of clipping at the edge
+
+        Returns:
+            Column after the last drawn character (1-based)
+        """
+        row, column = y - 1, x - 1
+        style = 0
+        pos = 0
+
+        for match in SGR_RE.finditer(text + '\033[m'):
+            for ch in text[pos:match.start()]:
+                if ch == '\n':
+                    row, column = row + 1, x - 1
+                    continue
+                w = char_width(ch)
+                if w == 0:
+                    continue
+                if column + w > self.width:
+                    if not wrap:
+                        continue
+                    row, column = row + 1, 0
+                if 0 <= row < self.height and column >= 0:
+                    i = row * self.width + column
+                    self.chars[i] = ch
+                    self.styles[i] = style
+                    if w == 1 and column + 1 < self.width and self.chars[i + 1] == '':
+                        # Overwrote half of a wide character
+                        self.chars[i + 1] = ' '
+                    if w == 2:
+                        # Continuation cell of a wide character
+                        self.chars[i + 1] = ''
+                        self.styles[i + 1] = style
+                column += w
+            if match.end() <= len(text):
+                style = apply_sgr(style, match.group(1))
+            pos = match.end()
+
+        return column + 1
+
+    def fill(self, y, x, width, ch=' ', style=0):
+        """Fill a run of cells in one row"""
+        row = y - 1
+        if not 0 <= row < self.height:
+            return
+        start = max(0, x - 1)
+        end = min(self.width, x - 1 + width)
+        base = row * self.width
+        for i in range(base + start, base + end):
+            self.chars[i] = ch
+            self.styles[i] = style
+
+    def render_diff(self):
+        """
+        Build the escape string that updates the terminal to the back buffer
+
+        Returns:
+            String to write (empty if nothing changed)
+        """
+        width = self.width
+        chars, styles = self.chars, self.styles
+        full = self.front_chars is None
+        front_chars = self.front_chars or [None] * len(chars)
+        front_styles = self.front_styles or [None] * len(styles)
+
+        out = ["\033[0m\033[H\033[J"] if full else []
+        cursor = (0, 0) if full else None   # (row, column) after the last write
+        term_style = 0 if full else None
+
+        for row in range(self.height):
+            base = row * width
+            end = base + width
+            if not full and chars[base:end] == front_chars[base:end] and styles[base:end] == front_styles[base:end]:
+                continue
+
+            col = 0
+            while col < width:
+                i = base + col
+                if chars[i] == front_chars[i] and styles[i] == front_styles[i]:
+                    col += 1
+                    continue
+                if full and chars[i] == ' ' and styles[i] == 0:
+                    # Already blank after the clear
+                    col += 1
+                    continue
+
+                # Continuation cell: start from the wide character itself
+                if chars[i] == '' and col > 0:
+                    col -= 1
+                    i -= 1
+
+                # Extend the run while cells differ, bridging short equal gaps
+                run_end = col + 1
+                gap = 0
+                while run_end < width and gap <= SKIP_GAP:
+                    j = base + run_end
+                    same = chars[j] == front_chars[j] and styles[j] == front_styles[j]
+                    if full:
+                        same = same or (chars[j] == ' ' and styles[j] == 0)
+                    gap = gap + 1 if same else 0
+                    run_end += 1
+                run_end -= gap
+
+                if cursor != (row, col):
+                    out.append(f"\033[{row + 1};{col + 1}H")
+                for k in range(base + col, base + run_end):
+                    if chars[k] == '':
+                        continue
+                    if styles[k] != term_style:
+                        out.append(sgr(term_style, styles[k]) if term_style is not None
+                                   else "\033[0m" + sgr(0, styles[k]))
+                        term_style = styles[k]
+                    out.append(chars[k])
+                cursor = (row, run_end)
+                col = run_end
+
+        if out and term_style:
+            out.append("\033[0m")
+        return "".join(out)
+
+    def flush(self):
+        """
+        Write the changed cells and make the back buffer the new front
+
+        Returns:
+            Number of characters written
+        """
+        data = self.render_diff()
+        if data:
+            self.out.write(data)
+            self.out.flush()
+        self.front_chars = list(self.chars)
+        self.front_styles = list(self.styles)
+        return len(data)
+
+if __name__ == "__main__":
+    import time
+    from colors import col, bold, gradient_bar, C_PRIMARY, C_MUTED
+
+    # Demo: a counter that changes a few cells per frame
+    screen = Screen()
+    sys.stdout.write("\033[?25l")
+    try:
+        for n in range(50):
+            screen.resize()
+            screen.clear()
+            screen.draw(2, 2, bold(col("═══ SCREEN BUFFER ═══", C_PRIMARY)))
+            screen.draw(4, 2, gradient_bar(n * 2, 100, width=30))
+            written = screen.flush()
+            screen.draw(6, 2, col(f"frame {n:3d}  last flush {written} chars", C_MUTED))
+            screen.flush()
+            time.sleep(0.1)
+    finally:
+        sys.stdout.write("\033[0m\033[?25h\n")
@@ -3,19 +3,18 @@
 OOPUO Desktop Environment - Settings Module
 Configurable system parameters
 """
-import sys
-import shutil
 import tty
 import termios
-import select
 from colors import col, box_chars, bold, C_PRIMARY, C_SUCCESS, C_ERROR, C_MUTED, C_TEXT, C_ACCENT
 from config import config
 from tunnel_wizard import TunnelWizard
+from screen import Screen
+from eventloop import EventLoop, KEY_UP, KEY_DOWN, KEY_ENTER
 
 class Settings:
     """Interactive settings configuration"""
     
-    def __init__(self):
+    def __init__(self, loop=None, screen=None):
         self.menu_items = [
             ("VM Resources", "vm_resources"),
             ("Credentials", "credentials"),
@@ -26,30 +25,33 @@ class Settings:
         ]
         self.selected_idx = 0
         self.running = True
-        self.width, self.height = shutil.get_terminal_size()
+        self.page = None        # sub-page shown instead of the menu (e.g. "vm_resources")
+        self.wizard = None      # nested tunnel wizard while it runs
+        self.loop = loop or EventLoop()
+        self.screen = screen or Screen()
+        self.width, self.height = self.screen.resize(*self.loop.size)
     
     def render(self):
         """Render settings menu"""
-        self.width, self.height = shutil.get_terminal_size()
+        self.width, self.height = self.screen.resize(*self.loop.size)
+        if self.page == "vm_resources":
+            self.show_vm_resources()
+            return
         
-        # Clear screen
-        sys.stdout.write("\033[H\033[J")
+        screen = self.screen
+        screen.clear()
         
         box = box_chars('double')
         
         # Title
-        sys.stdout.write("\033[2;2H")
-        sys.stdout.write(bold(col("═══ SETTINGS ═══", C_PRIMARY)))
+        screen.draw(2, 2, bold(col("═══ SETTINGS ═══", C_PRIMARY)))
         
-        sys.stdout.write("\033[4;2H")
-        sys.stdout.write(col("Configure OOPUO Desktop Environment", C_MUTED))
+        screen.draw(4, 2, col("Configure OOPUO Desktop Environment", C_MUTED))
         
         # Menu
         start_y = 6
         for i, (label, key) in enumerate(self.menu_items):
             current_y = start_y + i
-            sys.stdout.write(f"\033[{current_y};2H")
-            
             if i == self.selected_idx:
                 prefix = "➜ "
                 text = bold(col(label, C_ACCENT))
@@ -57,13 +59,12 @@ class Settings:
                 prefix = "  "
                 text = col(label, C_PRIMARY)
             
-            sys.stdout.write(prefix + text)
+            screen.draw(current_y, 2, prefix + text)
         
         # Instructions
-        sys.stdout.write(f"\033[{self.height-3};2H")
-        sys.stdout.write(col("↑/↓ Navigate  |  Enter: Select  |  Q: Back", C_TEXT))
+        screen.draw(self.height-3, 2, col("↑/↓ Navigate  |  Enter: Select  |  Q: Back", C_TEXT))
         
-        sys.stdout.flush()
+        screen.flush()
     
     def show_vm_resources(self):
         """Show VM resource settings"""
@@ -71,74 +72,81 @@ class Settings:
         brain_mem = config.get('resources.brain.mem', 8192)
         brain_disk = config.get('resources.brain.disk', 80)
         
-        sys.stdout.write("\033[H\033[J")
-        sys.stdout.write("\033[2;2H")
-        sys.stdout.write(bold(col("VM Resources (Brain)", C_PRIMARY)))
-        
-        sys.stdout.write("\033[4;2H")
-        sys.stdout.write(col(f"CPU Cores: {brain_cores}", C_TEXT))
+        screen = self.screen
+        screen.clear()
+        screen.draw(2, 2, bold(col("VM Resources (Brain)", C_PRIMARY)))
         
-        sys.stdout.write("\033[5;2H")
-        sys.stdout.write(col(f"RAM: {brain_mem} MB", C_TEXT))
+        screen.draw(4, 2, col(f"CPU Cores: {brain_cores}", C_TEXT))
         
-        sys.stdout.write("\033[6;2H")
-        sys.stdout.write(col(f"Disk: {brain_disk} GB", C_TEXT))
+        screen.draw(5, 2, col(f"RAM: {brain_mem} MB", C_TEXT))
         
-        sys.stdout.write("\033[8;2H")
-        sys.stdout.write(col("(Changes require VM rebuild)", C_MUTED))
+        screen.draw(6, 2, col(f"Disk: {brain_disk} GB", C_TEXT))
         
-        sys.stdout.write(f"\033[{self.height-2};2H")
-        sys.stdout.write(col("Press any key to return", C_TEXT))
-        sys.stdout.flush()
+        screen.draw(8, 2, col("(Changes require VM rebuild)", C_MUTED))
         
-        sys.stdin.read(1)
+        screen.draw(self.height-2, 2, col("Press any key to return", C_TEXT))
+        screen.flush()
     
     def show_tunnel_wizard(self):
         """Launch Cloudflare Tunnel wizard"""
-        wizard = TunnelWizard()
-        wizard.run()
+        # Shares the screen buffer, so returning repaints only what differs
+        loop = EventLoop(self.loop.tty)
+        try:
+            self.wizard = TunnelWizard(screen=self.screen, loop=loop)
+            self.wizard.run()
+        finally:
+            self.wizard = None
+            loop.close()    # its self-pipe, whether or not the wizard got to run
+        self.loop.refresh_size()
     
     def handle_input(self, key):
         """Handle keyboard input"""
-        if key.lower() == 'q':
+        if self.page:
+            # Any key returns from a sub-page
+            self.page = None
+        
+        elif key.lower() == 'q':
             self.running = False
         
-        elif key == '\x1b':  # Arrow keys
-            next_chars = sys.stdin.read(2)
-            if next_chars == '[A':  # Up
-                self.selected_idx = max(0, self.selected_idx - 1)
-            elif next_chars == '[B':  # Down
-                self.selected_idx = min(len(self.menu_items) - 1, self.selected_idx + 1)
+        elif key == KEY_UP:
+            self.selected_idx = max(0, self.selected_idx - 1)
+        
+        elif key == KEY_DOWN:
+            self.selected_idx = min(len(self.menu_items) - 1, self.selected_idx + 1)
         
-        elif key == '\r' or key == '\n':  # Enter
+        elif key in KEY_ENTER:
             _, action = self.menu_items[self.selected_idx]
             
             if action == "back":
                 self.running = False
             elif action == "vm_resources":
-                self.show_vm_resources()
+                self.page = "vm_resources"
             elif action == "tunnel":
                 self.show_tunnel_wizard()
     
+    def stop(self):
+        """Leave the main loop (safe to call from another thread)"""
+        self.running = False
+        wizard = self.wizard
+        if wizard is not None:
+            wizard.stop()
+        self.loop.stop()
+    
     def run(self):
         """Main loop"""
-        fd = sys.stdin.fileno()
+        fd = self.loop.fd
         old_settings = termios.tcgetattr(fd)
         
         try:
             tty.setraw(fd)
-            sys.stdout.write("\033[?25l")  # Hide cursor
+            self.screen.out.write("\033[?25l")  # Hide cursor
             
-            while self.running:
-                self.render()
-                
-                if select.select([sys.stdin], [], [], 0.1)[0]:
-                    key = sys.stdin.read(1)
-                    self.handle_input(key)
+            self.loop.run(self.render, self.handle_input, lambda: self.running)
         
         finally:
             termios.tcsetattr(fd, termios.TCSADRAIN, old_settings)
-            sys.stdout.write("\033[?25h")  # Show cursor
+            self.screen.out.write("\033[?25h")  # Show cursor
+            self.screen.out.flush()
 
 if __name__ == "__main__":
     settings = Settings()
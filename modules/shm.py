@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+"""
+OOPUO Desktop Environment - Shared Metrics Snapshot
+Fixed struct layout in shared memory, guarded by a seqlock
+"""
+import os
+import mmap
+import time
+import struct
+from config import SHM_PATH
+
+MAGIC = b'OOPUOSHM'
+VERSION = 5
+
+# Scalar fields: (name, struct code)
+SCALARS = (
+    ('ts', 'd'),                # last publish time
+    ('cpu', 'f'),               # aggregate CPU %
+    ('cpu_hot', 'f'),           # busiest core %
+    ('cpu_hot_core', 'i'),      # busiest core id (-1 = unknown)
+    ('ram', 'f'),               # RAM %
+    ('ram_used', 'f'),          # GB
+    ('ram_total', 'f'),         # GB
+    ('uptime', 'd'),            # seconds
+    ('brain_state', 'b'),       # -1 unknown, 0 stopped, 1 running
+    ('guard_state', 'b'),
+    ('tunnel_state', 'b'),      # -1 unknown, 0 inactive, 1 active
+    ('nomad_state', 'b'),       # health probes: -1 unknown, 0 down, 1 up
+    ('consul_state', 'b'),
+    ('vault_state', 'b'),
+    ('health_ts', 'd'),         # last probe result
+    ('snapshot_count', 'i'),    # -1 unknown
+    ('guests_ts', 'd'),         # last guest poll
+)
+
+# Fixed-capacity arrays: (name, capacity, ((field, struct code), ...))
+ARRAYS = (
+    ('numa', 8, (('node', 'i'), ('util', 'f'))),
+    ('gpus', 8, (
+        ('index', 'i'), ('util', 'f'), ('mem_used', 'f'), ('mem_total', 'f'),
+        ('temp', 'f'), ('power', 'f'), ('sm_clock', 'f'), ('throttle', 'Q'),
+        ('name', '32s'),
+    )),
+    ('guests', 8, (
+        ('id', 'i'), ('state', 'b'), ('cpu', 'f'), ('throttled', 'f'),
+        ('mem_current', 'd'), ('mem_max', 'd'), ('io_read', 'f'), ('io_write', 'f'),
+        ('cpu_some', 'f'), ('mem_some', 'f'), ('mem_full', 'f'), ('io_some', 'f'),
+        ('name', '16s'),
+    )),
+    ('disks', 8, (
+        ('read', 'f'), ('write', 'f'), ('iops', 'f'), ('latency', 'f'), ('util', 'f'),
+        ('name', '16s'),
+    )),
+    ('nets', 8, (
+        ('rx', 'f'), ('tx', 'f'), ('util', 'f'),
+        ('name', '16s'),
+    )),
+)
+
+HEADER = struct.Struct('<8sII')     # magic, version, payload size
+SEQ = struct.Struct('<Q')
+SEQ_OFFSET = HEADER.size
+PAYLOAD_OFFSET = 64
+
+def _build_payload():
+    codes = '<' + ''.join(code for _, code in SCALARS)
+    for _, capacity, fields in ARRAYS:
+        codes += 'I' + ''.join(code for _, code in fields) * capacity
+    return struct.Struct(codes)
+
+PAYLOAD = _build_payload()
+SIZE = PAYLOAD_OFFSET + PAYLOAD.size
+
+def _defaults():
+    values = {}
+    for name, code in SCALARS:
+        values[name] = -1 if code in ('b', 'i') else 0.0
+    for name, _, _ in ARRAYS:
+        values[name] = []
+    return values
+
+def encode(values):
+    """Flatten a snapshot dict into struct arguments"""
+    merged = _defaults()
+    merged.update(values)
+
+    args = [merged[name] for name, _ in SCALARS]
+    for name, capacity, fields in ARRAYS:
+        items = list(merged[name])[:capacity]
+        args.append(len(items))
+        for i in range(capacity):
+            item = items[i] if i < len(items) else {}
+            for field, code in fields:
+                value = item.get(field)
+                if code.endswith('s'):
+                    args.append(str(value or '').encode()[:int(code[:-1])])
+                elif value is None:
+                    args.append(0)
+                else:
+                    args.append(value)
+    return args
+
+def decode(raw):
+    """Turn an unpacked payload tuple back into a snapshot dict"""
+    values = {}
+    pos = 0
+    for name, _ in SCALARS:
+        values[name] = raw[pos]
+        pos += 1
+    for name, capacity, fields in ARRAYS:
+        count = raw[pos]
+        pos += 1
+        items = []
+        for i in range(capacity):
+            item = {}
+            for field, code in fields:
+                value = raw[pos]
+                if code.endswith('s'):
+                    value = value.rstrip(b'\0').decode(errors='replace')
+                item[field] = value
+                pos += 1
+            if i < count:
+                items.append(item)
+        values[name] = items
+    return values
+
+class SnapshotWriter:
+    """Single writer: publishes the latest values into shared memory"""
+
+    def __init__(self, path=SHM_PATH):
+        self.path = path
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            os.ftruncate(fd, SIZE)
+            self.mm = mmap.mmap(fd, SIZE)
+        finally:
+            os.close(fd)
+
+        HEADER.pack_into(self.mm, 0, MAGIC, VERSION, PAYLOAD.size)
+        self.seq = SEQ.unpack_from(self.mm, SEQ_OFFSET)[0] & ~1
+        self.values = _defaults()
+
+    def publish(self, **updates):
+        """Merge updates into the current snapshot and publish it"""
+        self.values.update(updates)
+        self.values['ts'] = time.time()
+        args = encode(self.values)
+
+        # Seqlock: odd while writing, even when consistent
+        self.seq += 1
+        SEQ.pack_into(self.mm, SEQ_OFFSET, self.seq)
+        PAYLOAD.pack_into(self.mm, PAYLOAD_OFFSET, *args)
+        self.seq += 1
+        SEQ.pack_into(self.mm, SEQ_OFFSET, self.seq)
+
+    def close(self):
+        self.mm.close()
+
+class SnapshotReader:
+    """Lock-free reader; cheap enough to call every frame"""
+
+    def __init__(self, path=SHM_PATH):
+        self.path = path
+        self.mm = None
+        self.last_seq = 0       # sequence number of the last successful read
+
+    def _attach(self):
+        try:
+            fd = os.open(self.path, os.O_RDONLY)
+        except OSError:
+            return False
+        try:
+            if os.fstat(fd).st_size < SIZE:
+                return False
+            self.mm = mmap.mmap(fd, SIZE, access=mmap.ACCESS_READ)
+        finally:
+            os.close(fd)
+
+        magic, version, size = HEADER.unpack_from(self.mm, 0)
+        if magic != MAGIC or version != VERSION or size != PAYLOAD.size:
+            self.mm.close()
+            self.mm = None
+            return False
+        return True
+
+    @property
+    def seq(self):
+        """Current sequence number (changes on every publish)"""
+        if self.mm is None and not self._attach():
+            return 0
+        return SEQ.unpack_from(self.mm, SEQ_OFFSET)[0]
+
+    def read(self, max_age=None, retries=100):
+        """
+        Read a consistent snapshot
+
+        Args:
+            max_age: Return None if the snapshot is older than this (seconds)
+
+        Returns:
+            Snapshot dict, or None if no collector is publishing
+        """
+        if self.mm is None and not self._attach():
+            return None
+
+        for _ in range(retries):
+            before = SEQ.unpack_from(self.mm, SEQ_OFFSET)[0]
+            if before & 1:
+                continue
+            raw = PAYLOAD.unpack_from(self.mm, PAYLOAD_OFFSET)
+            if SEQ.unpack_from(self.mm, SEQ_OFFSET)[0] == before:
+                break
+        else:
+            return None
+
+        if before == 0:
+            return None
+
+        self.last_seq = before
+        values = decode(raw)
+        if max_age is not None and time.time() - values['ts'] > max_age:
+            return None
+        return values
+
+    def close(self):
+        if self.mm is not None:
+            self.mm.close()
+            self.mm = None
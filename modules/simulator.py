@@ -0,0 +1,309 @@
+#!/usr/bin/env python3
+"""
+OOPUO Desktop Environment - Simulated Proxmox Host
+Executor backend answering qm, pct, pveam, pvesh, lspci and friends from a fake node
+"""
+import os
+import json
+import time
+import random
+import threading
+from datetime import datetime
+from executor import Result, LocalBackend
+from pve_standin import StandinState, StandinError, find_route
+
+# Seconds a command takes on a real node (before `speed`). The PVE tools
+# spend ~0.4s loading Perl before they do anything; the rest is the
+# operation itself, waited for by the CLI.
+SIM_SECONDS = {
+    'qm': 0.4, 'qm config': 0.45, 'qm set': 0.6, 'qm create': 1.2, 'qm start': 2.5,
+    'qm stop': 1.5, 'qm shutdown': 6.0, 'qm destroy': 1.8, 'qm template': 2.0,
+    'qm clone': 5.0, 'qm resize': 0.9, 'qm importdisk': 25.0, 'qm listsnapshot': 0.45,
+    'qm snapshot': 2.0, 'qm rollback': 3.5, 'qm guest': 0.5,
+    'pct': 0.4, 'pct create': 9.0, 'pct start': 2.0, 'pct destroy': 1.6, 'pct exec': 0.5,
+    'pct status': 0.45,
+    'pveam': 0.5, 'pveam update': 3.0, 'pveam download': 40.0,
+    'pvesh': 0.5, 'pveum': 0.6, 'lspci': 0.03,
+    'update-grub': 4.0, 'update-initramfs': 30.0
+}
+
+# Spread around SIM_SECONDS, as a fraction
+JITTER = 0.2
+
+# What lspci prints on the simulated host
+LSPCI = """00:00.0 Host bridge: Intel Corporation 8th Gen Core Processor Host Bridge/DRAM Registers (rev 07)
+00:02.0 VGA compatible controller: Intel Corporation CoffeeLake-S GT2 [UHD Graphics 630]
+00:14.0 USB controller: Intel Corporation Cannon Lake PCH USB 3.1 xHCI Host Controller (rev 10)
+00:1f.6 Ethernet controller: Intel Corporation Ethernet Connection (7) I219-LM (rev 10)
+01:00.0 VGA compatible controller: NVIDIA Corporation GA102 [GeForce RTX 3090] (rev a1)
+01:00.1 Audio device: NVIDIA Corporation GA102 High Definition Audio Controller (rev a1)
+"""
+
+# Templates `pveam available` lists
+AVAILABLE_TEMPLATES = [
+    ('system', 'alpine-3.19-default_20240207_amd64.tar.xz'),
+    ('system', 'debian-12-standard_12.2-1_amd64.tar.zst'),
+    ('system', 'ubuntu-22.04-standard_22.04-1_amd64.tar.zst'),
+    ('system', 'ubuntu-24.04-standard_24.04-2_amd64.tar.zst'),
+]
+
+class SimulatedBackend:
+    """
+    Executor backend that plays a Proxmox node
+
+    qm, pct, pveam, pvesh and pveum are translated into the REST calls
+    of the API stand-in and run against its state (StandinState), so
+    guests created with `qm create` show up in `pvesh get
+    /cluster/resources`, can be cloned, snapshotted and destroyed, and
+    fail the way the real tools do. Commands block until their task has
+    finished, like the CLI, and take SIM_SECONDS (times `speed`, with
+    some jitter). lspci, update-grub and update-initramfs answer as on
+    a host with an NVIDIA card. Anything else runs locally.
+
+    Args:
+        speed: Factor on the simulated durations (0 = instant)
+        node: Node name of the fake host
+        seed: Jitter seed, for repeatable runs
+    """
+
+    name = 'simulated'
+
+    def __init__(self, speed=1.0, node='sim', seed=None):
+        self.speed = speed
+        self.state = StandinState(node)
+        self.random = random.Random(seed)
+        self.local = LocalBackend()
+        self.lock = threading.Lock()
+        self.tokens = set()     # (user, name) of the API tokens created
+        self.tools = {
+            'qm': self._qm, 'pct': self._pct, 'pveam': self._pveam, 'pvesh': self._pvesh,
+            'pveum': self._pveum, 'lspci': self._lspci,
+            'update-grub': self._boot_config, 'update-initramfs': self._boot_config
+        }
+
+    def execute(self, argv, timeout, input=None):
+        tool = os.path.basename(argv[0])
+        if tool not in self.tools:
+            return self.local.execute(argv, timeout, input)
+
+        key = f"{tool} {argv[1]}" if len(argv) > 1 else tool
+        with self.lock:
+            jitter = self.random.uniform(1 - JITTER, 1 + JITTER)
+        delay = SIM_SECONDS.get(key, SIM_SECONDS.get(tool, 0.1)) * jitter * self.speed
+        if timeout is not None and delay > timeout:
+            time.sleep(timeout)
+            return Result(argv, 124, "", "", timeout, f"timed out after {timeout}s")
+        time.sleep(delay)
+
+        try:
+            returncode, stdout, stderr = self.tools[tool](argv[1:])
+        except StandinError as e:
+            returncode, stdout, stderr = 255, "", f"{e}\n"
+        except (KeyError, IndexError, ValueError) as e:
+            returncode, stdout, stderr = 255, "", f"400 not enough arguments ({e})\n"
+        return Result(argv, returncode, stdout, stderr, delay)
+
+    # ----- helpers -----
+
+    def _call(self, method, path, **params):
+        """Run a stand-in route; a task is finished before returning, as the CLI waits for it"""
+        handler, args = find_route(method, path)
+        if handler is None:
+            raise StandinError(501, f"no simulated route for {method} {path}")
+        with self.state.lock:
+            self.state.requests += 1
+            data = handler(self.state, params, *args)
+            if isinstance(data, str) and data.startswith('UPID:'):
+                self.state.tasks[data]['end'] = time.monotonic()
+                status = self.state.task_status(data)
+                if status['exitstatus'] != 'OK':
+                    raise StandinError(500, status['exitstatus'])
+        return data
+
+    def _node(self, suffix):
+        return f"/nodes/{self.state.node}{suffix}"
+
+    @staticmethod
+    def _options(args):
+        """['100', 'disk', '--memory', '512'] -> (['100', 'disk'], {'memory': '512'})"""
+        positional, options = [], {}
+        args = list(args)
+        while args:
+            arg = args.pop(0)
+            if arg.startswith('--'):
+                options[arg[2:]] = args.pop(0) if args and not args[0].startswith('--') else '1'
+            else:
+                positional.append(arg)
+        return positional, options
+
+    # ----- tools: args -> (returncode, stdout, stderr) -----
+
+    def _qm(self, args):
+        action, rest = args[0], args[1:]
+        positional, options = self._options(rest)
+        vmid = positional[0] if positional else None
+        qemu = self._node(f"/qemu/{vmid}")
+
+        if action == 'create':
+            self._call('POST', self._node('/qemu'), vmid=vmid, **options)
+        elif action == 'config':
+            data = self._call('GET', f"{qemu}/config")
+            return 0, "".join(f"{key}: {value}\n" for key, value in sorted(data.items())), ""
+        elif action == 'set':
+            self._call('PUT', f"{qemu}/config", **options)
+        elif action in ('start', 'stop', 'shutdown'):
+            self._call('POST', f"{qemu}/status/{action}")
+        elif action == 'guest':
+            # qm guest cmd <vmid> ping
+            vmid = positional[1]
+            self._call('POST', self._node(f"/qemu/{vmid}/agent/{positional[2]}"))
+        elif action == 'destroy':
+            self._call('DELETE', qemu)
+        elif action == 'template':
+            self._call('POST', f"{qemu}/template")
+        elif action == 'clone':
+            self._call('POST', f"{qemu}/clone", newid=positional[1], **options)
+        elif action == 'resize':
+            self._call('PUT', f"{qemu}/resize", disk=positional[1], size=positional[2])
+        elif action == 'importdisk':
+            image, storage = positional[1], positional[2]
+            with self.state.lock:
+                guest = self.state.guest(vmid, 'qemu')
+                count = sum(1 for key in guest['config'] if key.startswith('unused'))
+                disk = f"{storage}:vm-{vmid}-disk-{count}"
+                guest['config'][f"unused{count}"] = disk
+            return 0, f"importing disk '{image}' to VM {vmid} ...\nSuccessfully imported disk as '{disk}'\n", ""
+        elif action == 'listsnapshot':
+            lines = []
+            for depth, snapshot in enumerate(self._call('GET', f"{qemu}/snapshot")):
+                indent = "  " * depth
+                if snapshot['name'] == 'current':
+                    lines.append(f"{indent}`-> current{' ' * 16}{snapshot['description']}")
+                else:
+                    taken = datetime.fromtimestamp(snapshot['snaptime']).strftime('%Y-%m-%d %H:%M:%S')
+                    lines.append(f"{indent}`-> {snapshot['name']:<22} {taken}     {snapshot['description']}")
+            return 0, "\n".join(lines) + "\n", ""
+        elif action == 'snapshot':
+            self._call('POST', f"{qemu}/snapshot", snapname=positional[1], **options)
+        elif action == 'rollback':
+            self._call('POST', f"{qemu}/snapshot/{positional[1]}/rollback")
+        else:
+            return 255, "", f"unknown command 'qm {action}'\n"
+        return 0, "", ""
+
+    def _pct(self, args):
+        action, rest = args[0], args[1:]
+        if action == 'exec':
+            # pct exec <ctid> -- argv...
+            ctid, command = rest[0], rest[2:] if rest[1:2] == ['--'] else rest[1:]
+            with self.state.lock:
+                guest = self.state.guest(ctid, 'lxc')
+                running = guest['status'] == 'running'
+            if not running:
+                return 255, "", f"CT {ctid} not running\n"
+            # Services inside are up as soon as the container is
+            if 'is-active' in command:
+                return 0, "active\n", ""
+            return 0, "", ""
+
+        positional, options = self._options(rest)
+        ctid = positional[0]
+        lxc = self._node(f"/lxc/{ctid}")
+        if action == 'create':
+            self._call('POST', self._node('/lxc'), vmid=ctid, ostemplate=positional[1], **options)
+        elif action == 'start':
+            self._call('POST', f"{lxc}/status/start")
+        elif action == 'destroy':
+            self._call('DELETE', lxc)
+        elif action == 'status':
+            with self.state.lock:
+                status = self.state.guest(ctid, 'lxc')['status']
+            return 0, f"status: {status}\n", ""
+        else:
+            return 255, "", f"unknown command 'pct {action}'\n"
+        return 0, "", ""
+
+    def _pveam(self, args):
+        action = args[0]
+        if action == 'update':
+            return 0, "update successful\n", ""
+        if action == 'available':
+            return 0, "".join(f"{section:<16}{name}\n" for section, name in AVAILABLE_TEMPLATES), ""
+        if action == 'download':
+            storage, template = args[1], args[2]
+            if template not in [name for _, name in AVAILABLE_TEMPLATES]:
+                return 255, "", "400 Parameter verification failed.\ntemplate: no such template\n"
+            self._call('POST', self._node('/aplinfo'), storage=storage, template=template)
+            return 0, f"downloading http://download.proxmox.com/images/system/{template} to " \
+                      f"/var/lib/vz/template/cache/{template}\ncalculating checksum...OK\n", ""
+        return 255, "", f"unknown command 'pveam {action}'\n"
+
+    def _pvesh(self, args):
+        positional, options = self._options(args)
+        if positional[0] != 'get':
+            return 255, "", "simulated pvesh only answers 'get'\n"
+        data = self._call('GET', positional[1], **options)
+        if options.get('type') == 'vm' and isinstance(data, list):
+            data = [entry for entry in data if entry['type'] in ('qemu', 'lxc')]
+        return 0, json.dumps(data), ""
+
+    def _pveum(self, args):
+        # pveum user token add|remove <user> <name> ...
+        if args[:3] == ['user', 'token', 'remove']:
+            self.tokens.discard((args[3], args[4]))
+            return 0, "", ""
+        if args[:3] != ['user', 'token', 'add']:
+            return 0, "", ""
+        user, name = args[3], args[4]
+        if (user, name) in self.tokens:
+            return 255, "", f"update token failed: token '{name}' for user '{user}' already exists\n"
+        self.tokens.add((user, name))
+        value = "%08x-0000-4000-8000-%012x" % (self.random.getrandbits(32), self.random.getrandbits(48))
+        return 0, json.dumps({'full-tokenid': f"{user}!{name}", 'value': value, 'info': {'privsep': '0'}}), ""
+
+    def _lspci(self, args):
+        return 0, LSPCI, ""
+
+    def _boot_config(self, args):
+        return 0, "", "Generating boot files... done\n"
+
+if __name__ == "__main__":
+    import sys
+    from concurrent.futures import ThreadPoolExecutor
+    import executor as executor_module
+    from executor import Executor
+    from pveapi import CLIBackend
+
+    # Replays the host side of a deploy on the simulated node and shows
+    # where the time goes: simulator.py [speed]
+    speed = float(sys.argv[1]) if len(sys.argv) > 1 else 0.05
+    executor_module._executor = Executor(SimulatedBackend(speed=speed, seed=1))
+    pve = CLIBackend()
+
+    def guard():
+        ok = pve.template_update() and pve.template_download('local', AVAILABLE_TEMPLATES[2][1])
+        ok = ok and pve.ct_create(100, f"local:vztmpl/{AVAILABLE_TEMPLATES[2][1]}", hostname='guard', start=1)
+        return ok and pve.ct_exec(100, ['systemctl', 'is-active', 'cloudflared']) == "active\n"
+
+    def brain():
+        ok = pve.vm_create(200, name='brain', memory=16384, cores=8)
+        ok = ok and pve.vm_importdisk(200, '/var/lib/vz/images/cloud.img', 'local-lvm')
+        ok = ok and pve.vm_set(200, scsi0='local-lvm:vm-200-disk-0', agent='enabled=1')
+        ok = ok and pve.vm_resize(200, 'scsi0', '+100G') and pve.vm_start(200)
+        return ok and pve.vm_agent_ping(200)
+
+    started = time.monotonic()
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        # Status polls keep coming while the guests are built
+        jobs = [pool.submit(guard), pool.submit(brain)] + \
+               [pool.submit(pve.resources) for _ in range(8)]
+        results = [job.result() for job in jobs]
+    print(f"guard: {results[0]}  brain: {results[1]}  guests: {len(pve.resources() or [])}")
+
+    print(f"snapshot: {pve.snapshot(200, 'clean', 'after deploy')}  "
+          f"snapshots: {[s['name'] for s in pve.snapshots(200) or []]}")
+    print(f"destroy running VM (should fail): {pve.vm_destroy(200)}")
+    print(f"GPU line: {executor_module.executor().output(['lspci']).splitlines()[4]}")
+
+    print(f"\nSimulated at {speed}x in {time.monotonic() - started:.2f}s:")
+    print("\n".join(executor_module.executor().summary()))
@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+"""
+OOPUO Desktop Environment - SSH Connection Manager
+One multiplexed SSH connection per guest, shared by every remote call
+"""
+import os
+import time
+import shlex
+import hashlib
+import threading
+import subprocess
+from datetime import datetime
+from config import config, LOG_FILE
+
+# Seconds a master may go unused before a call checks it is still alive
+CHECK_AFTER = 30
+
+class SSHConnection:
+    """
+    ControlMaster connection to one user@ip with one key
+
+    The master is started on first use and left in the background
+    (ControlPersist), so other processes reaching the same guest (the
+    log pane, the viewport shell) find the socket and skip the handshake
+    as well. It exits by itself after `ssh.idle` seconds without a
+    client. Every command and copy runs as a client of the master, or
+    connects directly if the master cannot be started.
+    """
+
+    def __init__(self, ip, user, key_path):
+        self.ip = ip
+        self.user = user
+        self.key_path = key_path
+        self.idle = config.get('ssh.idle', 300)
+        self.connect_timeout = config.get('ssh.connect_timeout', 10)
+        control_dir = config.get('ssh.control_dir', '/tmp/oopuo-ssh')
+        # Short, fixed-length name: socket paths are limited to ~100 bytes
+        name = hashlib.sha256(f"{key_path}\0{user}\0{ip}".encode()).hexdigest()[:16]
+        self.control_path = os.path.join(control_dir, name)
+        self.lock = threading.Lock()
+        self.last_used = None
+
+    def log(self, msg):
+        """Write to log file"""
+        ts = datetime.now().strftime('%H:%M:%S')
+        with open(LOG_FILE, 'a') as f:
+            f.write(f"[SSH] [{ts}] {msg}\n")
+
+    @property
+    def target(self):
+        return f"{self.user}@{self.ip}"
+
+    def options(self):
+        """Options shared by ssh and scp (which passes them on to ssh)"""
+        return [
+            '-i', self.key_path,
+            # Guests are rebuilt at the same address with new host keys
+            '-o', 'StrictHostKeyChecking=no', '-o', 'UserKnownHostsFile=/dev/null',
+            '-o', 'LogLevel=ERROR', '-o', 'BatchMode=yes',
+            '-o', f"ConnectTimeout={self.connect_timeout}",
+            '-o', f"ControlPath={self.control_path}"
+        ]
+
+    def alive(self):
+        """True if the master is up and answering on its socket"""
+        if not os.path.exists(self.control_path):
+            return False
+        result = subprocess.run(
+            ['ssh', '-O', 'check', '-o', f"ControlPath={self.control_path}", self.target],
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        return result.returncode == 0
+
+    def start(self):
+        """
+        Start the master (returns once it is authenticated and backgrounded)
+
+        Its stdio goes to /dev/null: the backgrounded process would keep a
+        pipe open and make the caller wait for it to exit.
+        """
+        os.makedirs(os.path.dirname(self.control_path), mode=0o700, exist_ok=True)
+        started = time.monotonic()
+        try:
+            result = subprocess.run(
+                ['ssh', *self.options(),
+                 '-o', 'ControlMaster=yes', '-o', f"ControlPersist={self.idle}",
+                 '-o', 'ServerAliveInterval=15', '-o', 'ServerAliveCountMax=3',
+                 '-f', '-N', self.target],
+                stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                timeout=self.connect_timeout + 30
+            )
+        except subprocess.TimeoutExpired:
+            # Connected but stuck authenticating (e.g. sshd still starting
+            # on a booting guest): not up yet, same as a refused connection
+            self.log(f"Connecting to {self.target} timed out")
+            return False
+        if result.returncode != 0:
+            return False
+        self.log(f"Connected to {self.target} in {(time.monotonic() - started) * 1000:.0f}ms")
+        return True
+
+    def ensure(self):
+        """
+        Make sure the master is running; returns False if it could not be started
+
+        A recently used master is trusted without asking it; after
+        CHECK_AFTER seconds it may have timed out or lost the guest
+        (rebooted, rebuilt), so it is checked and replaced.
+        """
+        with self.lock:
+            now = time.monotonic()
+            if self.last_used is not None and now - self.last_used < CHECK_AFTER:
+                self.last_used = now
+                return True
+            if not self.alive():
+                self._exit()
+                if not self.start():
+                    self.last_used = None
+                    return False
+            self.last_used = time.monotonic()
+            return True
+
+    def argv(self, command=None):
+        """ssh command line that runs `command` (or a login shell) over the master"""
+        argv = ['ssh', *self.options(), '-o', 'ControlMaster=no', self.target]
+        if command is not None:
+            argv.append(command)
+        return argv
+
+    def command_line(self, command=None):
+        """argv() as one shell-quoted string, for tmux panes and wrapper scripts"""
+        return shlex.join(self.argv(command))
+
+    def run(self, command, timeout=None, check=False, capture=True, input=None):
+        """
+        Run a command on the guest
+
+        Returns:
+            subprocess.CompletedProcess (text; stderr merged into stdout
+            when capturing)
+        """
+        self.ensure()
+        output = dict(stdout=subprocess.PIPE, stderr=subprocess.STDOUT) if capture else {}
+        return subprocess.run(
+            self.argv(command), input=input, text=True, timeout=timeout, check=check,
+            stdin=None if input is not None else subprocess.DEVNULL, **output
+        )
+
+    def copy(self, local_path, remote_path, timeout=600):
+        """Copy a local file to the guest; returns True on success"""
+        self.ensure()
+        result = subprocess.run(
+            ['scp', '-q', *self.options(), '-o', 'ControlMaster=no',
+             local_path, f"{self.target}:{remote_path}"],
+            stdin=subprocess.DEVNULL, capture_output=True, text=True, timeout=timeout
+        )
+        if result.returncode != 0:
+            self.log(f"Copy to {self.target}:{remote_path} failed: {result.stderr.strip()}")
+        return result.returncode == 0
+
+    def _exit(self):
+        if not os.path.exists(self.control_path):
+            return
+        subprocess.run(
+            ['ssh', '-O', 'exit', '-o', f"ControlPath={self.control_path}", self.target],
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        # A master that died without cleaning up leaves its socket behind,
+        # and a new master refuses to start over it
+        try:
+            os.remove(self.control_path)
+        except OSError:
+            pass
+
+    def close(self):
+        """Stop the master (sessions running over it end with it)"""
+        with self.lock:
+            self._exit()
+            self.last_used = None
+
+class SSHManager:
+    """
+    Registry of SSH connections, one per (key, user, ip)
+
+    Defaults come from `credentials.*` and the Brain's address, so
+    `ssh_manager.connect()` is the Brain.
+    """
+
+    def __init__(self):
+        self.connections = {}
+        self.lock = threading.Lock()
+
+    def connect(self, ip=None, user=None, key_path=None):
+        """Connection to a guest (created on first use; the master starts lazily)"""
+        ip = ip or config.get('network.brain_ip')
+        user = user or config.get('credentials.user')
+        key_path = key_path or config.get('credentials.key_path')
+        with self.lock:
+            key = (key_path, user, ip)
+            if key not in self.connections:
+                self.connections[key] = SSHConnection(ip, user, key_path)
+            return self.connections[key]
+
+    def drop(self, ip):
+        """Close every connection to an address (its guest was stopped or destroyed)"""
+        with self.lock:
+            dropped = [conn for key, conn in self.connections.items() if key[2] == ip]
+            for conn in dropped:
+                del self.connections[(conn.key_path, conn.user, conn.ip)]
+        for conn in dropped:
+            conn.close()
+
+    def close_idle(self, idle=None):
+        """Close masters unused for `idle` seconds (default: ssh.idle)"""
+        idle = config.get('ssh.idle', 300) if idle is None else idle
+        now = time.monotonic()
+        with self.lock:
+            connections = list(self.connections.values())
+        for conn in connections:
+            if conn.last_used is not None and now - conn.last_used >= idle:
+                conn.close()
+
+    def close_all(self):
+        with self.lock:
+            connections = list(self.connections.values())
+            self.connections = {}
+        for conn in connections:
+            conn.close()
+
+# Global instance
+ssh_manager = SSHManager()
+
+if __name__ == "__main__":
+    import sys
+
+    ip = sys.argv[1] if len(sys.argv) > 1 else None
+    conn = ssh_manager.connect(ip)
+    if not conn.ensure():
+        print(f"Cannot connect to {conn.target}")
+        sys.exit(1)
+    for i in range(5):
+        started = time.monotonic()
+        result = conn.run('true')
+        print(f"  run {i + 1}: exit {result.returncode} in {(time.monotonic() - started) * 1000:.1f}ms")
+    print(f"Master socket: {conn.control_path}")
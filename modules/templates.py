@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+"""
+OOPUO Desktop Environment - Brain Templates
+Provision the Brain once as a Proxmox template, then deploy by cloning it
+"""
+import os
+import time
+from datetime import datetime
+from config import config, LOG_FILE
+from journal import fingerprint
+from downloader import file_digest
+from pve_status import pve_status, RUNNING
+from sshmux import ssh_manager
+
+# Template names: PREFIX + first 12 hex digits of the template key
+PREFIX = "oopuo-brain-"
+BUILD_PREFIX = "oopuo-build-"
+
+# Run on the build VM before it becomes a template, so every clone boots
+# as a new machine: cloud-init runs again (new hostname, address, user
+# keys), and Nomad/Consul start without the build VM's node identity
+GENERALIZE = (
+    "sudo systemctl stop nomad consul vault; "
+    "sudo rm -rf /opt/nomad/data/* /opt/consul/data/*; "
+    "sudo cloud-init clean --logs --seed; "
+    "sudo rm -f /etc/ssh/ssh_host_*; "
+    "sudo truncate -s 0 /etc/machine-id; "
+    "sudo rm -f /var/lib/dbus/machine-id; "
+    "sync"
+)
+
+class BrainTemplates:
+    """
+    Golden Brain templates
+
+    A template is a Brain VM built from the cloud image with the whole
+    stack payload installed, generalized and converted with `qm
+    template`. It is keyed by a hash of everything baked into it (the
+    payload, the local cloud image, the VM user), so it is reused until
+    one of those changes, and a deploy becomes a linked (or full) clone
+    plus fresh cloud-init settings. The image only changes when
+    download_assets refreshes it (explicit rebuild or
+    `assets.image_max_age_days`), not whenever Ubuntu republishes it;
+    the digest of the image a template was built from is in its
+    description. Older templates are garbage-collected, keeping
+    `templates.keep` of them; Proxmox refuses to delete a template that
+    linked clones still use, and those are kept as well.
+
+    Args:
+        engine: InfraEngine, for VM creation, SSH and the stack payload
+    """
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.pve = engine.pve
+        self._key = None
+
+    def log(self, msg):
+        """Write to log file"""
+        ts = datetime.now().strftime('%H:%M:%S')
+        with open(LOG_FILE, 'a') as f:
+            f.write(f"[TEMPLATE] [{ts}] {msg}\n")
+
+    def image_digest(self):
+        """sha256 of the cloud image the next build imports"""
+        from infra import CLOUD_IMAGE
+        return file_digest(CLOUD_IMAGE)
+
+    def key(self):
+        """Hash of the template's inputs (computed once per deployment)"""
+        if self._key is None:
+            from infra import STACK_HASH
+            self._key = fingerprint(
+                STACK_HASH,
+                self.image_digest(),
+                config.get('credentials.user')     # the payload installs into its home
+            )
+        return self._key
+
+    def name(self):
+        return PREFIX + self.key()[:12]
+
+    def templates(self):
+        """Every Brain template on the cluster: [(vmid, guest dict)]"""
+        guests = pve_status.all(max_age=0)
+        return sorted(
+            (vmid, guest) for vmid, guest in guests.items()
+            if guest['template'] and guest['name'].startswith(PREFIX)
+        )
+
+    def find(self):
+        """VMID of the template for the current inputs, or None"""
+        name = self.name()
+        for vmid, guest in self.templates():
+            if guest['name'] == name:
+                return vmid
+        return None
+
+    def free_vmid(self):
+        used = set(pve_status.all(max_age=0))
+        vmid = config.get('templates.vmid_base', 9000)
+        while vmid in used:
+            vmid += 1
+        return vmid
+
+    def ensure(self):
+        """VMID of an up-to-date template, building it first if needed"""
+        vmid = self.find()
+        if vmid is not None:
+            self.log(f"Using template {self.name()} ({vmid})")
+            return vmid
+
+        vmid = self.build()
+        self.gc()
+        return vmid
+
+    def build(self):
+        """
+        Provision a VM from scratch and turn it into the template
+
+        Boots at `network.build_ip`, so a running Brain is not disturbed.
+        """
+        vmid = self.free_vmid()
+        name = self.name()
+        ip = config.get('network.build_ip')
+        started = time.monotonic()
+        image = self.image_digest()
+        self.log(f"Building template {name} as VM {vmid} (key {self.key()[:12]}, image {image[:12]})")
+
+        try:
+            self.engine.create_cloud_vm(vmid, BUILD_PREFIX + self.key()[:12], ip)
+            if not self.engine.wait_until_ready(vmid, ip):
+                raise RuntimeError(f"build VM {vmid} never became ready at {ip}")
+            self.engine.run_stack_payload(ip, step='template')
+
+            self.log("Generalizing build VM...")
+            self.engine.ssh(GENERALIZE, ip)
+            if not self.pve.vm_shutdown(vmid):
+                self.pve.vm_stop(vmid)
+            ssh_manager.drop(ip)
+
+            self.pve.vm_set(vmid, name=name,
+                            description=f"OOPUO Brain template, key {self.key()}, image sha256 {image}")
+            if not self.pve.vm_template(vmid):
+                raise RuntimeError(f"converting VM {vmid} to a template failed")
+        except Exception:
+            # Nothing half-built stays behind to be mistaken for a template
+            self.pve.vm_stop(vmid)
+            self.pve.vm_destroy(vmid)
+            ssh_manager.drop(ip)
+            raise
+        finally:
+            pve_status.invalidate()
+
+        self.log(f"Template {name} ready in {time.monotonic() - started:.0f}s")
+        return vmid
+
+    def clone(self, template, vmid, name):
+        """Clone a template into a new VM (linked unless templates.clone is "full")"""
+        full = config.get('templates.clone', 'linked') == 'full'
+        ok = self.pve.vm_clone(template, vmid, name, full=full)
+        pve_status.invalidate()
+        return ok
+
+    def gc(self, keep=None):
+        """
+        Remove old templates and leftover builds
+
+        Keeps the current template and the newest others up to `keep`
+        in total (higher VMIDs are not necessarily newer, so the build
+        order comes from the templates' creation times in Proxmox).
+        """
+        keep = config.get('templates.keep', 2) if keep is None else keep
+        current = self.name()
+        guests = pve_status.all(max_age=0)
+
+        # Builds that died with the process that ran them
+        for vmid, guest in guests.items():
+            if guest['name'].startswith(BUILD_PREFIX) and not guest['template']:
+                self.log(f"Removing abandoned build VM {vmid}")
+                if guest['state'] == RUNNING:
+                    self.pve.vm_stop(vmid)
+                self.pve.vm_destroy(vmid)
+                self._remove_snippet(vmid)
+
+        templates = self.templates()
+        ctimes = {}
+        for vmid, guest in templates:
+            vm_config = self.pve.vm_config(vmid) or {}
+            # meta: creation-qemu=...,ctime=1714564805
+            ctime = vm_config.get('meta', '').rpartition('ctime=')[2]
+            ctimes[vmid] = int(ctime) if ctime.isdigit() else vmid
+        newest = sorted(templates, key=lambda item: (item[1]['name'] != current, -ctimes[item[0]]))
+
+        for vmid, guest in newest[keep:]:
+            self.log(f"Removing old template {guest['name']} ({vmid})")
+            if self.pve.vm_destroy(vmid):
+                self._remove_snippet(vmid)
+            else:
+                self.log(f"Template {vmid} kept (linked clones still use it)")
+        pve_status.invalidate()
+
+    def _remove_snippet(self, vmid):
+        try:
+            os.remove(f"/var/lib/vz/snippets/user-data-{vmid}.yaml")
+        except OSError:
+            pass
+
+if __name__ == "__main__":
+    from infra import InfraEngine
+
+    templates = InfraEngine().templates
+    print(f"Current template: {templates.name()}")
+    for vmid, guest in templates.templates():
+        marker = "*" if guest['name'] == templates.name() else " "
+        print(f"  {marker} {vmid:>6}  {guest['name']}")
@@ -3,137 +3,103 @@
 OOPUO Desktop Environment - Time Machine
 Git-like snapshot system for VM rollback
 """
-import sys
 import os
-import subprocess
-import shutil
 import tty
 import termios
-import select
 from datetime import datetime
 from colors import col, box_chars, bold, C_PRIMARY, C_SUCCESS, C_ERROR, C_MUTED, C_TEXT, C_ACCENT
 from config import config
+from screen import Screen
+from eventloop import EventLoop, KEY_UP, KEY_DOWN, KEY_ENTER
+from pve_status import pve_status
+from pveapi import proxmox
 
 class TimeMachine:
     """Snapshot management interface"""
     
-    def __init__(self):
+    def __init__(self, loop=None, screen=None):
         self.vmid = config.get('ids.brain_vm', 200)
         self.snapshots = []
+        self.guest = None       # cached /cluster/resources entry for the VM
+        self.pve = proxmox()
         self.selected_idx = 0
         self.running = True
-        self.width, self.height = shutil.get_terminal_size()
+        self.status = ""        # bottom status line, kept across frames
+        self.confirming = None  # snapshot awaiting a y/N rollback answer
+        self.loop = loop or EventLoop()
+        self.screen = screen or Screen()
+        self.width, self.height = self.screen.resize(*self.loop.size)
     
     def get_snapshots(self):
         """Get list of snapshots for the VM"""
-        try:
-            result = subprocess.run(
-                f"qm listsnapshot {self.vmid}",
-                shell=True,
-                capture_output=True,
-                text=True,
-                timeout=5
-            )
-            
-            if result.returncode != 0:
-                return []
-            
-            # Parse output
-            # Format: snapname `-> description
-            snapshots = []
-            lines = result.stdout.strip().split('\n')
-            
-            for line in lines:
-                if '`->' in line:
-                    parts = line.split('`->')
-                    name = parts[0].strip()
-                    desc = parts[1].strip() if len(parts) > 1 else ""
-                    
-                    # Try to parse timestamp from name
-                    timestamp = "Unknown"
-                    if 'auto-snap-' in name:
-                        try:
-                            # Format: auto-snap-YYYY-MM-DD_HH:MM
-                            date_part = name.replace('auto-snap-', '')
-                            timestamp = date_part.replace('_', ' ')
-                        except:
-                            pass
-                    
-                    snapshots.append({
-                        'name': name,
-                        'description': desc,
-                        'timestamp': timestamp
-                    })
-            
-            return snapshots
-        
-        except Exception as e:
+        snapshots = self.pve.snapshots(self.vmid)
+        if snapshots is None:
             return []
+        
+        for snap in snapshots:
+            timestamp = "Unknown"
+            if snap['snaptime']:
+                timestamp = datetime.fromtimestamp(snap['snaptime']).strftime('%Y-%m-%d %H:%M')
+            elif snap['name'].startswith('auto-snap-'):
+                # Format: auto-snap-YYYY-MM-DD_HH-MM (older ones: _HH:MM)
+                date_part, _, time_part = snap['name'].replace('auto-snap-', '').partition('_')
+                timestamp = f"{date_part} {time_part.replace('-', ':')}"
+            snap['timestamp'] = timestamp
+        
+        return snapshots
     
     def create_snapshot(self):
         """Create a new snapshot"""
         timestamp = datetime.now().strftime('%Y-%m-%d_%H:%M')
-        name = f"auto-snap-{timestamp}"
+        # Snapshot names may not contain ':'
+        name = f"auto-snap-{timestamp}".replace(':', '-')
         desc = f"Manual snapshot created at {timestamp}"
         
-        try:
-            subprocess.run(
-                f"qm snapshot {self.vmid} {name} --description '{desc}'",
-                shell=True,
-                timeout=30
-            )
-            return True
-        except:
-            return False
+        return self.pve.snapshot(self.vmid, name, desc)
     
     def rollback_snapshot(self, snapshot_name):
         """Rollback to a specific snapshot"""
-        try:
-            # Stop VM
-            subprocess.run(f"qm stop {self.vmid}", shell=True, timeout=30)
-            
-            # Rollback
-            subprocess.run(
-                f"qm rollback {self.vmid} {snapshot_name}",
-                shell=True,
-                timeout=30
-            )
-            
-            # Start VM
-            subprocess.run(f"qm start {self.vmid}", shell=True, timeout=30)
-            
-            return True
-        except:
+        # Stopping an already stopped VM fails harmlessly
+        self.pve.vm_stop(self.vmid)
+        
+        if not self.pve.rollback(self.vmid, snapshot_name):
             return False
+        
+        return self.pve.vm_start(self.vmid)
+    
+    def refresh(self):
+        """Re-read snapshots and VM status after a change"""
+        pve_status.invalidate()
+        self.snapshots = self.get_snapshots()
+        self.guest = pve_status.guest(self.vmid)
     
     def render(self):
         """Render the time machine interface"""
-        self.width, self.height = shutil.get_terminal_size()
-        
-        # Clear screen
-        sys.stdout.write("\033[H\033[J")
+        self.width, self.height = self.screen.resize(*self.loop.size)
+        screen = self.screen
+        screen.clear()
         
         box = box_chars('double')
         
         # Header
-        sys.stdout.write("\033[2;2H")
         title = bold(col("═══ TIME MACHINE ═══", C_PRIMARY))
-        sys.stdout.write(title)
+        screen.draw(2, 2, title)
         
-        sys.stdout.write("\033[3;2H")
-        subtitle = col(f"VM {self.vmid}: {len(self.snapshots)} snapshots available", C_MUTED)
-        sys.stdout.write(subtitle)
+        vm = f"VM {self.vmid}"
+        if self.guest:
+            vm += f" ({self.guest['name']}, {self.guest['status']}"
+            vm += f", locked: {self.guest['lock']})" if self.guest['lock'] else ")"
+        subtitle = col(f"{vm}: {len(self.snapshots)} snapshots available", C_MUTED)
+        screen.draw(3, 2, subtitle)
         
         # Instructions
-        sys.stdout.write("\033[5;2H")
-        sys.stdout.write(col("↑/↓ Navigate  |  Enter: Rollback  |  N: New Snapshot  |  Q: Quit", C_TEXT))
+        screen.draw(5, 2, col("↑/↓ Navigate  |  Enter: Rollback  |  N: New Snapshot  |  Q: Quit", C_TEXT))
         
         # Snapshot list
         list_start_y = 7
         
         if not self.snapshots:
-            sys.stdout.write(f"\033[{list_start_y};2H")
-            sys.stdout.write(col("No snapshots found. Press 'N' to create one.", C_MUTED))
+            screen.draw(list_start_y, 2, col("No snapshots found. Press 'N' to create one.", C_MUTED))
         else:
             for i, snap in enumerate(self.snapshots):
                 current_y = list_start_y + i
@@ -141,8 +107,6 @@ class TimeMachine:
                 if current_y >= self.height - 2:
                     break
                 
-                sys.stdout.write(f"\033[{current_y};2H")
-                
                 if i == self.selected_idx:
                     # Selected
                     prefix = "➜ "
@@ -155,81 +119,91 @@ class TimeMachine:
                 desc_text = col(snap['description'][:40], C_MUTED)
                 
                 line = f"{prefix}{name_text}  {time_text}  {desc_text}"
-                sys.stdout.write(line)
+                screen.draw(current_y, 2, line)
+        
+        if self.status:
+            screen.draw(self.height-1, 2, self.status)
         
-        sys.stdout.flush()
+        screen.flush()
+    
+    def show_status(self, text):
+        """Set the status line and repaint immediately (before blocking work)"""
+        self.status = text
+        self.render()
     
     def handle_input(self, key):
         """Handle keyboard input"""
-        if key.lower() == 'q':
+        if self.confirming:
+            self.confirm_rollback(key)
+        
+        elif key.lower() == 'q':
             self.running = False
         
         elif key.lower() == 'n':
             # Create new snapshot
-            sys.stdout.write(f"\033[{self.height-1};2H")
-            sys.stdout.write(col("Creating snapshot...", C_TEXT))
-            sys.stdout.flush()
+            self.show_status(col("Creating snapshot...", C_TEXT))
             
             if self.create_snapshot():
-                self.snapshots = self.get_snapshots()
-                sys.stdout.write(f"\033[{self.height-1};2H")
-                sys.stdout.write(col("✓ Snapshot created!  ", C_SUCCESS))
+                self.refresh()
+                self.show_status(col("✓ Snapshot created!", C_SUCCESS))
             else:
-                sys.stdout.write(f"\033[{self.height-1};2H")
-                sys.stdout.write(col("✗ Failed to create   ", C_ERROR))
+                self.show_status(col("✗ Failed to create", C_ERROR))
         
-        elif key == '\x1b':  # Escape sequence
-            next_chars = sys.stdin.read(2)
-            if next_chars == '[A':  # Up
-                self.selected_idx = max(0, self.selected_idx - 1)
-            elif next_chars == '[B':  # Down
-                self.selected_idx = min(len(self.snapshots) - 1, self.selected_idx + 1)
+        elif key == KEY_UP:
+            self.selected_idx = max(0, self.selected_idx - 1)
         
-        elif key == '\r' or key == '\n':  # Enter
+        elif key == KEY_DOWN:
+            self.selected_idx = min(len(self.snapshots) - 1, self.selected_idx + 1)
+        
+        elif key in KEY_ENTER:
             if self.snapshots and 0 <= self.selected_idx < len(self.snapshots):
                 snap = self.snapshots[self.selected_idx]
                 
-                # Confirm
-                sys.stdout.write(f"\033[{self.height-1};2H")
-                sys.stdout.write(col(f"Rollback to {snap['name']}? (y/N): ", C_TEXT))
-                sys.stdout.flush()
-                
-                confirm = sys.stdin.read(1)
-                if confirm.lower() == 'y':
-                    sys.stdout.write(f"\033[{self.height-1};2H")
-                    sys.stdout.write(col("Rolling back... (VM will restart)", C_TEXT))
-                    sys.stdout.flush()
-                    
-                    if self.rollback_snapshot(snap['name']):
-                        sys.stdout.write(f"\033[{self.height-1};2H")
-                        sys.stdout.write(col("✓ Rollback complete!              ", C_SUCCESS))
-                    else:
-                        sys.stdout.write(f"\033[{self.height-1};2H")
-                        sys.stdout.write(col("✗ Rollback failed                 ", C_ERROR))
+                # Confirm (answered by the next key)
+                self.confirming = snap
+                self.status = col(f"Rollback to {snap['name']}? (y/N): ", C_TEXT)
+    
+    def confirm_rollback(self, key):
+        """Answer to the rollback prompt"""
+        snap = self.confirming
+        self.confirming = None
+        
+        if key.lower() == 'y':
+            self.show_status(col("Rolling back... (VM will restart)", C_TEXT))
+            
+            if self.rollback_snapshot(snap['name']):
+                self.refresh()
+                self.show_status(col("✓ Rollback complete!", C_SUCCESS))
+            else:
+                self.show_status(col("✗ Rollback failed", C_ERROR))
+        else:
+            self.status = ""
+    
+    def stop(self):
+        """Leave the main loop (safe to call from another thread)"""
+        self.running = False
+        self.loop.stop()
     
     def run(self):
         """Main loop"""
         # Load snapshots
         self.snapshots = self.get_snapshots()
+        self.guest = pve_status.guest(self.vmid)
         
         # Setup terminal
-        fd = sys.stdin.fileno()
+        fd = self.loop.fd
         old_settings = termios.tcgetattr(fd)
         
         try:
             tty.setraw(fd)
-            sys.stdout.write("\033[?25l")  # Hide cursor
+            self.screen.out.write("\033[?25l")  # Hide cursor
             
-            while self.running:
-                self.render()
-                
-                if select.select([sys.stdin], [], [], 0.1)[0]:
-                    key = sys.stdin.read(1)
-                    self.handle_input(key)
+            self.loop.run(self.render, self.handle_input, lambda: self.running)
         
         finally:
             termios.tcsetattr(fd, termios.TCSADRAIN, old_settings)
-            sys.stdout.write("\033[?25h")  # Show cursor
+            self.screen.out.write("\033[?25h")  # Show cursor
+            self.screen.out.flush()
 
 if __name__ == "__main__":
     tm = TimeMachine()
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+OOPUO Desktop Environment - Time Series Store
+Fixed-size ring buffers for metric history
+"""
+import time
+from array import array
+
+class RingBuffer:
+    """
+    Fixed-capacity float32 series with float64 timestamps
+
+    Appends are O(1) and never allocate. Windows are returned as memoryview
+    segments over the backing arrays (two segments when the window wraps).
+    """
+
+    def __init__(self, capacity=10800):
+        self.capacity = capacity
+        self.values = array('f', bytes(4 * capacity))
+        self.stamps = array('d', bytes(8 * capacity))
+        self.head = 0       # next write slot
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def append(self, value, ts=None):
+        """Store one sample, overwriting the oldest when full"""
+        self.values[self.head] = value
+        self.stamps[self.head] = ts if ts is not None else time.time()
+        self.head = (self.head + 1) % self.capacity
+        if self.count < self.capacity:
+            self.count += 1
+
+    def _physical(self, i):
+        """Map logical index (0 = oldest) to a slot in the backing arrays"""
+        return (self.head - self.count + i) % self.capacity
+
+    def last(self):
+        """Return (timestamp, value) of the newest sample or None"""
+        if not self.count:
+            return None
+        i = (self.head - 1) % self.capacity
+        return self.stamps[i], self.values[i]
+
+    def _first_since(self, since):
+        """Logical index of the first sample with timestamp >= since"""
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.stamps[self._physical(mid)] < since:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def window(self, seconds=None, count=None, now=None):
+        """
+        Zero-copy view of the newest samples
+
+        Args:
+            seconds: Only samples newer than now - seconds
+            count: At most this many samples
+
+        Returns:
+            List of (stamps_view, values_view) memoryview segments, oldest first
+        """
+        start = 0
+        if seconds is not None:
+            start = self._first_since((now if now is not None else time.time()) - seconds)
+        if count is not None:
+            start = max(start, self.count - count)
+        if start >= self.count:
+            return []
+
+        first = self._physical(start)
+        length = self.count - start
+        stamps = memoryview(self.stamps)
+        values = memoryview(self.values)
+
+        if first + length <= self.capacity:
+            return [(stamps[first:first + length], values[first:first + length])]
+
+        split = self.capacity - first
+        return [
+            (stamps[first:], values[first:]),
+            (stamps[:length - split], values[:length - split])
+        ]
+
+    def tail(self, count):
+        """Copy of the newest `count` values as a list (for sparklines)"""
+        out = []
+        for _, values in self.window(count=count):
+            out.extend(values.tolist())
+        return out
+
+    def stats(self, seconds=None, count=None):
+        """
+        Summary statistics over a window
+
+        Returns:
+            Dict with min, max, avg, p95 and n (empty dict if no samples)
+        """
+        segments = self.window(seconds=seconds, count=count)
+        n = sum(len(values) for _, values in segments)
+        if not n:
+            return {}
+
+        lo = min(min(values) for _, values in segments)
+        hi = max(max(values) for _, values in segments)
+        total = sum(sum(values) for _, values in segments)
+
+        # p95 needs an order statistic - the only step that copies
+        ordered = sorted(v for _, values in segments for v in values)
+        p95 = ordered[min(n - 1, int(0.95 * n))]
+
+        return {'min': lo, 'max': hi, 'avg': total / n, 'p95': p95, 'n': n}
+
+class SeriesStore:
+    """Named collection of ring buffers, one per metric series"""
+
+    def __init__(self, capacity=10800):
+        self.capacity = capacity
+        self.series = {}
+
+    def buffer(self, name):
+        """Get (or lazily create) the buffer for a series"""
+        buf = self.series.get(name)
+        if buf is None:
+            buf = self.series[name] = RingBuffer(self.capacity)
+        return buf
+
+    def append(self, name, value, ts=None):
+        self.buffer(name).append(value, ts)
+
+    def record(self, values, ts=None):
+        """Append a dict of {series: value} sharing one timestamp"""
+        ts = ts if ts is not None else time.time()
+        for name, value in values.items():
+            self.buffer(name).append(value, ts)
+
+    def tail(self, name, count):
+        return self.buffer(name).tail(count)
+
+    def stats(self, name, seconds=None, count=None):
+        return self.buffer(name).stats(seconds=seconds, count=count)
+
+    def nbytes(self):
+        """Memory held by all buffers"""
+        return sum(
+            b.values.itemsize * b.capacity + b.stamps.itemsize * b.capacity
+            for b in self.series.values()
+        )
@@ -0,0 +1,351 @@
+#!/usr/bin/env python3
+"""
+OOPUO Desktop Environment - Single-Process TUI Host
+One asyncio process drives the header, sidebar and main panes
+"""
+import os
+import tty
+import asyncio
+import threading
+from config import config, LOG_FILE
+from executor import executor
+from ipc import ipc
+from screen import Screen
+from eventloop import EventLoop
+from viewport import ViewportManager
+from metrics import MetricsRenderer
+from controller import Controller
+from dashboard import Dashboard
+from timemachine import TimeMachine
+from settings import Settings
+
+# Keeps a pane (and its tty) alive without ever reading from it
+PARK_COMMAND = "trap '' INT QUIT TSTP; exec sleep infinity"
+
+# Pane size check interval (SIGWINCH goes to the pane's sleep, not to us)
+RESIZE_POLL = 0.5
+
+PANES = ('header', 'sidebar', 'main')
+
+def tmux(*args):
+    """Run a tmux command; returns its stdout, or None on failure"""
+    output = executor().output(['tmux', *args], quiet=True)
+    return output.strip() if output is not None else None
+
+class Pane:
+    """A tmux pane whose tty the host reads keys from and draws on"""
+
+    def __init__(self, name, target):
+        self.name = name
+        self.target = target
+        self.fd = None
+        self.out = None
+        self.size = None
+        self.view = None        # view running on the pane's tty
+        self.thread = None
+
+    def spawn(self, command=PARK_COMMAND):
+        """Replace the pane's process (the host lets go of the tty first)"""
+        self.close()
+        return tmux('respawn-pane', '-k', '-t', self.target, command) is not None
+
+    def open(self):
+        """Open the pane's tty in raw mode"""
+        path = tmux('display-message', '-p', '-t', self.target, '#{pane_tty}')
+        if not path:
+            raise OSError(f"no tty for pane {self.target}")
+        self.fd = os.open(path, os.O_RDWR | os.O_NOCTTY)
+        tty.setraw(self.fd)
+        self.out = open(self.fd, 'w', encoding='utf-8', errors='replace', closefd=False)
+        self.size = self.query_size()
+
+    def query_size(self):
+        return os.get_terminal_size(self.fd)
+
+    def close(self):
+        if self.fd is None:
+            return
+        try:
+            self.out.close()
+        except OSError:
+            pass
+        os.close(self.fd)
+        self.fd = self.out = None
+
+class ReadyView:
+    """Idle main pane: the ready banner, or a one-line message"""
+
+    def __init__(self, message="[ VIEWPORT READY ]", loop=None, screen=None):
+        self.message = message
+        self.running = True
+        self.loop = loop or EventLoop()
+        self.screen = screen or Screen()
+
+    def render(self):
+        screen = self.screen
+        screen.resize(*self.loop.size)
+        screen.clear()
+        screen.draw(1, 1, self.message)
+        screen.flush()
+
+    def stop(self):
+        self.running = False
+        self.loop.stop()
+
+    def run(self):
+        # Keys typed here are swallowed instead of queueing up for the next view
+        self.screen.out.write("\033[?25l")
+        self.loop.run(self.render, lambda key: None, lambda: self.running)
+
+class HostViewport(ViewportManager):
+    """
+    Viewport commands served in-process
+
+    Built-in views replace each other on the main pane's tty without a
+    new interpreter; shell commands (SSH, pct enter, logs) still get the
+    pane to themselves and the host takes it back when they exit.
+    """
+
+    def __init__(self, host):
+        super().__init__()
+        self.host = host
+
+    def inject(self, command):
+        """Run a shell command in the main pane"""
+        return self.host.run_external(command)
+
+    def clear_pane(self):
+        pass    # every view repaints the whole pane
+
+    def show_ready(self):
+        self.host.show_view(ReadyView)
+        self.current_view = "READY"
+
+    def show_message(self, msg):
+        self.host.show_view(lambda **pane: ReadyView(msg, **pane))
+
+    def show_dashboard(self):
+        self.host.show_view(Dashboard)
+        self.current_view = "DASHBOARD"
+
+    def show_timemachine(self):
+        self.host.show_view(TimeMachine)
+        self.current_view = "TIMEMACHINE"
+
+    def show_settings(self):
+        self.host.show_view(Settings)
+        self.current_view = "SETTINGS"
+
+    def disconnect(self):
+        """Close the current view, or interrupt the running shell command"""
+        self.log("Disconnecting current view")
+        if self.host.external:
+            # The command's wrapper signals on exit and the host shows READY
+            tmux('send-keys', '-t', self.main_pane, 'C-c')
+        else:
+            self.show_ready()
+
+class TuiHost:
+    """
+    Drives the header, sidebar and main panes from one process
+
+    Each pane is parked on `sleep infinity` and the host opens its tty;
+    the usual views run on it, each with its EventLoop on a thread of
+    its own. Config, colors, the snapshot reader, local collectors and
+    the health prober are loaded once, and switching the main view is a
+    thread hand-over instead of a new interpreter. asyncio supervises:
+    viewport commands (from the sidebar or the FIFO) are handled one at
+    a time, pane sizes are watched, and shell commands in the main pane
+    are awaited with `tmux wait-for`.
+    """
+
+    def __init__(self):
+        self.panes = {
+            name: Pane(name, config.get(f'panes.{name}', f'oopuo-desktop:0.{i}'))
+            for i, name in enumerate(PANES)
+        }
+        self.viewport = HostViewport(self)
+        self.external = None    # wait-for channel while a shell command owns main
+        self.runs = 0
+        self.aio = None
+        self.commands = None
+        self.done = None
+
+    def log(self, msg):
+        """Write to log file"""
+        with open(LOG_FILE, 'a') as f:
+            f.write(f"[TUIHOST] {msg}\n")
+
+    def command(self, command):
+        """Queue a viewport command (thread-safe; the sidebar's send)"""
+        self.aio.call_soon_threadsafe(self.commands.put_nowait, command)
+
+    # ----- pane views (command thread) -----
+
+    def start_view(self, pane, view):
+        """Run a view's blocking loop on its own thread"""
+        def target():
+            try:
+                view.run()
+            except Exception as e:
+                self.log(f"{pane.name} view failed: {e}")
+            finally:
+                self.aio.call_soon_threadsafe(self._view_ended, pane, view)
+
+        pane.view = view
+        pane.thread = threading.Thread(target=target, name=f"pane-{pane.name}", daemon=True)
+        pane.thread.start()
+
+    def stop_view(self, pane):
+        view, thread = pane.view, pane.thread
+        pane.view = pane.thread = None
+        if view is not None:
+            view.stop()
+            thread.join()
+            # Each view got its own loop; close its wake pipe
+            loop = getattr(view, 'loop', None)
+            if loop is not None:
+                loop.close()
+
+    def _release_external(self):
+        """Stop waiting for a shell command (its pane is about to be respawned)"""
+        channel, self.external = self.external, None
+        if channel:
+            tmux('wait-for', '-S', channel)
+
+    def show_view(self, factory):
+        """Replace the main view with `factory(loop=..., screen=...)`"""
+        main = self.panes['main']
+        self.stop_view(main)
+        if self.external or main.fd is None:
+            self._release_external()
+            main.spawn()
+            main.open()
+        view = factory(loop=EventLoop(main.fd), screen=Screen(out=main.out))
+        self.start_view(main, view)
+
+    def run_external(self, command):
+        """Hand the main pane to a shell command until it exits"""
+        main = self.panes['main']
+        self.stop_view(main)
+        self._release_external()
+
+        self.runs += 1
+        channel = f"oopuo-main-{os.getpid()}-{self.runs}"
+        # `trap :` keeps the wrapper alive when Ctrl+C ends the command
+        if not main.spawn(f"trap : INT; {command}; tmux wait-for -S {channel}; {PARK_COMMAND}"):
+            self.log(f"Could not start: {command}")
+            return False
+        self.external = channel
+        asyncio.run_coroutine_threadsafe(self._await_external(channel), self.aio)
+        return True
+
+    def reclaim_main(self, channel):
+        """The shell command exited: take the tty back and show READY"""
+        if self.external != channel:
+            return
+        self.external = None
+        self.panes['main'].open()
+        self.viewport.show_ready()
+
+    # ----- asyncio side -----
+
+    def _view_ended(self, pane, view):
+        """A view returned on its own (not stopped by the host)"""
+        if pane.view is not view:
+            return
+        if pane.name == 'sidebar':
+            self.done.set()
+        elif pane.name == 'main':
+            self.commands.put_nowait((self.viewport.show_ready,))
+
+    async def _await_external(self, channel):
+        proc = await asyncio.create_subprocess_exec('tmux', 'wait-for', channel)
+        await proc.wait()
+        self.commands.put_nowait((self.reclaim_main, channel))
+
+    async def handle_commands(self):
+        """Serve queued commands one at a time off the asyncio thread"""
+        while True:
+            item = await self.commands.get()
+            if isinstance(item, str):
+                func, args = self.viewport.handle_command, (item,)
+            else:
+                func, *args = item
+            try:
+                await asyncio.to_thread(func, *args)
+            except Exception as e:
+                self.log(f"Command {item} failed: {e}")
+
+    async def watch_sizes(self):
+        """Forward pane resizes to the view running on each pane"""
+        while True:
+            await asyncio.sleep(RESIZE_POLL)
+            for pane in self.panes.values():
+                view = pane.view
+                if pane.fd is None or view is None:
+                    continue
+                try:
+                    size = pane.query_size()
+                except OSError:
+                    continue
+                if size != pane.size:
+                    pane.size = size
+                    # The header re-reads its size every frame
+                    loop = getattr(view, 'loop', None)
+                    if loop is not None:
+                        loop.notify_resize()
+
+    def setup(self):
+        for pane in self.panes.values():
+            # A pane whose process dies stays in the layout and can be respawned
+            tmux('set-option', '-p', '-t', pane.target, 'remain-on-exit', 'on')
+            pane.spawn()
+            pane.open()
+
+        header, sidebar = self.panes['header'], self.panes['sidebar']
+        self.start_view(header, MetricsRenderer(screen=Screen(out=header.out)))
+        self.start_view(sidebar, Controller(
+            loop=EventLoop(sidebar.fd),
+            screen=Screen(out=sidebar.out),
+            send=self.command
+        ))
+        self.viewport.show_ready()
+
+    def teardown(self):
+        """Stop every view and give the panes back to a shell"""
+        self._release_external()
+        shell = tmux('show-options', '-gv', 'default-shell') or '/bin/sh'
+        for pane in self.panes.values():
+            self.stop_view(pane)
+            pane.spawn(shell)
+
+    async def main(self):
+        self.aio = asyncio.get_running_loop()
+        self.commands = asyncio.Queue()
+        self.done = asyncio.Event()
+
+        await asyncio.to_thread(self.setup)
+        # External senders (scripts, older panes) still reach the viewport
+        threading.Thread(target=ipc.listen, args=(self.command,), name="ipc", daemon=True).start()
+
+        tasks = [
+            asyncio.create_task(self.handle_commands()),
+            asyncio.create_task(self.watch_sizes())
+        ]
+        await self.done.wait()
+        for task in tasks:
+            task.cancel()
+        await asyncio.to_thread(self.teardown)
+
+    def run(self):
+        self.log("TUI host started")
+        try:
+            asyncio.run(self.main())
+        except KeyboardInterrupt:
+            pass
+        self.log("TUI host stopped")
+
+if __name__ == "__main__":
+    host = TuiHost()
+    host.run()
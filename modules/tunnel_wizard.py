@@ -3,15 +3,14 @@
 OOPUO Desktop Environment - Cloudflare Tunnel Setup Wizard
 Step-by-step guide for connecting Guard LXC to Cloudflare
 """
-import sys
 import os
-import subprocess
-import shutil
 import tty
 import termios
-import select
 from colors import col, box_chars, bold, C_PRIMARY, C_SUCCESS, C_ERROR, C_MUTED, C_TEXT, C_ACCENT
 from config import config
+from executor import executor
+from screen import Screen
+from eventloop import EventLoop, KEY_ENTER
 
 class TunnelWizard:
     """Interactive Cloudflare Tunnel setup wizard"""
@@ -49,84 +48,80 @@ class TunnelWizard:
         }
     ]
     
-    def __init__(self):
+    def __init__(self, screen=None, loop=None):
         self.current_step = 0
         self.running = True
         self.guard_id = config.get('ids.guard_ct', 100)
-        self.width, self.height = shutil.get_terminal_size()
+        self.status = ""        # step result line, kept across frames
+        self.notice = ""        # e.g. the login URL during authentication
+        self.loop = loop or EventLoop()
+        self.screen = screen or Screen()
+        self.width, self.height = self.screen.resize(*self.loop.size)
     
     def exec_in_guard(self, command):
-        """Execute command in Guard container"""
-        try:
-            result = subprocess.run(
-                f"pct exec {self.guard_id} -- {command}",
-                shell=True,
-                capture_output=True,
-                text=True,
-                timeout=60
-            )
-            return result.returncode == 0, result.stdout, result.stderr
-        except Exception as e:
-            return False, "", str(e)
+        """Execute a shell command line in Guard container"""
+        # The whole line (&&, redirections) runs in the container's shell,
+        # not the host's
+        result = executor().run(['pct', 'exec', str(self.guard_id), '--', 'bash', '-c', command], timeout=60)
+        return result.ok, result.stdout, result.stderr or (result.error or "")
     
     def render(self):
         """Render the wizard UI"""
-        self.width, self.height = shutil.get_terminal_size()
-        
-        # Clear screen
-        sys.stdout.write("\033[H\033[J")
+        self.width, self.height = self.screen.resize(*self.loop.size)
+        screen = self.screen
+        screen.clear()
         
         box = box_chars('rounded')
         
         # Title
-        sys.stdout.write("\033[2;2H")
         title = bold(col("╔═══════════════════════════════════════╗", C_PRIMARY))
-        sys.stdout.write(title)
+        screen.draw(2, 2, title)
         
-        sys.stdout.write("\033[3;2H")
-        sys.stdout.write(col("║", C_PRIMARY) + "                                       " + col("║", C_PRIMARY))
+        screen.draw(3, 2, col("║", C_PRIMARY) + "                                       " + col("║", C_PRIMARY))
         
-        sys.stdout.write("\033[4;2H")
         wizard_title = "  🔗 CLOUDFLARE TUNNEL SETUP WIZARD  "
-        sys.stdout.write(col("║", C_PRIMARY) + bold(col(wizard_title, C_ACCENT)) + col("║", C_PRIMARY))
+        screen.draw(4, 2, col("║", C_PRIMARY) + bold(col(wizard_title, C_ACCENT)) + col("║", C_PRIMARY))
         
-        sys.stdout.write("\033[5;2H")
-        sys.stdout.write(col("║", C_PRIMARY) + "                                       " + col("║", C_PRIMARY))
+        screen.draw(5, 2, col("║", C_PRIMARY) + "                                       " + col("║", C_PRIMARY))
         
-        sys.stdout.write("\033[6;2H")
-        sys.stdout.write(bold(col("╚═══════════════════════════════════════╝", C_PRIMARY)))
+        screen.draw(6, 2, bold(col("╚═══════════════════════════════════════╝", C_PRIMARY)))
         
         # Progress bar
         progress = int((self.current_step / len(self.STEPS)) * 40)
         bar = "█" * progress + "░" * (40 - progress)
         
-        sys.stdout.write("\033[8;2H")
-        sys.stdout.write(col(f"Progress: {bar} {self.current_step}/{len(self.STEPS)}", C_SUCCESS))
+        screen.draw(8, 2, col(f"Progress: {bar} {self.current_step}/{len(self.STEPS)}", C_SUCCESS))
         
         # Current step
         if self.current_step < len(self.STEPS):
             step = self.STEPS[self.current_step]
             
-            sys.stdout.write("\033[10;2H")
-            sys.stdout.write(bold(col(step['title'], C_PRIMARY)))
+            screen.draw(10, 2, bold(col(step['title'], C_PRIMARY)))
             
-            sys.stdout.write("\033[12;2H")
             # Word wrap description
             words = step['description'].split('\n')
             y = 12
             for line in words:
-                sys.stdout.write(f"\033[{y};2H")
-                sys.stdout.write(col(line, C_TEXT))
+                screen.draw(y, 2, col(line, C_TEXT))
                 y += 1
         
+        if self.notice:
+            screen.draw(self.height-6, 2, self.notice)
+        if self.status:
+            screen.draw(self.height-5, 2, self.status)
+        
         # Instructions
-        sys.stdout.write(f"\033[{self.height-3};2H")
         if self.current_step < len(self.STEPS) - 1:
-            sys.stdout.write(col("Press ENTER to continue  |  Q to quit", C_MUTED))
+            screen.draw(self.height-3, 2, col("Press ENTER to continue  |  Q to quit", C_MUTED))
         else:
-            sys.stdout.write(col("Press ENTER to finish  |  Q to quit", C_MUTED))
+            screen.draw(self.height-3, 2, col("Press ENTER to finish  |  Q to quit", C_MUTED))
         
-        sys.stdout.flush()
+        screen.flush()
+    
+    def show_status(self, text):
+        """Set the status line and repaint immediately (before blocking work)"""
+        self.status = text
+        self.render()
     
     def execute_step(self):
         """Execute the current step's action"""
@@ -136,9 +131,8 @@ class TunnelWizard:
         step = self.STEPS[self.current_step]
         action = step['action']
         
-        sys.stdout.write(f"\033[{self.height-5};2H")
-        sys.stdout.write(col("Working...", C_TEXT) + " " * 30)
-        sys.stdout.flush()
+        self.notice = ""
+        self.show_status(col("Working...", C_TEXT))
         
         if action == 'install':
             success, _, _ = self.exec_in_guard(
@@ -156,13 +150,10 @@ class TunnelWizard:
             # Extract URL from output
             for line in stdout.split('\n'):
                 if 'https://' in line:
-                    sys.stdout.write(f"\033[{self.height-6};2H")
-                    sys.stdout.write(col(f"Open: {line.strip()}", C_ACCENT) + " " * 20)
+                    self.notice = col(f"Open: {line.strip()}", C_ACCENT)
                     break
             
-            sys.stdout.write(f"\033[{self.height-5};2H")
-            sys.stdout.write(col("After logging in, press ENTER", C_TEXT))
-            sys.stdout.flush()
+            self.show_status(col("After logging in, press ENTER", C_TEXT))
             
             return True  # User must manually complete this
         
@@ -209,12 +200,10 @@ ingress:
             success = True
         
         # Show result
-        sys.stdout.write(f"\033[{self.height-5};2H")
         if success:
-            sys.stdout.write(col("✓ Complete!", C_SUCCESS) + " " * 30)
+            self.show_status(col("✓ Complete!", C_SUCCESS))
         else:
-            sys.stdout.write(col("✗ Failed (see logs)", C_ERROR) + " " * 20)
-        sys.stdout.flush()
+            self.show_status(col("✗ Failed (see logs)", C_ERROR))
         
         return success
     
@@ -223,32 +212,38 @@ ingress:
         if key.lower() == 'q':
             self.running = False
         
-        elif key == '\r' or key == '\n':  # Enter
+        elif key in KEY_ENTER:
             if self.execute_step():
                 self.current_step = min(len(self.STEPS), self.current_step + 1)
             
             if self.current_step >= len(self.STEPS):
                 self.running = False
     
+    def stop(self):
+        """Leave the main loop (safe to call from another thread)"""
+        self.running = False
+        self.loop.stop()
+    
     def run(self):
         """Main loop"""
-        fd = sys.stdin.fileno()
+        fd = self.loop.fd
         old_settings = termios.tcgetattr(fd)
         
         try:
             tty.setraw(fd)
-            sys.stdout.write("\033[?25l")  # Hide cursor
+            self.screen.out.write("\033[?25l")  # Hide cursor
             
-            while self.running and self.current_step < len(self.STEPS):
-                self.render()
-                
-                if select.select([sys.stdin], [], [], 0.1)[0]:
-                    key = sys.stdin.read(1)
-                    self.handle_input(key)
+            self.loop.run(
+                self.render,
+                self.handle_input,
+                lambda: self.running and self.current_step < len(self.STEPS)
+            )
         
         finally:
+            self.loop.close()
             termios.tcsetattr(fd, termios.TCSADRAIN, old_settings)
-            sys.stdout.write("\033[?25h")  # Show cursor
+            self.screen.out.write("\033[?25h")  # Show cursor
+            self.screen.out.flush()
 
 if __name__ == "__main__":
     wizard = TunnelWizard()
@@ -4,10 +4,11 @@ OOPUO Desktop Environment - Viewport Manager
 Manages the main pane content via "targeted injection"
 """
 import os
-import subprocess
 import threading
 from config import config, LOG_FILE
 from ipc import ipc
+from sshmux import ssh_manager
+from executor import executor
 
 class ViewportManager:
     """Manages content in the main tmux pane"""
@@ -24,15 +25,13 @@ class ViewportManager:
     
     def inject(self, command):
         """Send command to main pane"""
-        try:
-            subprocess.run(
-                ['tmux', 'send-keys', '-t', self.main_pane, command, 'Enter'],
-                timeout=2
-            )
-            return True
-        except Exception as e:
-            self.log(f"Inject error: {e}")
-            return False
+        result = executor().run(
+            ['tmux', 'send-keys', '-t', self.main_pane, command, 'Enter'],
+            timeout=2
+        )
+        if not result.ok:
+            self.log(f"Inject error: {result.error or result.stderr.strip()}")
+        return result.ok
     
     def clear_pane(self):
         """Clear the main pane"""
@@ -64,9 +63,11 @@ class ViewportManager:
         self.log(f"Connecting to Brain: {user}@{brain_ip}")
         self.current_view = "SSH_BRAIN"
         
+        conn = ssh_manager.connect(brain_ip, user, key_path)
+        
         # SSH wrapper that returns to ready state on exit
         wrapper = f"""
-ssh -i {key_path} -o StrictHostKeyChecking=no {user}@{brain_ip}
+{conn.command_line()}
 echo "\n[ SSH Session Ended ]"
 sleep 2
 clear
@@ -79,6 +80,10 @@ echo "[ VIEWPORT READY ]"
         os.chmod(wrapper_path, 0o755)
         
         self.inject(f'bash {wrapper_path}')
+        
+        # Warm the shared connection for the next sessions without holding up
+        # the command channel; this one connects directly if it is not up yet
+        threading.Thread(target=conn.ensure, name="ssh-warmup", daemon=True).start()
     
     def connect_guard(self):
         """Open console to Guard LXC"""
@@ -124,7 +129,7 @@ echo "[ VIEWPORT READY ]"
         self.log("Disconnecting current view")
         
         # Send Ctrl+C to main pane
-        subprocess.run(
+        executor().run(
             ['tmux', 'send-keys', '-t', self.main_pane, 'C-c'],
             timeout=2
         )
@@ -159,7 +164,7 @@ echo "[ VIEWPORT READY ]"
             self.disconnect()
         elif command == "EXIT":
             self.log("Exit requested")
-            subprocess.run(['tmux', 'kill-session', '-t', self.session])
+            executor().run(['tmux', 'kill-session', '-t', self.session])
         else:
             self.log(f"Unknown command: {command}")
     
@@ -0,0 +1,15 @@
+"""
+Test setup: the modules are scripts importing each other by name from modules/
+"""
+import os
+import sys
+import tempfile
+
+MODULES = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'modules')
+sys.path.insert(0, MODULES)
+
+import config
+
+# Every module binds `from config import LOG_FILE` when it is first
+# imported; point it away from /var/log/oopuo before any of them is
+config.LOG_FILE = os.path.join(tempfile.mkdtemp(prefix='oopuo-test-'), 'system.log')
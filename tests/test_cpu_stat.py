@@ -0,0 +1,33 @@
+"""
+CPUCollector on a fake /proc/stat
+"""
+import cpu_stat
+from cpu_stat import CPUCollector
+
+
+def stat(cpu0, cpu1):
+    """/proc/stat text for two cores: (user, system, idle, iowait) each"""
+    rows = {'cpu0': cpu0, 'cpu1': cpu1}
+    rows['cpu'] = tuple(map(sum, zip(cpu0, cpu1)))
+    lines = [f"{label} {user} 0 {system} {idle} {iowait} 0 0 0 0 0"
+             for label, (user, system, idle, iowait) in
+             ((label, rows[label]) for label in ('cpu', 'cpu0', 'cpu1'))]
+    return "\n".join(lines) + "\nintr 0\n"
+
+
+def test_iowait_going_backwards(tmp_path, monkeypatch):
+    path = tmp_path / 'stat'
+    monkeypatch.setattr(cpu_stat, 'PROC_STAT', str(path))
+    path.write_text(stat((100, 0, 1000, 500), (100, 0, 1000, 0)))
+    collector = CPUCollector()
+
+    # cpu0's iowait drops by 50 while it is busy for 100 ticks
+    path.write_text(stat((200, 0, 1000, 450), (150, 0, 1050, 0)))
+    assert collector.sample() > 0
+    assert collector.per_core[0] == 100.0
+    assert collector.per_core[1] == 50.0
+
+    # The baseline moved on: the next interval is measured normally
+    path.write_text(stat((250, 0, 1050, 450), (200, 0, 1100, 0)))
+    assert collector.sample() == 50.0
+    collector.close()
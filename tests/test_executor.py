@@ -0,0 +1,42 @@
+"""
+Recording and replaying command tapes
+"""
+import os
+import stat
+
+from executor import Executor, RecordingBackend, ReplayBackend, Result
+
+TOKEN_OUTPUT = '{"full-tokenid": "root@pam!oopuo", "info": {"privsep": "0"}, "value": "s3cret-token"}'
+
+
+class CannedBackend:
+    """Answers every command with a fixed output"""
+
+    name = 'canned'
+
+    def execute(self, argv, timeout, input=None):
+        stdout = TOKEN_OUTPUT if argv[:4] == ['pveum', 'user', 'token', 'add'] else "ok\n"
+        return Result(argv, 0, stdout, "", 0.01)
+
+
+def test_tape_keeps_secrets_out(tmp_path):
+    tape = str(tmp_path / 'commands.tape')
+    runner = Executor(RecordingBackend(CannedBackend(), tape))
+    create = ['pct', 'create', '100', 'local:vztmpl/t.tar.zst', '--password', 'Guard-pass1', '--start', '1']
+    token = ['pveum', 'user', 'token', 'add', 'root@pam', 'oopuo', '--privsep', '0', '--output-format', 'json']
+
+    assert runner.run(create).stdout == "ok\n"
+    assert runner.run(token).stdout == TOKEN_OUTPUT     # the caller still gets the secret
+    runner.run(['qm', 'set', '200', '--cipassword=vm-pass2'])
+
+    assert stat.S_IMODE(os.stat(tape).st_mode) == 0o600
+    with open(tape) as f:
+        recorded = f.read()
+    for secret in ('Guard-pass1', 's3cret-token', 'vm-pass2'):
+        assert secret not in recorded
+    assert all('Guard-pass1' not in span['argv'] for span in runner.spans)
+
+    # The same commands find their answers on replay
+    replay = Executor(ReplayBackend(tape, speed=0))
+    assert replay.run(create).stdout == "ok\n"
+    assert replay.run(token).ok
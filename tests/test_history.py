@@ -0,0 +1,48 @@
+"""
+MetricsArchive rollups across restarts
+"""
+from history import MetricsArchive
+
+START = 1_700_002_800     # on an hour boundary
+
+
+def test_rollups_survive_reopen(tmp_path):
+    steady = MetricsArchive(str(tmp_path / 'steady.tsdb'))
+    path = str(tmp_path / 'restarted.tsdb')
+    archive = MetricsArchive(path)
+
+    seconds = 2 * 3600 + 150
+    for i in range(seconds):
+        if i in (90, 3599, 3600 + 1800):
+            archive.close()
+            archive = MetricsArchive(path)
+        sample = {'cpu': i % 97, 'ram': 50}
+        steady.append(sample, START + i)
+        archive.append(sample, START + i)
+
+    end = START + seconds
+    for tier in ('1m', '1h'):
+        expected = steady.query(0, end, 'cpu', tier)
+        assert expected
+        assert archive.query(0, end, 'cpu', tier) == expected
+    archive.close()
+    steady.close()
+
+
+def test_one_writer_at_a_time(tmp_path, monkeypatch):
+    path = str(tmp_path / 'shared.tsdb')
+    first = MetricsArchive(path)
+    second = MetricsArchive(path)
+    assert first.writer and not second.writer
+
+    first.append({'cpu': 10}, START)
+    second.append({'cpu': 99}, START + 1)   # dropped, not written over the first's records
+    assert first.query(0, START + 10, 'cpu', '1s') == [(START, 10.0, 10.0)]
+
+    # Takes over once the writer is gone
+    monkeypatch.setattr('history.LOCK_RETRY', 0)
+    first.close()
+    second.append({'cpu': 20}, START + 2)
+    assert second.writer
+    assert second.query(0, START + 10, 'cpu', '1s') == [(START, 10.0, 10.0), (START + 2, 20.0, 20.0)]
+    second.close()
@@ -0,0 +1,80 @@
+"""
+PackageCache against a local upstream that can go down
+"""
+import http.client
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import pytest
+
+import pkgcache
+from pkgcache import PackageCache
+
+
+class Upstream(BaseHTTPRequestHandler):
+    """Answers every path with `body`, or with `status` when that is set"""
+
+    body = b'Origin: Ubuntu\n'
+    status = 200
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        self.send_response(self.status)
+        body = self.body if self.status == 200 else b''
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+@pytest.fixture
+def upstream():
+    handler = type('Handler', (Upstream,), {'status': 200})
+    server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_port}", handler
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    # The test upstream is on loopback and an odd port
+    monkeypatch.setattr(pkgcache, 'allowed_upstream', lambda url, upstreams: True)
+    cache = PackageCache(cache_dir=str(tmp_path / 'cache'), bind='127.0.0.1', port=0, max_age=0).start()
+    yield cache
+    cache.stop()
+
+
+def get(cache, url):
+    """(status, body) of a proxy request for `url`"""
+    conn = http.client.HTTPConnection('127.0.0.1', cache.server.server_address[1], timeout=10)
+    conn.request('GET', url)
+    response = conn.getresponse()
+    body = response.read()
+    conn.close()
+    return response.status, body
+
+
+def test_stale_copy_when_upstream_fails(cache, upstream):
+    base, handler = upstream
+    url = f"{base}/ubuntu/dists/noble/Release"
+    assert get(cache, url) == (200, Upstream.body)
+
+    handler.status = 503
+    assert get(cache, url) == (200, Upstream.body)
+    assert cache.stats['stale'] == 1
+
+
+def test_upstream_errors_pass_through(cache, upstream):
+    base, handler = upstream
+    handler.status = 503
+    assert get(cache, f"{base}/ubuntu/dists/noble/InRelease")[0] == 503
+
+    # A file the mirror no longer has is not answered from the cache
+    handler.status = 200
+    url = f"{base}/ubuntu/dists/noble/Release.gpg"
+    assert get(cache, url)[0] == 200
+    handler.status = 404
+    assert get(cache, url)[0] == 404
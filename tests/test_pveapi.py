@@ -0,0 +1,142 @@
+"""
+PVEClient and APIBackend against the local PVE stand-in
+"""
+import time
+
+import pytest
+
+import pveapi
+from pveapi import APIBackend, PVEClient, PVEError
+from pve_standin import StandinServer, TOKEN
+
+
+@pytest.fixture
+def server():
+    server = StandinServer().start()
+    yield server
+    server.stop()
+
+
+def calls(server, path):
+    return [call for call in server.state.calls if call[1] == path]
+
+
+def test_token_auth(server):
+    client = server.client(token=True)
+    assert client.get('/cluster/resources') == []
+    assert calls(server, '/access/ticket') == []
+    client.close()
+
+
+def test_bad_token_is_refused(server):
+    client = PVEClient(port=server.port, token=TOKEN + 'x', node=server.state.node, tls=False)
+    with pytest.raises(PVEError) as error:
+        client.get('/cluster/resources')
+    assert error.value.status == 401
+
+
+def test_ticket_login_and_renewal(server):
+    client = server.client(token=False)
+    client.get('/cluster/resources')
+    client.get('/cluster/resources')
+    assert len(calls(server, '/access/ticket')) == 1
+
+    # Renewed once it is older than TICKET_LIFETIME
+    client.ticket_time -= pveapi.TICKET_LIFETIME + 1
+    client.get('/cluster/resources')
+    assert len(calls(server, '/access/ticket')) == 2
+
+    # Rejected early (e.g. pveproxy restarted): logs in again and retries
+    client.ticket = 'PVE:root@pam:EXPIRED'
+    assert client.get('/cluster/resources') == []
+    assert len(calls(server, '/access/ticket')) == 3
+
+
+def test_wrong_password(server):
+    client = server.client(token=False)
+    client.password = 'wrong'
+    with pytest.raises(PVEError) as error:
+        client.get('/cluster/resources')
+    assert error.value.status == 401
+
+
+def test_run_waits_for_task(server):
+    client = server.client()
+    started = time.monotonic()
+    upid = client.run('POST', f"/nodes/{server.state.node}/qemu", vmid=900, name='test-vm')
+    assert upid.startswith('UPID:')
+    assert time.monotonic() - started >= 0.2
+    assert 900 in server.state.guests
+
+
+def test_task_wait_limit(server, monkeypatch):
+    client = server.client()
+    monkeypatch.setattr('pve_standin.TASK_SECONDS', 5)
+    with pytest.raises(PVEError, match='did not finish'):
+        client.run('POST', f"/nodes/{server.state.node}/qemu", wait=0.3, vmid=900)
+
+
+def test_failed_task_raises(server):
+    client = server.client()
+    backend = APIBackend(client)
+    assert backend.vm_create(900, name='test-vm')
+    with pytest.raises(PVEError, match="snapshot 'missing' does not exist"):
+        client.run('POST', f"/nodes/{server.state.node}/qemu/900/snapshot/missing/rollback")
+
+
+def test_backend_lifecycle(server):
+    backend = APIBackend(server.client(token=False))
+    assert backend.vm_create(900, name='test-vm', memory=2048)
+    assert backend.vm_set(900, cores=2)
+    assert backend.vm_config(900)['cores'] == '2'
+    assert backend.vm_start(900)
+    assert backend.vm_agent_ping(900)
+    assert backend.snapshot(900, 'snap', 'test')
+    assert [s['name'] for s in backend.snapshots(900)] == ['snap']
+    assert backend.rollback(900, 'snap')
+    assert backend.vm_destroy(900)
+    assert backend.resources() == []
+
+
+def test_backend_errors_are_false(server):
+    backend = APIBackend(server.client())
+    assert backend.vm_start(999) is False
+    assert backend.vm_config(999) is None
+    assert backend.vm_create(900, name='test-vm')
+    assert backend.rollback(900, 'missing') is False
+
+
+def test_shutdown_sends_pve_timeout(server):
+    backend = APIBackend(server.client())
+    assert backend.vm_create(900, name='test-vm')
+    assert backend.vm_start(900)
+    assert backend.vm_shutdown(900, timeout=45)
+    (_, _, params), = calls(server, f"/nodes/{server.state.node}/qemu/900/status/shutdown")
+    assert params == {'timeout': '45'}
+    assert server.state.guests[900]['status'] == 'stopped'
+
+
+def test_token_replaced_when_it_already_exists(monkeypatch):
+    import executor
+    from simulator import SimulatedBackend
+
+    backend = SimulatedBackend(speed=0)
+    monkeypatch.setattr(executor, '_executor', executor.Executor(backend))
+    monkeypatch.setattr(pveapi.config, 'save', lambda: None)
+    monkeypatch.setitem(pveapi.config.data['pve']['api'], 'token', None)
+
+    first = pveapi.create_api_token()
+    # Config reset: the token exists on the node, its secret is gone
+    second = pveapi.create_api_token()
+    assert first and second and first != second
+    assert second.startswith('root@pam!oopuo=')
+    assert pveapi.config.get('pve.api.token') == second
+
+
+def test_proxmox_falls_back_to_cli(monkeypatch):
+    monkeypatch.setattr(pveapi, '_backend', None)
+    monkeypatch.setattr(pveapi, 'create_api_token', lambda: None)
+    monkeypatch.setitem(pveapi.config.data['pve'], 'backend', 'api')
+    monkeypatch.setitem(pveapi.config.data['pve']['api'], 'token', None)
+    monkeypatch.setitem(pveapi.config.data['pve']['api'], 'password', None)
+    assert pveapi.proxmox().name == 'cli'